@@ -0,0 +1,119 @@
+"""
+شجرة الحسابات عبر جدول الإغلاق account_closure
+
+يُحدَّث الجدول داخل نفس معاملة إنشاء الحساب أو نقله أو حذفه، والتجميع
+الهرمي للأرصدة (rollup) يصبح join واحداً مع period_totals بدل المرور على
+الشجرة حساباً حساباً.
+"""
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import aliased
+
+from balances import period_totals
+from models import Account, AccountClosure
+
+
+def add_account(db, account):
+    """ربط حساب جديد (بعد flush) بنفسه وبكل أصول أبيه"""
+    db.add(AccountClosure(ancestor_id=account.id, descendant_id=account.id, depth=0))
+    if account.parent_id is not None:
+        db.execute(
+            insert(AccountClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(AccountClosure.ancestor_id, literal(account.id), AccountClosure.depth + 1)
+                .where(AccountClosure.descendant_id == account.parent_id),
+            )
+        )
+
+
+def move_account(db, account_id, new_parent_id):
+    """نقل حساب مع كل فروعه تحت أب جديد (أو إلى الجذر إذا كان None)"""
+    subtree = select(AccountClosure.descendant_id).where(AccountClosure.ancestor_id == account_id)
+    if new_parent_id is not None:
+        in_subtree = db.query(AccountClosure).filter(
+            AccountClosure.ancestor_id == account_id,
+            AccountClosure.descendant_id == new_parent_id,
+        ).first()
+        if in_subtree:
+            raise HTTPException(status_code=400, detail="لا يمكن نقل الحساب تحت أحد فروعه")
+
+    # فصل الشجرة الفرعية عن أصولها القديمة (مع إبقاء روابطها الداخلية)
+    db.execute(
+        delete(AccountClosure)
+        .where(
+            AccountClosure.descendant_id.in_(subtree),
+            AccountClosure.ancestor_id.notin_(subtree),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    # ربط كل أصول الأب الجديد بكل عناصر الشجرة الفرعية
+    if new_parent_id is not None:
+        Above = aliased(AccountClosure)
+        Below = aliased(AccountClosure)
+        db.execute(
+            insert(AccountClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(Above.ancestor_id, Below.descendant_id, Above.depth + Below.depth + 1)
+                .select_from(Above)
+                .join(Below, Below.ancestor_id == account_id)
+                .where(Above.descendant_id == new_parent_id),
+            )
+        )
+
+
+def remove_account(db, account_id):
+    """حذف روابط حساب بلا فروع (الحساب الذي له فروع لا يُحذف)"""
+    has_children = db.query(AccountClosure).filter(
+        AccountClosure.ancestor_id == account_id, AccountClosure.depth > 0
+    ).first()
+    if has_children:
+        raise HTTPException(status_code=400, detail="لا يمكن حذف حساب له حسابات فرعية")
+    db.execute(
+        delete(AccountClosure)
+        .where(AccountClosure.descendant_id == account_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rollup(db, account_id=None, start_date=None, end_date=None):
+    """
+    رصيد كل حساب مجمّعاً مع كل فروعه (أو حساب واحد إذا حُدد account_id)
+    في استعلام واحد: account_closure ⋈ period_totals مجمّعاً حسب الأصل.
+    """
+    totals = period_totals(start_date, end_date)
+    query = (
+        db.query(
+            Account.id,
+            Account.code,
+            Account.name,
+            Account.type,
+            Account.parent_id,
+            func.coalesce(func.sum(totals.c.debit_total), 0).label("debit_total"),
+            func.coalesce(func.sum(totals.c.credit_total), 0).label("credit_total"),
+        )
+        .join(AccountClosure, AccountClosure.ancestor_id == Account.id)
+        .outerjoin(totals, totals.c.account_id == AccountClosure.descendant_id)
+        .group_by(Account.id, Account.code, Account.name, Account.type, Account.parent_id)
+        .order_by(Account.code)
+    )
+    if account_id is not None:
+        query = query.filter(Account.id == account_id)
+
+    result = []
+    for r in query.all():
+        if r.type in ["Asset", "Expense"]:
+            balance = r.debit_total - r.credit_total
+        else:  # Liability, Revenue, Equity
+            balance = r.credit_total - r.debit_total
+        result.append({
+            "id": r.id,
+            "code": r.code,
+            "name": r.name,
+            "type": r.type,
+            "parent_id": r.parent_id,
+            "debit": r.debit_total,
+            "credit": r.credit_total,
+            "balance": balance,
+        })
+    return result
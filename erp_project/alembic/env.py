@@ -26,6 +26,10 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from models import Base
 target_metadata = Base.metadata
 
+# نفس رابط قاعدة البيانات الذي يستخدمه التطبيق (config/settings.py)
+from config import settings
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -70,8 +74,9 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # batch: المراجعات المولّدة تعمل أيضاً على SQLite (إعادة بناء الجدول بدل ALTER)
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, render_as_batch=True
         )
 
         with context.begin_transaction():
@@ -0,0 +1,51 @@
+"""add account_closure
+
+Revision ID: 0f47c2b9d8a5
+Revises: 6a3c0f92e4d1
+Create Date: 2026-03-19 09:12:44.871032
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f47c2b9d8a5'
+down_revision: Union[str, Sequence[str], None] = '6a3c0f92e4d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('account_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_account_closure_descendant_id', 'account_closure', ['descendant_id'], unique=False)
+
+    # كل حساب مع نفسه (عمق 0) ثم الصعود عبر parent_id
+    op.execute("""
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM accounts
+            UNION ALL
+            SELECT a.parent_id, tree.descendant_id, tree.depth + 1
+            FROM tree
+            JOIN accounts a ON a.id = tree.ancestor_id
+            WHERE a.parent_id IS NOT NULL
+        )
+        INSERT INTO account_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_account_closure_descendant_id', table_name='account_closure')
+    op.drop_table('account_closure')
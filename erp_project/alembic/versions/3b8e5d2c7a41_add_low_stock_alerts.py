@@ -0,0 +1,42 @@
+"""add low_stock_alerts and below-reorder partial index
+
+Revision ID: 3b8e5d2c7a41
+Revises: 9f4b7e2a6c18
+Create Date: 2026-10-18 21:14:52.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e5d2c7a41'
+down_revision: Union[str, Sequence[str], None] = '9f4b7e2a6c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('low_stock_alerts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('quantity_on_hand', sa.Float(), nullable=False),
+    sa.Column('reorder_level', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # المنتجات تحت حد إعادة الطلب فقط
+    below = sa.text('quantity_on_hand < reorder_level')
+    op.create_index('ix_products_below_reorder', 'products', ['id'], unique=False,
+                    postgresql_where=below, sqlite_where=below)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_below_reorder', table_name='products')
+    op.drop_table('low_stock_alerts')
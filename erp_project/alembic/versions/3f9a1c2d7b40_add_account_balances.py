@@ -0,0 +1,43 @@
+"""add account_balances
+
+Revision ID: 3f9a1c2d7b40
+Revises: 7ec51c4047bf
+Create Date: 2026-03-02 10:12:44.381920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b40'
+down_revision: Union[str, Sequence[str], None] = '7ec51c4047bf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('account_balances',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('debit_total', sa.Float(), nullable=False),
+    sa.Column('credit_total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('account_id')
+    )
+
+    # تعبئة الأرصدة الحالية من سطور القيود
+    op.execute("""
+        INSERT INTO account_balances (account_id, debit_total, credit_total)
+        SELECT a.id, COALESCE(SUM(t.debit), 0), COALESCE(SUM(t.credit), 0)
+        FROM accounts a
+        LEFT JOIN transaction_lines t ON t.account_id = a.id
+        GROUP BY a.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('account_balances')
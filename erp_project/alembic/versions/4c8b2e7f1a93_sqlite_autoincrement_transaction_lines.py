@@ -0,0 +1,48 @@
+"""sqlite autoincrement for transaction_lines
+
+Revision ID: 4c8b2e7f1a93
+Revises: 8d1e5a7c3b60
+Create Date: 2026-10-18 18:02:41.517306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8b2e7f1a93'
+down_revision: Union[str, Sequence[str], None] = '8d1e5a7c3b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite فقط: بدون AUTOINCREMENT يعيد استخدام أرقام السطور المحذوفة، ومنها
+    # سطور السنة المؤرشفة التي تعود بأرقامها عند إعادة فتح السنة
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table(
+        'transaction_lines', recreate='always', table_kwargs={'sqlite_autoincrement': True}
+    ) as batch_op:
+        pass
+    # أكبر رقم استُخدم، بما فيه أرقام الأرشيف
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'transaction_lines'")
+    op.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'transaction_lines', COALESCE(MAX(id), 0) FROM (
+            SELECT MAX(id) AS id FROM transaction_lines
+            UNION ALL SELECT MAX(id) FROM transaction_lines_archive
+        ) m
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table(
+        'transaction_lines', recreate='always', table_kwargs={'sqlite_autoincrement': False}
+    ) as batch_op:
+        pass
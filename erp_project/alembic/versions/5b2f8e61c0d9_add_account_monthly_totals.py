@@ -0,0 +1,52 @@
+"""add account_monthly_totals
+
+Revision ID: 5b2f8e61c0d9
+Revises: c4e7b19a5d63
+Create Date: 2026-03-12 11:48:20.904415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.dialects import month_of
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f8e61c0d9'
+down_revision: Union[str, Sequence[str], None] = 'c4e7b19a5d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('account_monthly_totals',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('debit_total', sa.Float(), nullable=False),
+    sa.Column('credit_total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('account_id', 'month')
+    )
+    op.create_index('ix_account_monthly_totals_month', 'account_monthly_totals', ['month'], unique=False)
+
+    # تعبئة المجاميع الشهرية من سطور القيود الحالية (month_of: to_char أو strftime حسب القاعدة)
+    journal_entries = sa.table('journal_entries', sa.column('date')).alias('j')
+    month = month_of(journal_entries.c.date).compile(dialect=op.get_bind().dialect)
+    op.execute(f"""
+        INSERT INTO account_monthly_totals (account_id, month, debit_total, credit_total)
+        SELECT t.account_id, {month},
+               COALESCE(SUM(t.debit), 0), COALESCE(SUM(t.credit), 0)
+        FROM transaction_lines t
+        JOIN journal_entries j ON j.id = t.journal_entry_id
+        WHERE t.account_id IS NOT NULL
+        GROUP BY t.account_id, {month}
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_account_monthly_totals_month', table_name='account_monthly_totals')
+    op.drop_table('account_monthly_totals')
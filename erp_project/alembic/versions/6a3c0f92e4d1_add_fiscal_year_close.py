@@ -0,0 +1,54 @@
+"""add fiscal_year_closes and transaction_lines_archive
+
+Revision ID: 6a3c0f92e4d1
+Revises: d9e0a3f7b218
+Create Date: 2026-03-18 10:41:27.203615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3c0f92e4d1'
+down_revision: Union[str, Sequence[str], None] = 'd9e0a3f7b218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('transaction_lines_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('journal_entry_id', sa.Integer(), nullable=True),
+    sa.Column('account_id', sa.Integer(), nullable=True),
+    sa.Column('debit', sa.Float(), nullable=True),
+    sa.Column('credit', sa.Float(), nullable=True),
+    sa.Column('fiscal_year', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.ForeignKeyConstraint(['journal_entry_id'], ['journal_entries.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transaction_lines_archive_journal_entry_id'), 'transaction_lines_archive', ['journal_entry_id'], unique=False)
+    op.create_index(op.f('ix_transaction_lines_archive_fiscal_year'), 'transaction_lines_archive', ['fiscal_year'], unique=False)
+    op.create_table('fiscal_year_closes',
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('closed_on', sa.Date(), nullable=False),
+    sa.Column('retained_earnings_account_id', sa.Integer(), nullable=False),
+    sa.Column('closing_entry_id', sa.Integer(), nullable=True),
+    sa.Column('opening_entry_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['closing_entry_id'], ['journal_entries.id'], ),
+    sa.ForeignKeyConstraint(['opening_entry_id'], ['journal_entries.id'], ),
+    sa.ForeignKeyConstraint(['retained_earnings_account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('year')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fiscal_year_closes')
+    op.drop_index(op.f('ix_transaction_lines_archive_fiscal_year'), table_name='transaction_lines_archive')
+    op.drop_index(op.f('ix_transaction_lines_archive_journal_entry_id'), table_name='transaction_lines_archive')
+    op.drop_table('transaction_lines_archive')
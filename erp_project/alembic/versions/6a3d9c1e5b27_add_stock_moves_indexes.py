@@ -0,0 +1,32 @@
+"""add stock moves indexes
+
+Revision ID: 6a3d9c1e5b27
+Revises: 4c8b2e7f1a93
+Create Date: 2026-10-18 19:12:40.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3d9c1e5b27'
+down_revision: Union[str, Sequence[str], None] = '4c8b2e7f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_stock_moves_date_id', 'stock_moves', ['date', 'id'], unique=False)
+    op.create_index('ix_stock_moves_product_id_date_id', 'stock_moves', ['product_id', 'date', 'id'], unique=False)
+    op.create_index('ix_stock_moves_warehouse_id_date_id', 'stock_moves', ['warehouse_id', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_moves_warehouse_id_date_id', table_name='stock_moves')
+    op.drop_index('ix_stock_moves_product_id_date_id', table_name='stock_moves')
+    op.drop_index('ix_stock_moves_date_id', table_name='stock_moves')
@@ -17,10 +17,25 @@ down_revision: Union[str, Sequence[str], None] = 'e2ef7c893896'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# PostgreSQL ينفّذ العمليات كما شُحنت أول مرة. SQLite لا يعدّل قيود جدول قائم فكانت الترقية
+# تفشل عليه، فله وحده مسار batch يعيد بناء الجدول. أسماء القيود هنا هي نفس ما يولّده
+# PostgreSQL للقيود غير المسماة (<table>_<column>_fkey)، فتجدها downgrade في القواعد القائمة.
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _is_sqlite():
+    return op.get_bind().dialect.name == "sqlite"
+
 
 def upgrade() -> None:
     """Upgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
+    if _is_sqlite():
+        for table in ('bonuses', 'deductions'):
+            with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+                batch_op.drop_constraint(f'{table}_employee_id_fkey', type_='foreignkey')
+                batch_op.create_foreign_key(f'{table}_employee_id_fkey', 'employees', ['employee_id'], ['id'], ondelete='CASCADE')
+        return
     op.drop_constraint(op.f('bonuses_employee_id_fkey'), 'bonuses', type_='foreignkey')
     op.create_foreign_key(None, 'bonuses', 'employees', ['employee_id'], ['id'], ondelete='CASCADE')
     op.drop_constraint(op.f('deductions_employee_id_fkey'), 'deductions', type_='foreignkey')
@@ -31,8 +46,14 @@ def upgrade() -> None:
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, 'deductions', type_='foreignkey')
+    if _is_sqlite():
+        for table in ('deductions', 'bonuses'):
+            with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+                batch_op.drop_constraint(f'{table}_employee_id_fkey', type_='foreignkey')
+                batch_op.create_foreign_key(f'{table}_employee_id_fkey', 'employees', ['employee_id'], ['id'])
+        return
+    op.drop_constraint(op.f('deductions_employee_id_fkey'), 'deductions', type_='foreignkey')
     op.create_foreign_key(op.f('deductions_employee_id_fkey'), 'deductions', 'employees', ['employee_id'], ['id'])
-    op.drop_constraint(None, 'bonuses', type_='foreignkey')
+    op.drop_constraint(op.f('bonuses_employee_id_fkey'), 'bonuses', type_='foreignkey')
     op.create_foreign_key(op.f('bonuses_employee_id_fkey'), 'bonuses', 'employees', ['employee_id'], ['id'])
     # ### end Alembic commands ###
@@ -17,7 +17,29 @@ down_revision: Union[str, Sequence[str], None] = '75ddba2fbe1f'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# PostgreSQL ينفّذ العمليات كما شُحنت أول مرة. SQLite لا يعدّل قيود جدول قائم فكانت الترقية
+# تفشل عليه، فله وحده مسار batch يعيد بناء الجدول. أسماء القيود هنا هي نفس ما يولّده
+# PostgreSQL للقيود غير المسماة (<table>_<column>_fkey)، فتجدها downgrade في القواعد القائمة.
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _is_sqlite():
+    return op.get_bind().dialect.name == "sqlite"
+
 def upgrade():
+    if _is_sqlite():
+        for table in ('bonuses', 'deductions'):
+            with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+                batch_op.drop_constraint(f'{table}_employee_id_fkey', type_='foreignkey')
+                batch_op.create_foreign_key(
+                    f'{table}_employee_id_fkey',
+                    'employees',
+                    ['employee_id'],
+                    ['id'],
+                    ondelete='CASCADE'
+                )
+        return
+
     op.drop_constraint('bonuses_employee_id_fkey', 'bonuses', type_='foreignkey')
     op.create_foreign_key(
         None,
@@ -40,4 +62,4 @@ def upgrade():
 
 
 def downgrade():
-    pass
\ No newline at end of file
+    pass
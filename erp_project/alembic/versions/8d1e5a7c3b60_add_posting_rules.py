@@ -0,0 +1,54 @@
+"""add posting_rules
+
+Revision ID: 8d1e5a7c3b60
+Revises: 0f47c2b9d8a5
+Create Date: 2026-03-20 11:05:38.114290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1e5a7c3b60'
+down_revision: Union[str, Sequence[str], None] = '0f47c2b9d8a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('posting_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('document_type', sa.String(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('document_type', 'role', name='uq_posting_rules_document_type_role')
+    )
+    op.create_index(op.f('ix_posting_rules_id'), 'posting_rules', ['id'], unique=False)
+
+    # القواعد الافتراضية من أسماء الحسابات المستخدمة سابقاً في الكود
+    # (UNION ALL بدل VALUES ... AS r (أعمدة) الذي لا يدعمه SQLite)
+    op.execute("""
+        INSERT INTO posting_rules (document_type, role, account_id)
+        SELECT r.document_type, r.role, MIN(a.id)
+        FROM (
+            SELECT 'vendor_invoice' AS document_type, 'expense' AS role, 'مستهلكات' AS account_name
+            UNION ALL SELECT 'vendor_invoice', 'payable', 'حساب الموردين'
+            UNION ALL SELECT 'payment', 'payable', 'حساب الموردين'
+            UNION ALL SELECT 'sales_invoice', 'receivable', 'حسابات العملاء'
+            UNION ALL SELECT 'sales_invoice', 'revenue', 'ايرادات مبيعات'
+        ) AS r
+        JOIN accounts a ON a.name = r.account_name
+        GROUP BY r.document_type, r.role
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posting_rules_id'), table_name='posting_rules')
+    op.drop_table('posting_rules')
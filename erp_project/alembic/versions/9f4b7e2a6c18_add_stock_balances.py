@@ -0,0 +1,47 @@
+"""add stock_balances
+
+Revision ID: 9f4b7e2a6c18
+Revises: 6a3d9c1e5b27
+Create Date: 2026-10-18 19:48:05.631920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f4b7e2a6c18'
+down_revision: Union[str, Sequence[str], None] = '6a3d9c1e5b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_balances',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'warehouse_id')
+    )
+    op.create_index('ix_stock_balances_warehouse_id', 'stock_balances', ['warehouse_id'], unique=False)
+
+    # رصيد كل منتج في كل مخزن من حركاته الحالية
+    op.execute("""
+        INSERT INTO stock_balances (product_id, warehouse_id, quantity)
+        SELECT product_id, warehouse_id,
+               COALESCE(SUM(CASE move_type WHEN 'in' THEN quantity WHEN 'out' THEN -quantity ELSE 0 END), 0)
+        FROM stock_moves
+        WHERE product_id IS NOT NULL AND warehouse_id IS NOT NULL
+        GROUP BY product_id, warehouse_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_balances_warehouse_id', table_name='stock_balances')
+    op.drop_table('stock_balances')
@@ -0,0 +1,32 @@
+"""add ledger indexes
+
+Revision ID: a81d5e0c94f2
+Revises: 3f9a1c2d7b40
+Create Date: 2026-03-04 09:31:07.115402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a81d5e0c94f2'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_journal_entries_date_id', 'journal_entries', ['date', 'id'], unique=False)
+    op.create_index('ix_transaction_lines_journal_entry_id', 'transaction_lines', ['journal_entry_id'], unique=False)
+    op.create_index('ix_transaction_lines_account_id_id', 'transaction_lines', ['account_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transaction_lines_account_id_id', table_name='transaction_lines')
+    op.drop_index('ix_transaction_lines_journal_entry_id', table_name='transaction_lines')
+    op.drop_index('ix_journal_entries_date_id', table_name='journal_entries')
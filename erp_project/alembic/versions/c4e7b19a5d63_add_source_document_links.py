@@ -0,0 +1,90 @@
+"""add source document links to journal entries and stock moves
+
+Revision ID: c4e7b19a5d63
+Revises: a81d5e0c94f2
+Create Date: 2026-03-09 14:05:52.730114
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7b19a5d63'
+down_revision: Union[str, Sequence[str], None] = 'a81d5e0c94f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('journal_entries', sa.Column('source_type', sa.String(), nullable=True))
+    op.add_column('journal_entries', sa.Column('source_id', sa.Integer(), nullable=True))
+    op.add_column('stock_moves', sa.Column('source_type', sa.String(), nullable=True))
+    op.add_column('stock_moves', sa.Column('source_id', sa.Integer(), nullable=True))
+
+    # ربط القيود الحالية بمستنداتها عبر journal_entry_id
+    # (استعلامات فرعية مرتبطة بدل UPDATE ... FROM لتعمل على PostgreSQL وSQLite)
+    for source_type, table in (
+        ('vendor_invoice', 'vendor_invoices'),
+        ('sales_invoice', 'sales_invoices'),
+        ('payment', 'payments'),
+    ):
+        op.execute(f"""
+            UPDATE journal_entries SET source_type = '{source_type}',
+                source_id = (SELECT MIN(d.id) FROM {table} d WHERE d.journal_entry_id = journal_entries.id)
+            WHERE EXISTS (SELECT 1 FROM {table} d WHERE d.journal_entry_id = journal_entries.id)
+        """)
+
+    # فواتير الموردين القديمة (قبل عمود journal_entry_id) مرتبطة فقط بوصف القيد "فاتورة ... رقم N"
+    # الرقم يُستخرج في Python: لا توجد دالة regex مشتركة بين القاعدتين
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("""
+        SELECT id, description FROM journal_entries
+        WHERE source_type IS NULL
+          AND (description LIKE 'فاتورة مستهلكات رقم %' OR description LIKE 'فاتورة مخزنية رقم %')
+    """)).all()
+    links = [
+        {"id": r.id, "source_id": int(m.group(1))}
+        for r in rows if (m := re.search(r"([0-9]+)\Z", r.description))
+    ]
+    if links:
+        bind.execute(
+            sa.text("UPDATE journal_entries SET source_type = 'vendor_invoice', source_id = :source_id WHERE id = :id"),
+            links,
+        )
+    op.execute("""
+        UPDATE vendor_invoices SET journal_entry_id = (
+            SELECT MIN(je.id) FROM journal_entries je
+            WHERE je.source_type = 'vendor_invoice' AND je.source_id = vendor_invoices.id
+        )
+        WHERE journal_entry_id IS NULL
+    """)
+
+    # حركات المخزون الناتجة عن فواتير المبيعات: reference = 'Sales Invoice N'
+    rows = bind.execute(sa.text("SELECT id, reference FROM stock_moves WHERE reference LIKE 'Sales Invoice %'")).all()
+    links = [
+        {"id": r.id, "source_id": int(m.group(1))}
+        for r in rows if (m := re.fullmatch(r"Sales Invoice ([0-9]+)", r.reference))
+    ]
+    if links:
+        bind.execute(
+            sa.text("UPDATE stock_moves SET source_type = 'sales_invoice', source_id = :source_id WHERE id = :id"),
+            links,
+        )
+
+    op.create_index('ix_journal_entries_source', 'journal_entries', ['source_type', 'source_id'], unique=False)
+    op.create_index('ix_stock_moves_source', 'stock_moves', ['source_type', 'source_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_moves_source', table_name='stock_moves')
+    op.drop_index('ix_journal_entries_source', table_name='journal_entries')
+    op.drop_column('stock_moves', 'source_id')
+    op.drop_column('stock_moves', 'source_type')
+    op.drop_column('journal_entries', 'source_id')
+    op.drop_column('journal_entries', 'source_type')
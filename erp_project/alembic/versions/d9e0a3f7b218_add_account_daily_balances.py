@@ -0,0 +1,51 @@
+"""add account_daily_balances
+
+Revision ID: d9e0a3f7b218
+Revises: 5b2f8e61c0d9
+Create Date: 2026-03-16 16:22:09.518734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e0a3f7b218'
+down_revision: Union[str, Sequence[str], None] = '5b2f8e61c0d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('account_daily_balances',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('debit_total', sa.Float(), nullable=False),
+    sa.Column('credit_total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('account_id', 'day')
+    )
+
+    # الرصيد التراكمي لكل حساب في نهاية كل يوم فيه حركة
+    op.execute("""
+        INSERT INTO account_daily_balances (account_id, day, debit_total, credit_total)
+        SELECT account_id, day,
+               SUM(debit) OVER w, SUM(credit) OVER w
+        FROM (
+            SELECT t.account_id, j.date AS day,
+                   COALESCE(SUM(t.debit), 0) AS debit, COALESCE(SUM(t.credit), 0) AS credit
+            FROM transaction_lines t
+            JOIN journal_entries j ON j.id = t.journal_entry_id
+            WHERE t.account_id IS NOT NULL
+            GROUP BY t.account_id, j.date
+        ) d
+        WINDOW w AS (PARTITION BY account_id ORDER BY day)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('account_daily_balances')
@@ -17,10 +17,24 @@ down_revision: Union[str, Sequence[str], None] = 'bb71924e49fc'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# PostgreSQL ينفّذ العمليات كما شُحنت أول مرة. SQLite لا يعدّل قيود جدول قائم فكانت الترقية
+# تفشل عليه، فله وحده مسار batch يعيد بناء الجدول. أسماء القيود هنا هي نفس ما يولّده
+# PostgreSQL للقيود غير المسماة (<table>_<column>_fkey)، فتجدها downgrade في القواعد القائمة.
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _is_sqlite():
+    return op.get_bind().dialect.name == "sqlite"
+
 
 def upgrade() -> None:
     """Upgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
+    if _is_sqlite():
+        with op.batch_alter_table('vendor_invoices', naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.add_column(sa.Column('journal_entry_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('vendor_invoices_journal_entry_id_fkey', 'journal_entries', ['journal_entry_id'], ['id'])
+        return
     op.add_column('vendor_invoices', sa.Column('journal_entry_id', sa.Integer(), nullable=True))
     op.create_foreign_key(None, 'vendor_invoices', 'journal_entries', ['journal_entry_id'], ['id'])
     # ### end Alembic commands ###
@@ -29,6 +43,11 @@ def upgrade() -> None:
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, 'vendor_invoices', type_='foreignkey')
+    if _is_sqlite():
+        with op.batch_alter_table('vendor_invoices', naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint('vendor_invoices_journal_entry_id_fkey', type_='foreignkey')
+            batch_op.drop_column('journal_entry_id')
+        return
+    op.drop_constraint('vendor_invoices_journal_entry_id_fkey', 'vendor_invoices', type_='foreignkey')
     op.drop_column('vendor_invoices', 'journal_entry_id')
     # ### end Alembic commands ###
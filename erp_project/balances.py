@@ -0,0 +1,405 @@
+"""
+الأرصدة المجمّعة المشتقة من سطور القيود:
+    account_balances        مجموع المدين والدائن لكل حساب
+    account_monthly_totals  مجموع المدين والدائن لكل حساب في كل شهر (YYYY-MM)
+    account_daily_balances  المجموع التراكمي لكل حساب في نهاية كل يوم فيه حركة
+
+كل مسار ترحيل يستدعي apply_lines داخل نفس المعاملة التي تحفظ سطور القيد،
+وكل مسار حذف يستدعي reverse_journal_entry قبل حذف السطور.
+
+بعد إقفال سنة مالية تبقى هذه الجداول تاريخية: تشمل السطور المؤرشفة
+(transaction_lines_archive) ولا تشمل قيد أرصدة أول السنة (year_opening)
+لأنه يلخّص نفس السطور المؤرشفة.
+
+أمر إعادة البناء والتحقق (من داخل مجلد erp_project):
+    python -m balances verify    # يعرض الفروقات بين الجداول وسطور القيود
+    python -m balances rebuild   # يعيد حساب الجداول من TransactionLine
+"""
+import argparse
+import bisect
+import sys
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from fiscal import ensure_open
+from models import (
+    YEAR_OPENING, Account, AccountBalance, AccountDailyBalance, AccountMonthlyTotal, JournalEntry,
+    TransactionLine, TransactionLineArchive,
+)
+
+# الفرق المسموح به بسبب تقريب الأرقام العشرية (Float)
+TOLERANCE = 1e-6
+
+
+def month_key(value):
+    """تاريخ -> 'YYYY-MM'"""
+    return value.strftime("%Y-%m")
+
+
+def _totals(lines):
+    totals = {}
+    for line in lines:
+        if line.account_id is None:
+            continue
+        debit, credit = totals.get(line.account_id, (0.0, 0.0))
+        totals[line.account_id] = (debit + (line.debit or 0), credit + (line.credit or 0))
+    return totals
+
+
+# INSERT ... ON CONFLICT لكل قاعدة بيانات مدعومة
+UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def upsert_insert(db, model):
+    return UPSERT_INSERTS[db.get_bind().dialect.name](model)
+
+
+def _increment(db, model, keys, debit, credit):
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET total = total + delta في جملة واحدة:
+    أول ترحيل لمفتاح جديد من معاملتين متزامنتين لا يفشل بتكرار المفتاح.
+    """
+    stmt = upsert_insert(db, model).values(**keys, debit_total=debit, credit_total=credit)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            "debit_total": model.debit_total + stmt.excluded.debit_total,
+            "credit_total": model.credit_total + stmt.excluded.credit_total,
+        },
+    ))
+
+
+def _lock_accounts(db, account_ids):
+    """
+    قفل صفوف account_balances للحسابات بترتيب ثابت (SELECT ... FOR UPDATE) حتى
+    نهاية المعاملة: الترحيلات المتزامنة على نفس الحساب تتسلسل، فقراءة رصيد اليوم
+    السابق في _apply_daily ترى دائماً ما التزمت به المعاملات الأخرى.
+    (SQLite يتجاهل FOR UPDATE لأنه يسمح بكاتب واحد أصلاً)
+    """
+    (
+        db.query(AccountBalance.account_id)
+        .filter(AccountBalance.account_id.in_(account_ids))
+        .order_by(AccountBalance.account_id)
+        .with_for_update()
+        .all()
+    )
+
+
+def _apply_daily(db, account_id, day_deltas):
+    """
+    تحديث الرصيد التراكمي اليومي لحساب بحركات عدة أيام دفعة واحدة
+    day_deltas: [(day, debit, credit), ...] مرتبة حسب اليوم
+
+    1) إنشاء صف لكل يوم جديد بقيمة آخر يوم قبله (INSERT ... ON CONFLICT DO NOTHING).
+    2) كل فترة [يوم_i، يوم_i+1) تُزاد بالمجموع التراكمي للحركات حتى يوم_i،
+       فكل صف يُحدَّث مرة واحدة مهما كان عدد الأيام المستوردة.
+    يُستدعى بعد _lock_accounts للحساب.
+    """
+    for day, _, _ in day_deltas:
+        def previous(column):
+            return func.coalesce(
+                select(column)
+                .where(AccountDailyBalance.account_id == account_id, AccountDailyBalance.day < day)
+                .order_by(AccountDailyBalance.day.desc())
+                .limit(1)
+                .scalar_subquery(),
+                0.0,
+            )
+
+        db.execute(
+            upsert_insert(db, AccountDailyBalance)
+            .values(
+                account_id=account_id,
+                day=day,
+                debit_total=previous(AccountDailyBalance.debit_total),
+                credit_total=previous(AccountDailyBalance.credit_total),
+            )
+            .on_conflict_do_nothing(index_elements=["account_id", "day"])
+        )
+
+    debit = credit = 0.0
+    for i, (day, day_debit, day_credit) in enumerate(day_deltas):
+        debit += day_debit
+        credit += day_credit
+        query = db.query(AccountDailyBalance).filter(
+            AccountDailyBalance.account_id == account_id, AccountDailyBalance.day >= day
+        )
+        if i + 1 < len(day_deltas):
+            query = query.filter(AccountDailyBalance.day < day_deltas[i + 1][0])
+        query.update(
+            {
+                AccountDailyBalance.debit_total: AccountDailyBalance.debit_total + debit,
+                AccountDailyBalance.credit_total: AccountDailyBalance.credit_total + credit,
+            },
+            synchronize_session=False,
+        )
+
+
+def apply_deltas(db, deltas):
+    """
+    إضافة حركات مجمّعة إلى الأرصدة: deltas = {(account_id, day): (debit, credit)}
+    (الاستيراد بالجملة يمرر كل أيامه مرة واحدة). لا تقوم بـ commit.
+    """
+    by_account = {}
+    for (account_id, day), (debit, credit) in deltas.items():
+        by_account.setdefault(account_id, []).append((day, debit, credit))
+
+    # ترتيب الحسابات يمنع الـ deadlock بين ترحيلين متزامنين
+    _lock_accounts(db, sorted(by_account))
+    for account_id in sorted(by_account):
+        day_deltas = sorted(by_account[account_id])
+        _increment(
+            db, AccountBalance, {"account_id": account_id},
+            sum(d for _, d, _ in day_deltas), sum(c for _, _, c in day_deltas),
+        )
+        months = {}
+        for day, debit, credit in day_deltas:
+            month_debit, month_credit = months.get(month_key(day), (0.0, 0.0))
+            months[month_key(day)] = (month_debit + debit, month_credit + credit)
+        for month, (debit, credit) in sorted(months.items()):
+            _increment(db, AccountMonthlyTotal, {"account_id": account_id, "month": month}, debit, credit)
+        _apply_daily(db, account_id, day_deltas)
+
+
+def apply_lines(db, lines, entry_date, sign=1):
+    """
+    إضافة سطور قيد بتاريخ entry_date إلى الأرصدة المجمّعة (sign=-1 لعكسها عند الحذف).
+    لا تقوم بـ commit؛ التعديل يُحفظ مع معاملة الترحيل نفسها.
+    """
+    apply_deltas(db, {
+        (account_id, entry_date): (sign * debit, sign * credit)
+        for account_id, (debit, credit) in _totals(lines).items()
+    })
+
+
+def _as_of(as_of):
+    """
+    المجموع التراكمي لكل حساب في نهاية يوم as_of:
+    آخر صف يومي بتاريخ <= as_of (بحث مفهرس واحد لكل حساب على المفتاح (account_id, day))
+    """
+    latest_day = (
+        select(func.max(AccountDailyBalance.day))
+        .where(AccountDailyBalance.account_id == Account.id, AccountDailyBalance.day <= as_of)
+        .correlate(Account)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            Account.id.label("account_id"),
+            AccountDailyBalance.debit_total.label("debit_total"),
+            AccountDailyBalance.credit_total.label("credit_total"),
+        )
+        .join(
+            AccountDailyBalance,
+            and_(AccountDailyBalance.account_id == Account.id, AccountDailyBalance.day == latest_day),
+        )
+        .subquery()
+    )
+
+
+def period_totals(start_date=None, end_date=None):
+    """
+    مجاميع المدين والدائن لكل حساب للفترة [start_date, end_date] كـ subquery
+    بأعمدة (account_id, debit_total, credit_total).
+    بدون تواريخ: الإجمالي من account_balances. بتاريخ نهاية فقط: الرصيد التراكمي حتى ذلك اليوم.
+    """
+    if end_date:
+        end = _as_of(end_date)
+    else:
+        end = select(AccountBalance.account_id, AccountBalance.debit_total, AccountBalance.credit_total).subquery()
+    if not start_date:
+        return end
+
+    start = _as_of(start_date - timedelta(days=1))
+    return (
+        select(
+            Account.id.label("account_id"),
+            (func.coalesce(end.c.debit_total, 0) - func.coalesce(start.c.debit_total, 0)).label("debit_total"),
+            (func.coalesce(end.c.credit_total, 0) - func.coalesce(start.c.credit_total, 0)).label("credit_total"),
+        )
+        .outerjoin(end, end.c.account_id == Account.id)
+        .outerjoin(start, start.c.account_id == Account.id)
+        .subquery()
+    )
+
+
+def reverse_journal_entry(db, journal_entry_id):
+    """عكس أثر كل سطور القيد على الأرصدة قبل حذفها"""
+    entry = db.query(JournalEntry.date, JournalEntry.source_type).filter(JournalEntry.id == journal_entry_id).first()
+    if entry is None:
+        return
+    if entry.source_type == YEAR_OPENING:
+        raise HTTPException(status_code=400, detail="لا يمكن حذف قيد أرصدة أول السنة المالية")
+    entry_date = entry.date
+    ensure_open(db, entry_date)
+    lines = (
+        db.query(
+            TransactionLine.account_id,
+            func.coalesce(func.sum(TransactionLine.debit), 0).label("debit"),
+            func.coalesce(func.sum(TransactionLine.credit), 0).label("credit"),
+        )
+        .filter(TransactionLine.journal_entry_id == journal_entry_id)
+        .group_by(TransactionLine.account_id)
+        .all()
+    )
+    apply_lines(db, lines, entry_date, sign=-1)
+
+
+def _ledger_totals(db):
+    """
+    المجاميع المتوقعة من سطور القيود الحية والمؤرشفة (بدون قيود أرصدة أول السنة):
+    (لكل حساب، لكل حساب وشهر، لكل حساب ويوم تراكمياً)
+    """
+    live = (
+        select(TransactionLine.account_id, TransactionLine.debit, TransactionLine.credit, JournalEntry.date)
+        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .where(or_(JournalEntry.source_type.is_(None), JournalEntry.source_type != YEAR_OPENING))
+    )
+    archived = (
+        select(TransactionLineArchive.account_id, TransactionLineArchive.debit, TransactionLineArchive.credit, JournalEntry.date)
+        .join(JournalEntry, JournalEntry.id == TransactionLineArchive.journal_entry_id)
+    )
+    lines = union_all(live, archived).subquery()
+    rows = db.execute(
+        select(
+            lines.c.account_id,
+            lines.c.date,
+            func.coalesce(func.sum(lines.c.debit), 0).label("debit"),
+            func.coalesce(func.sum(lines.c.credit), 0).label("credit"),
+        )
+        .where(lines.c.account_id.isnot(None))
+        .group_by(lines.c.account_id, lines.c.date)
+        .order_by(lines.c.account_id, lines.c.date)
+    ).all()
+
+    accounts = {account_id: (0.0, 0.0) for (account_id,) in db.query(Account.id).all()}
+    monthly = {}
+    daily = {}
+    for r in rows:
+        debit, credit = accounts.get(r.account_id, (0.0, 0.0))
+        accounts[r.account_id] = (debit + float(r.debit), credit + float(r.credit))
+        # الصفوف مرتبة حسب التاريخ، فمجموع الحساب حتى الآن هو الرصيد التراكمي لهذا اليوم
+        daily[(r.account_id, r.date)] = accounts[r.account_id]
+
+        key = (r.account_id, month_key(r.date))
+        debit, credit = monthly.get(key, (0.0, 0.0))
+        monthly[key] = (debit + float(r.debit), credit + float(r.credit))
+    return accounts, monthly, daily
+
+
+def _expected_daily(daily, stored_keys):
+    """
+    الرصيد التراكمي المتوقع لكل يوم مخزّن أو فيه حركة.
+    الأيام المخزّنة بلا حركة (بعد حذف قيودها) قيمتها قيمة آخر يوم فيه حركة قبلها.
+    """
+    by_account = {}
+    for account_id, day in sorted(daily):
+        by_account.setdefault(account_id, []).append(day)
+
+    expected = dict(daily)
+    for account_id, day in stored_keys:
+        if (account_id, day) in expected:
+            continue
+        days = by_account.get(account_id, [])
+        i = bisect.bisect_right(days, day)
+        expected[(account_id, day)] = daily[(account_id, days[i - 1])] if i else (0.0, 0.0)
+    return expected
+
+
+def _drift(table, expected, stored):
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        exp_debit, exp_credit = expected.get(key, (0.0, 0.0))
+        got_debit, got_credit = stored.get(key, (0.0, 0.0))
+        if abs(exp_debit - got_debit) > TOLERANCE or abs(exp_credit - got_credit) > TOLERANCE:
+            drift.append({
+                "table": table,
+                "key": key,
+                "expected_debit": exp_debit,
+                "expected_credit": exp_credit,
+                "stored_debit": got_debit,
+                "stored_credit": got_credit,
+            })
+    return drift
+
+
+def verify(db):
+    """إرجاع قائمة الصفوف التي يختلف رصيدها المخزّن عن مجموع سطور القيود"""
+    accounts, monthly, daily = _ledger_totals(db)
+    stored_accounts = {
+        b.account_id: (b.debit_total or 0.0, b.credit_total or 0.0)
+        for b in db.query(AccountBalance).all()
+    }
+    stored_monthly = {
+        (m.account_id, m.month): (m.debit_total or 0.0, m.credit_total or 0.0)
+        for m in db.query(AccountMonthlyTotal).all()
+    }
+    stored_daily = {
+        (d.account_id, d.day): (d.debit_total or 0.0, d.credit_total or 0.0)
+        for d in db.query(AccountDailyBalance).all()
+    }
+    return (
+        _drift(AccountBalance.__tablename__, accounts, stored_accounts)
+        + _drift(AccountMonthlyTotal.__tablename__, monthly, stored_monthly)
+        + _drift(AccountDailyBalance.__tablename__, _expected_daily(daily, stored_daily), stored_daily)
+    )
+
+
+def rebuild(db):
+    """إعادة حساب الجداول المجمّعة بالكامل من TransactionLine"""
+    accounts, monthly, daily = _ledger_totals(db)
+    db.query(AccountBalance).delete(synchronize_session=False)
+    db.query(AccountMonthlyTotal).delete(synchronize_session=False)
+    db.query(AccountDailyBalance).delete(synchronize_session=False)
+    db.add_all([
+        AccountBalance(account_id=account_id, debit_total=debit, credit_total=credit)
+        for account_id, (debit, credit) in accounts.items()
+    ])
+    db.add_all([
+        AccountMonthlyTotal(account_id=account_id, month=month, debit_total=debit, credit_total=credit)
+        for (account_id, month), (debit, credit) in monthly.items()
+    ])
+    db.add_all([
+        AccountDailyBalance(account_id=account_id, day=day, debit_total=debit, credit_total=credit)
+        for (account_id, day), (debit, credit) in daily.items()
+    ])
+    db.commit()
+    return len(accounts)
+
+
+def main(argv=None):
+    from database.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="إعادة بناء أو التحقق من جداول الأرصدة المجمّعة")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db)
+            print(f"تمت إعادة بناء أرصدة {count} حساب")
+            return 0
+
+        drift = verify(db)
+        for d in drift:
+            print(
+                f"{d['table']} {d['key']}: "
+                f"debit {d['stored_debit']} != {d['expected_debit']}, "
+                f"credit {d['stored_credit']} != {d['expected_credit']}"
+            )
+        print(f"{len(drift)} صف به فروقات")
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
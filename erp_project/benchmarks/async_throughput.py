@@ -0,0 +1,94 @@
+"""
+مقارنة عدد الطلبات في الثانية بين المسار المتزامن (threadpool) والمسار غير
+المتزامن (ASYNC_DB=1، asyncpg) عند 50 و200 عميل متزامن.
+
+كل عميل حلقة async ترسل الطلب التالي فور انتهاء السابق طوال مدة القياس.
+بدون --url يُستدعى التطبيق داخل العملية (ASGITransport)، ومع --url يُقاس
+خادم uvicorn قائم. يكتب في قاعدة البيانات المعرّفة في DATABASE_URL.
+
+    cd erp_project
+    python -m benchmarks.async_throughput --output sync.json
+    ASYNC_DB=1 python -m benchmarks.async_throughput --output async.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.posting_throughput import documents, prepare
+from database.database import ASYNC_DB, async_engine
+from main import app
+
+
+def workloads(ctx):
+    _, expense = documents(ctx)["daily_expense"]
+    return {
+        "trial_balance": ("GET", "/trial_balance", None),
+        "ledger_page": ("GET", "/ledger?limit=100", None),
+        "balance_sheet": ("GET", "/balance_sheet", None),
+        "daily_expense": ("POST", "/daily_expense", expense),
+    }
+
+
+async def run(client, method, url, body, clients, duration):
+    deadline = time.perf_counter() + duration
+    counts = [0] * clients
+    errors = [0] * clients
+
+    async def worker(i):
+        while time.perf_counter() < deadline:
+            r = await client.request(method, url, json=body)
+            if r.status_code < 400:
+                counts[i] += 1
+            else:
+                errors[i] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {"rps": round(sum(counts) / elapsed, 1), "errors": sum(errors)}
+
+
+async def main_async(args):
+    ctx = prepare()
+    limits = httpx.Limits(max_connections=max(args.clients), max_keepalive_connections=max(args.clients))
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results = {}
+    async with client:
+        for name, (method, url, body) in workloads(ctx).items():
+            if args.only and name not in args.only:
+                continue
+            for clients in args.clients:
+                result = await run(client, method, url, body, clients, args.duration)
+                results.setdefault(name, {})[clients] = result
+                print(f"{name:15} clients={clients:4}  {result['rps']:10.1f} req/s  errors={result['errors']}")
+    if async_engine is not None:
+        await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--duration", type=float, default=10.0, help="مدة القياس بالثواني لكل حالة")
+    parser.add_argument("--url", help="رابط خادم قائم بدل الاستدعاء داخل العملية")
+    parser.add_argument("--only", nargs="+", help="تشغيل أحمال محددة فقط")
+    parser.add_argument("--output", help="حفظ النتائج بصيغة JSON")
+    args = parser.parse_args()
+
+    mode = "async" if ASYNC_DB else "sync"
+    print(f"mode: {mode}")
+    results = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+إنتاجية خصم المخزون تحت التزاحم: N بائع متزامن يبيعون نفس المنتجات
+
+لكل عدد بائعين (--sellers): --sales فاتورة مبيعات موزعة على البائعين (threads)
+تبدأ معاً، كل فاتورة تخصم وحدة من منتج من --products منتجات جديدة (منتج واحد =
+أسوأ تزاحم على صف واحد). يُطبع عدد الفواتير في الثانية وp50/p95 للزمن، وعدد
+التحديثات الضائعة: الفرق بين ما خُصم فعلاً من الأرصدة وعدد الفواتير الناجحة
+(يجب أن يكون 0).
+
+في SQLite الكاتب واحد دائماً (BEGIN IMMEDIATE)، فالإنتاجية ثابتة تقريباً مع زيادة
+البائعين والزمن ينمو بطول الطابور، وقد يتجاوز بعضهم SQLITE_BUSY_TIMEOUT_MS فيُعد
+في errors. في PostgreSQL يتسلسل البائعون على صف المنتج وصفوف أرصدة الحسابات فقط.
+
+يكتب في قاعدة البيانات، لذا يُشغَّل على قاعدة تجريبية بعد benchmarks.datagen:
+
+    cd erp_project
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.contention --sellers 1,10,50,100
+"""
+import argparse
+import json
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from benchmarks.endpoints import context, git_commit, percentile
+from database.database import DATABASE_URL, dialect_of
+from main import app
+
+START_QUANTITY = 1_000_000
+
+
+def _seller(client, ctx, product_ids, sales, barrier, seller):
+    """فواتير بائع واحد؛ يعيد (أزمنة الناجحة بالـ ms، عدد الأخطاء)"""
+    url = f"/sales_invoices_with_stock?warehouse_id={ctx['warehouse_id']}"
+    latencies, errors = [], 0
+    barrier.wait()
+    for i in range(sales):
+        product_id = product_ids[(seller + i) % len(product_ids)]
+        started = time.perf_counter()
+        r = client.post(url, json={
+            "customer_name": f"بائع {seller}", "date": date.today().isoformat(), "total": 10,
+            "department_id": ctx["department_id"], "items": [{"product_id": product_id, "quantity": 1, "price": 10}],
+        })
+        if r.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors += 1
+    return latencies, errors
+
+
+def run_level(client, ctx, sellers, sales, products):
+    product_ids = [
+        client.post("/products", json={
+            "name": f"صنف تزاحم {sellers}-{i}", "quantity_on_hand": START_QUANTITY, "reorder_level": 0,
+        }).json()["id"]
+        for i in range(products)
+    ]
+    share = [sales // sellers + (1 if s < sales % sellers else 0) for s in range(sellers)]
+    barrier = threading.Barrier(sellers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sellers) as pool:
+        results = list(pool.map(
+            lambda s: _seller(client, ctx, product_ids, share[s], barrier, s), range(sellers)
+        ))
+    seconds = time.perf_counter() - started
+
+    latencies = sorted(ms for ok, _ in results for ms in ok)
+    errors = sum(e for _, e in results)
+    on_hand = {p["id"]: p["quantity_on_hand"] for p in client.get("/products").json()}
+    sold = sum(START_QUANTITY - on_hand[p] for p in product_ids)
+    return {
+        "sellers": sellers,
+        "sales": len(latencies),
+        "errors": errors,
+        "sales_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "lost_updates": round(len(latencies) - sold),
+    }
+
+
+def format_result(result):
+    return (
+        f"{result['sellers']:>7} sellers  {result['sales_per_second']:9.1f} sales/s"
+        f"  p50 {result['p50_ms'] or 0:8.2f}  p95 {result['p95_ms'] or 0:8.2f} ms"
+        f"  {result['errors']:5} errors  {result['lost_updates']:5} lost updates"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sellers", default="1,10,50,100", help="أعداد البائعين المتزامنين مفصولة بفواصل")
+    parser.add_argument("--sales", type=int, default=500, help="عدد الفواتير لكل مستوى")
+    parser.add_argument("--products", type=int, default=1, help="عدد المنتجات التي تتوزع عليها الفواتير")
+    parser.add_argument("--output", help="حفظ النتائج في ملف JSON")
+    args = parser.parse_args()
+
+    ctx = context()
+    levels = []
+    # خطأ الخادم (مهلة القفل مثلاً) يُعد في errors بدل إيقاف القياس
+    with TestClient(app, raise_server_exceptions=False) as client:
+        for sellers in (int(s) for s in args.sellers.split(",")):
+            levels.append(run_level(client, ctx, sellers, args.sales, args.products))
+            print(format_result(levels[-1]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "database": dialect_of(DATABASE_URL),
+                    "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "products": args.products,
+                    "python": platform.python_version(),
+                },
+                "levels": levels,
+            }, f, indent=2, ensure_ascii=False)
+    return 1 if any(level["lost_updates"] or level["errors"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
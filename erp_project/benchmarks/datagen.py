@@ -0,0 +1,272 @@
+"""
+توليد بيانات ERP اصطناعية بحجم محدد لقياس الأداء (benchmarks/endpoints.py)
+
+البيانات متسقة مع ما يكتبه الترحيل نفسه: كل فاتورة مورد أو مبيعات أو دفعة أو
+مصروف يومي لها قيد بسطرين، وفواتير المبيعات لها بنود وحركات مخزون صادرة،
+ثم تُبنى جداول الأرصدة المجمّعة بـ balances.rebuild وأرصدة المخازن بـ inventory.rebuild. نفس --seed يعطي نفس البيانات.
+
+يكتب في قاعدة البيانات المعرّفة في DATABASE_URL ويرفض قاعدة فيها حسابات،
+لذا يُشغَّل على قاعدة تجريبية فارغة:
+
+    cd erp_project
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.datagen --scale small
+    python -m benchmarks.datagen --scale medium --employees 2000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, text
+
+import inventory
+from balances import rebuild
+from database.database import Base, SessionLocal, engine
+from models import (
+    PAYMENT, SALES_INVOICE, VENDOR_INVOICE, Account, AccountClosure, Attendance, Bonus, Deduction, Department,
+    Employee, JournalEntry, Payment, PostingRule, Product, SalesInvoice, SalesInvoiceItem, StockMove,
+    TransactionLine, Vendor, VendorInvoice, VendorInvoiceLine, Warehouse,
+)
+
+SCALES = {
+    "small": {"lines": 1_000, "products": 1_000, "employees": 100},
+    "medium": {"lines": 100_000, "products": 50_000, "employees": 5_000},
+    "large": {"lines": 10_000_000, "products": 50_000, "employees": 5_000},
+}
+
+# نسبة كل نوع مستند من القيود (كل قيد سطران)
+DOCUMENT_MIX = [("vendor_invoice", 0.40), ("sales_invoice", 0.30), ("payment", 0.15), ("daily_expense", 0.15)]
+
+BATCH = 5_000
+DAYS = 3 * 365
+EXPENSE_ACCOUNTS = 50
+
+# الحسابات الأساسية بأسماء القواعد الافتراضية (posting_rules.DEFAULT_ACCOUNT_NAMES)
+ACCOUNTS = [
+    (1, "مستهلكات", "5001", "Expense"),
+    (2, "حساب الموردين", "2001", "Liability"),
+    (3, "حسابات العملاء", "1101", "Asset"),
+    (4, "ايرادات مبيعات", "4001", "Revenue"),
+    (5, "الصندوق", "1001", "Asset"),
+    (6, "أرباح مبقاة", "3001", "Equity"),
+]
+EXPENSE, PAYABLE, RECEIVABLE, REVENUE, CASH, EQUITY = range(1, 7)
+RULES = [
+    (VENDOR_INVOICE, "expense", EXPENSE),
+    (VENDOR_INVOICE, "payable", PAYABLE),
+    (PAYMENT, "payable", PAYABLE),
+    (SALES_INVOICE, "receivable", RECEIVABLE),
+    (SALES_INVOICE, "revenue", REVENUE),
+]
+
+
+class Batches:
+    """صفوف لكل جدول تُدرج بالجملة كلما بلغت BATCH (بترتيب الجداول حسب المفاتيح الأجنبية)"""
+
+    ORDER = [
+        JournalEntry, TransactionLine, VendorInvoice, VendorInvoiceLine, SalesInvoice, SalesInvoiceItem,
+        StockMove, Payment,
+    ]
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = {model: [] for model in self.ORDER}
+
+    def add(self, model, row):
+        self.rows[model].append(row)
+        if len(self.rows[model]) >= BATCH:
+            self.flush()
+
+    def flush(self):
+        for model in self.ORDER:
+            if self.rows[model]:
+                self.conn.execute(insert(model.__table__), self.rows[model])
+                self.rows[model] = []
+
+
+def _insert(conn, model, rows):
+    for i in range(0, len(rows), BATCH):
+        conn.execute(insert(model.__table__), rows[i:i + BATCH])
+
+
+def _reset_sequences(conn):
+    """المعرفات مُدرجة صراحةً، فيجب تقديم تسلسلات PostgreSQL بعدها"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in Base.metadata.sorted_tables:
+        if "id" in table.c and table.c.id.autoincrement is True:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+            ))
+
+
+def _master_data(conn, rng, products, employees, vendors, departments, warehouses):
+    accounts = [{"id": i, "name": n, "code": c, "type": t, "parent_id": None} for i, n, c, t in ACCOUNTS]
+    expense_ids = list(range(len(ACCOUNTS) + 1, len(ACCOUNTS) + 1 + EXPENSE_ACCOUNTS))
+    accounts += [
+        {"id": i, "name": f"مصروف {i}", "code": f"5{i:03d}", "type": "Expense", "parent_id": EXPENSE}
+        for i in expense_ids
+    ]
+    _insert(conn, Account, accounts)
+    _insert(conn, AccountClosure, [{"ancestor_id": a["id"], "descendant_id": a["id"], "depth": 0} for a in accounts])
+    _insert(conn, AccountClosure, [{"ancestor_id": EXPENSE, "descendant_id": i, "depth": 1} for i in expense_ids])
+    _insert(conn, PostingRule, [
+        {"document_type": d, "role": r, "account_id": a} for d, r, a in RULES
+    ])
+
+    _insert(conn, Department, [{"id": i, "name": f"قسم {i}"} for i in range(1, departments + 1)])
+    _insert(conn, Warehouse, [{"id": i, "name": f"مخزن {i}"} for i in range(1, warehouses + 1)])
+    _insert(conn, Vendor, [{"id": i, "name": f"مورد {i}"} for i in range(1, vendors + 1)])
+    _insert(conn, Product, [
+        {
+            "id": i, "name": f"صنف {i}", "quantity_on_hand": float(rng.randint(0, 500)),
+            "reorder_level": float(rng.randint(0, 50)), "is_daily_consumable": rng.random() < 0.2,
+        }
+        for i in range(1, products + 1)
+    ])
+    _insert(conn, Employee, [
+        {
+            "id": i, "name": f"موظف {i}", "department_id": rng.randint(1, departments),
+            "salary": rng.randint(300, 3000), "job_title": "موظف",
+        }
+        for i in range(1, employees + 1)
+    ])
+    month = date.today().strftime("%Y-%m")
+    _insert(conn, Bonus, [{"employee_id": i, "month": month, "amount": 50.0} for i in range(1, employees + 1, 3)])
+    _insert(conn, Deduction, [{"employee_id": i, "month": month, "amount": 20.0} for i in range(1, employees + 1, 5)])
+    _insert(conn, Attendance, [
+        {"employee_id": i, "date": date.today(), "status": "Present"} for i in range(1, employees + 1)
+    ])
+    return expense_ids
+
+
+def _documents(conn, rng, lines, products, vendors, departments, warehouses, expense_ids):
+    batches = Batches(conn)
+    first_day = date.today() - timedelta(days=DAYS)
+    ids = {"entry": 0, "line": 0, "vendor_invoice": 0, "vendor_line": 0, "sale": 0, "sale_item": 0,
+           "move": 0, "payment": 0}
+    kinds = [k for k, _ in DOCUMENT_MIX]
+    weights = [w for _, w in DOCUMENT_MIX]
+
+    def next_id(name):
+        ids[name] += 1
+        return ids[name]
+
+    def entry(day, description, source_type, source_id, debit_account, credit_account, amount):
+        entry_id = next_id("entry")
+        batches.add(JournalEntry, {
+            "id": entry_id, "date": day, "description": description,
+            "source_type": source_type, "source_id": source_id,
+        })
+        for account_id, debit, credit in ((debit_account, amount, 0.0), (credit_account, 0.0, amount)):
+            batches.add(TransactionLine, {
+                "id": next_id("line"), "journal_entry_id": entry_id,
+                "account_id": account_id, "debit": debit, "credit": credit,
+            })
+        return entry_id
+
+    for _ in range(lines // 2):
+        kind = rng.choices(kinds, weights)[0]
+        day = first_day + timedelta(days=rng.randrange(DAYS))
+        department = rng.randint(1, departments)
+        if kind == "vendor_invoice":
+            invoice_id = next_id("vendor_invoice")
+            items = [(rng.randint(1, products), rng.randint(1, 20), rng.randint(1, 100)) for _ in range(rng.randint(1, 3))]
+            total = float(sum(q * p for _, q, p in items))
+            entry_id = entry(day, f"فاتورة مستهلكات رقم {invoice_id}", VENDOR_INVOICE, invoice_id, EXPENSE, PAYABLE, total)
+            batches.add(VendorInvoice, {
+                "id": invoice_id, "vendor_id": rng.randint(1, vendors), "date": day, "total": total,
+                "department_id": department, "journal_entry_id": entry_id,
+            })
+            for product_id, quantity, price in items:
+                batches.add(VendorInvoiceLine, {
+                    "id": next_id("vendor_line"), "invoice_id": invoice_id,
+                    "product_name": f"صنف {product_id}", "quantity": quantity, "unit_price": price,
+                })
+        elif kind == "sales_invoice":
+            sale_id = next_id("sale")
+            items = [(rng.randint(1, products), rng.randint(1, 5), rng.randint(5, 200)) for _ in range(rng.randint(1, 3))]
+            total = float(sum(q * p for _, q, p in items))
+            entry_id = entry(day, f"فاتورة مبيعات رقم {sale_id}", SALES_INVOICE, sale_id, RECEIVABLE, REVENUE, total)
+            batches.add(SalesInvoice, {
+                "id": sale_id, "customer_name": f"عميل {rng.randint(1, 1000)}", "date": day, "total": total,
+                "department_id": department, "journal_entry_id": entry_id,
+            })
+            for product_id, quantity, price in items:
+                batches.add(SalesInvoiceItem, {
+                    "id": next_id("sale_item"), "sales_invoice_id": sale_id,
+                    "product_id": product_id, "quantity": quantity, "price": price,
+                })
+                batches.add(StockMove, {
+                    "id": next_id("move"), "product_id": product_id, "warehouse_id": rng.randint(1, warehouses),
+                    "department_id": department, "date": day, "quantity": quantity, "move_type": "out",
+                    "reference": f"Sales Invoice {sale_id}", "purpose": "stock",
+                    "source_type": SALES_INVOICE, "source_id": sale_id,
+                })
+        elif kind == "payment":
+            payment_id = next_id("payment")
+            amount = float(rng.randint(10, 5000))
+            vendor_id = rng.randint(1, vendors)
+            entry_id = entry(day, f"دفعة لمورد {vendor_id}", PAYMENT, payment_id, PAYABLE, CASH, amount)
+            batches.add(Payment, {
+                "id": payment_id, "vendor_id": vendor_id, "date": day, "amount": amount,
+                "journal_entry_id": entry_id, "account_id": CASH,
+            })
+        else:
+            entry(day, "مصروف يومي", None, None, rng.choice(expense_ids), CASH, float(rng.randint(1, 300)))
+    batches.flush()
+    return ids
+
+
+def generate(lines, products, employees, seed=1):
+    rng = random.Random(seed)
+    vendors = max(10, min(2_000, lines // 1_000))
+    departments = max(5, employees // 100)
+    warehouses = 5
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if conn.execute(func.count(Account.id).select()).scalar():
+            raise SystemExit("القاعدة فيها حسابات: شغّل المولّد على قاعدة تجريبية فارغة")
+        expense_ids = _master_data(conn, rng, products, employees, vendors, departments, warehouses)
+        ids = _documents(conn, rng, lines, products, vendors, departments, warehouses, expense_ids)
+        _reset_sequences(conn)
+
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        inventory.rebuild(db)
+    finally:
+        db.close()
+    return {
+        "transaction_lines": ids["line"], "journal_entries": ids["entry"], "vendor_invoices": ids["vendor_invoice"],
+        "sales_invoices": ids["sale"], "stock_moves": ids["move"], "payments": ids["payment"],
+        "products": products, "employees": employees, "vendors": vendors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--lines", type=int, help="عدد سطور القيود (يتجاوز قيمة --scale)")
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--employees", type=int)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    started = time.perf_counter()
+    counts = generate(
+        args.lines or scale["lines"],
+        args.products or scale["products"],
+        args.employees or scale["employees"],
+        args.seed,
+    )
+    for name, count in counts.items():
+        print(f"{name:<18} {count:>12,}")
+    print(f"{time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+قياس كل مسارات main.py عبر تطبيق FastAPI داخل العملية على بيانات benchmarks/datagen.py
+
+لكل مسار: زمن الاستجابة p50/p95/p99 (ms)، الصفوف في الثانية، متوسط عدد
+الاستعلامات لكل طلب، وأعلى RSS للعملية بعد قياسه. النتائج في ملف JSON يُقارن
+بين commit وآخر (--compare)؛ المسار الذي لا توجد له حالة في CASES يُسجَّل
+"skipped" حتى لا يختفي مسار جديد من القياس بصمت.
+
+مسارات الكتابة تضيف بيانات، ومسارات الحذف تُنشئ هدفها أولاً (خارج القياس)،
+لذا يُشغَّل على قاعدة تجريبية:
+
+    cd erp_project
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.datagen --scale small
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.endpoints --output before.json
+    ... (commit جديد)
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.endpoints --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import re
+import resource
+import subprocess
+import time
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database.database import DATABASE_URL, SessionLocal, dialect_of
+from fiscal import last_closed_year
+from main import app
+from models import Account, Department, Employee, Product, Vendor, Warehouse
+
+DOCS = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
+
+
+class QueryCounter:
+    """عدد الاستعلامات المنفّذة على كل المحركات (OLTP والتقارير والنسخ)"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def context():
+    """معرفات موجودة من البيانات المولّدة تستخدمها الطلبات"""
+    db = SessionLocal()
+    try:
+        first = lambda model: db.query(model.id).order_by(model.id).limit(1).scalar()  # noqa: E731
+        ctx = {
+            "employee_id": first(Employee),
+            "department_id": first(Department),
+            "vendor_id": first(Vendor),
+            "product_id": first(Product),
+            "warehouse_id": first(Warehouse),
+            "branch_warehouse_id": db.query(Warehouse.id).order_by(Warehouse.id.desc()).limit(1).scalar(),
+            "expense_account_id": db.query(Account.id).filter(Account.name == "مستهلكات").scalar(),
+            "cash_account_id": db.query(Account.id).filter(Account.name == "الصندوق").scalar(),
+            "equity_account_id": db.query(Account.id).filter(Account.type == "Equity").limit(1).scalar(),
+            "closed_year": last_closed_year(db),
+        }
+    finally:
+        db.close()
+    if None in (ctx["employee_id"], ctx["vendor_id"], ctx["product_id"], ctx["cash_account_id"]):
+        raise SystemExit("لا توجد بيانات: شغّل python -m benchmarks.datagen أولاً")
+    return ctx
+
+
+def _post_id(client, url, body, key="id"):
+    r = client.post(url, json=body)
+    r.raise_for_status()
+    return r.json()[key]
+
+
+def cases(ctx):
+    """
+    (method, path) -> دالة (client, i) تعيد (url, kwargs) للطلب المقاس.
+    ما تفعله الدالة نفسها من طلبات (إنشاء هدف الحذف مثلاً) خارج القياس.
+    """
+    today = date.today().isoformat()
+    month = today[:7]
+    employee = {
+        "name": "موظف قياس", "phone": None, "department_id": ctx["department_id"], "job_title": None,
+        "salary": 1000, "payment_method": None,
+    }
+    adjustment = {"employee_id": ctx["employee_id"], "month": month, "amount": 10, "reason": None}
+    vendor_invoice = {
+        "vendor_id": ctx["vendor_id"], "department_id": ctx["department_id"], "date": today, "total": 30,
+        "lines": [{"product_name": "صنف", "quantity": 3, "unit_price": 10}],
+    }
+    sales_invoice = {
+        "customer_name": "عميل قياس", "date": today, "total": 20, "department_id": ctx["department_id"],
+        "items": [{"product_id": ctx["product_id"], "quantity": 1, "price": 20}],
+    }
+    sales_url = f"/sales_invoices_with_stock?warehouse_id={ctx['warehouse_id']}"
+    payment = {"vendor_id": ctx["vendor_id"], "date": today, "amount": 10, "account_id": ctx["cash_account_id"]}
+    expense = {
+        "amount": 5, "description": "قياس", "expense_account_id": ctx["expense_account_id"],
+        "credit_account_id": ctx["cash_account_id"],
+    }
+    stock_move = {
+        "product_id": ctx["product_id"], "warehouse_id": ctx["warehouse_id"], "date": today, "quantity": 1,
+        "move_type": "in", "department_id": ctx["department_id"],
+    }
+    product = {"name": "صنف قياس", "quantity_on_hand": 0, "reorder_level": 0}
+    stock_transfer = {
+        "product_id": ctx["product_id"], "from_warehouse_id": ctx["warehouse_id"],
+        "to_warehouse_id": ctx["branch_warehouse_id"], "date": today, "quantity": 1,
+    }
+
+    def transfer(client, i):
+        # وارد بنفس الكمية قبل كل تحويل حتى لا يُرفض لعدم كفاية الرصيد
+        client.post("/stock_moves", json=stock_move).raise_for_status()
+        return "/stock_transfers", {"json": stock_transfer}
+    year = ctx["closed_year"] or date.today().year - 1
+
+    def get(url):
+        return lambda client, i: (url, {})
+
+    def send(url, body):
+        return lambda client, i: (url, {"json": body})
+
+    def account(i):
+        return {"name": f"حساب قياس {i}", "code": f"BENCH-{time.time_ns()}-{i}", "type": "Asset"}
+
+    def department(i):
+        return {"name": f"قسم قياس {time.time_ns()}-{i}", "description": None}
+
+    def fiscal(action):
+        def make(client, i):
+            closed = client.get("/fiscal_years").json()
+            is_closed = any(y["year"] == year for y in closed)
+            # الإغلاق يُقاس على سنة مفتوحة وإعادة الفتح على سنة مغلقة
+            if action == "close" and is_closed:
+                client.post(f"/fiscal_years/{year}/reopen").raise_for_status()
+            if action == "reopen" and not is_closed:
+                client.post(
+                    f"/fiscal_years/{year}/close?retained_earnings_account_id={ctx['equity_account_id']}"
+                ).raise_for_status()
+            if action == "close":
+                return f"/fiscal_years/{year}/close?retained_earnings_account_id={ctx['equity_account_id']}", {}
+            return f"/fiscal_years/{year}/reopen", {}
+        return make
+
+    import_body = (
+        "entry_ref,date,description,account_code,debit,credit\n"
+        f"A,{today},قياس,1001,10,\nA,{today},قياس,2001,,10\n"
+    )
+
+    return {
+        ("GET", "/employees"): get("/employees"),
+        ("POST", "/employees"): send("/employees", employee),
+        ("PUT", "/employees/{employee_id}"): lambda c, i: (f"/employees/{ctx['employee_id']}", {
+            "json": {**employee, "department_id": ctx["department_id"]},
+        }),
+        ("DELETE", "/employees/{employee_id}"): lambda c, i: (f"/employees/{_post_id(c, '/employees', employee)}", {}),
+        ("GET", "/bonuses"): get("/bonuses"),
+        ("POST", "/bonuses"): send("/bonuses", adjustment),
+        ("PUT", "/bonuses/{bonus_id}"): lambda c, i: (f"/bonuses/{_post_id(c, '/bonuses', adjustment)}", {"json": adjustment}),
+        ("DELETE", "/bonuses/{bonus_id}"): lambda c, i: (f"/bonuses/{_post_id(c, '/bonuses', adjustment)}", {}),
+        ("GET", "/deductions"): get("/deductions"),
+        ("POST", "/deductions"): send("/deductions", adjustment),
+        ("PUT", "/deductions/{deduction_id}"): lambda c, i: (
+            f"/deductions/{_post_id(c, '/deductions', adjustment)}", {"json": adjustment},
+        ),
+        ("DELETE", "/deductions/{deduction_id}"): lambda c, i: (f"/deductions/{_post_id(c, '/deductions', adjustment)}", {}),
+        ("GET", "/salary_slips/{employee_id}/{month}"): get(f"/salary_slips/{ctx['employee_id']}/{month}"),
+        ("GET", "/departments"): get("/departments"),
+        ("POST", "/departments"): lambda c, i: ("/departments", {"json": department(i)}),
+        ("PUT", "/departments/{dept_id}"): lambda c, i: (
+            f"/departments/{_post_id(c, '/departments', department(i))}", {"json": department(i)},
+        ),
+        ("DELETE", "/departments/{dept_id}"): lambda c, i: (f"/departments/{_post_id(c, '/departments', department(i))}", {}),
+        ("GET", "/attendances"): get("/attendances"),
+        ("POST", "/attendances"): send("/attendances", {"employee_id": ctx["employee_id"], "date": today, "status": "Present"}),
+        ("GET", "/accounts"): get("/accounts"),
+        ("POST", "/accounts"): lambda c, i: ("/accounts", {"json": account(i)}),
+        ("PUT", "/accounts/{account_id}"): lambda c, i: (f"/accounts/{_post_id(c, '/accounts', account(i))}", {"json": account(i)}),
+        ("DELETE", "/accounts/{account_id}"): lambda c, i: (f"/accounts/{_post_id(c, '/accounts', account(i))}", {}),
+        ("GET", "/accounts/rollup"): get(f"/accounts/rollup?account_id={ctx['expense_account_id']}"),
+        ("GET", "/journal_entries"): get("/journal_entries"),
+        ("POST", "/journal_entries"): send("/journal_entries", {"date": today, "description": "قياس"}),
+        ("GET", "/transaction_lines"): get("/transaction_lines"),
+        ("GET", "/ledger"): get("/ledger?limit=100"),
+        ("GET", "/transaction_lines_with_vendor"): get("/transaction_lines_with_vendor?limit=100"),
+        ("GET", "/products"): get("/products"),
+        ("POST", "/products"): send("/products", product),
+        ("PUT", "/products/{product_id}"): lambda c, i: (f"/products/{_post_id(c, '/products', product)}", {"json": product}),
+        ("GET", "/warehouses"): get("/warehouses"),
+        ("GET", "/warehouses/{warehouse_id}/stock"): get(f"/warehouses/{ctx['warehouse_id']}/stock"),
+        ("GET", "/products/{product_id}/stock"): get(f"/products/{ctx['product_id']}/stock"),
+        ("POST", "/stock_transfers"): transfer,
+        ("POST", "/warehouses"): send("/warehouses", {"name": "مخزن قياس", "location": None}),
+        ("GET", "/vendor_invoices"): get("/vendor_invoices"),
+        ("POST", "/vendor_invoices_with_stock"): send("/vendor_invoices_with_stock", vendor_invoice),
+        ("DELETE", "/vendor_invoices/{invoice_id}"): lambda c, i: (
+            f"/vendor_invoices/{_post_id(c, '/vendor_invoices_with_stock', vendor_invoice)}", {},
+        ),
+        ("GET", "/vendor_invoices/by_vendor/{vendor_id}"): get(f"/vendor_invoices/by_vendor/{ctx['vendor_id']}"),
+        ("GET", "/vendor_invoices/by_department/{department_id}"): get(
+            f"/vendor_invoices/by_department/{ctx['department_id']}"
+        ),
+        ("GET", "/stock_moves"): get("/stock_moves"),
+        ("POST", "/stock_moves"): send("/stock_moves", stock_move),
+        ("POST", "/stock_moves/batch"): send("/stock_moves/batch", [stock_move] * 1000),
+        ("GET", "/inventory_report"): get("/inventory_report"),
+        ("GET", "/products/below_reorder"): get("/products/below_reorder"),
+        ("GET", "/low_stock_alerts"): get("/low_stock_alerts"),
+        ("GET", "/vendors"): get("/vendors"),
+        ("POST", "/vendors"): send("/vendors", {"name": "مورد قياس", "contact": None}),
+        ("GET", "/purchase_orders"): get("/purchase_orders"),
+        ("POST", "/purchase_orders"): send("/purchase_orders", {"vendor_id": ctx["vendor_id"], "date": today}),
+        ("GET", "/purchase_order_lines"): get("/purchase_order_lines"),
+        ("POST", "/purchase_order_lines"): lambda c, i: ("/purchase_order_lines", {"json": {
+            "order_id": _post_id(c, "/purchase_orders", {"vendor_id": ctx["vendor_id"], "date": today}),
+            "product_id": ctx["product_id"], "quantity": 1, "unit_price": 1,
+        }}),
+        ("GET", "/assets"): get("/assets"),
+        ("POST", "/assets"): send("/assets", {"name": "أصل", "purchase_date": today, "cost": 100, "depreciation_rate": 0.1}),
+        ("GET", "/depreciation_lines"): get("/depreciation_lines"),
+        ("POST", "/depreciation_lines"): lambda c, i: ("/depreciation_lines", {"json": {
+            "asset_id": _post_id(c, "/assets", {"name": "أصل", "purchase_date": today, "cost": 100, "depreciation_rate": 0.1}),
+            "date": today, "amount": 10,
+        }}),
+        ("GET", "/payments"): get("/payments"),
+        ("POST", "/payments"): send("/payments", payment),
+        ("DELETE", "/payments/{payment_id}"): lambda c, i: (f"/payments/{_post_id(c, '/payments', payment)}", {}),
+        ("POST", "/daily_expense"): send("/daily_expense", expense),
+        ("GET", "/daily_expense"): get("/daily_expense?limit=100"),
+        ("DELETE", "/daily_expense/{journal_entry_id}"): lambda c, i: (
+            f"/daily_expense/{_post_id(c, '/daily_expense', expense, 'journal_entry_id')}", {},
+        ),
+        ("GET", "/trial_balance"): get("/trial_balance"),
+        ("GET", "/income_statement"): get("/income_statement"),
+        ("GET", "/balance_sheet"): get("/balance_sheet"),
+        ("POST", "/sales_invoices_with_stock"): send(sales_url, sales_invoice),
+        ("GET", "/sales_invoices"): get("/sales_invoices"),
+        ("GET", "/sales_invoices/by_department/{department_id}"): get(f"/sales_invoices/by_department/{ctx['department_id']}"),
+        ("DELETE", "/sales_invoices/{invoice_id}"): lambda c, i: (f"/sales_invoices/{_post_id(c, sales_url, sales_invoice)}", {}),
+        ("GET", "/expense_analysis"): get("/expense_analysis"),
+        ("POST", "/adjust_journal_entry"): send("/adjust_journal_entry", {"date": today, "description": "قياس", "lines": [
+            {"account_id": ctx["expense_account_id"], "debit": 1, "credit": 0},
+            {"account_id": ctx["cash_account_id"], "debit": 0, "credit": 1},
+        ]}),
+        ("POST", "/fiscal_years/{year}/close"): fiscal("close"),
+        ("POST", "/fiscal_years/{year}/reopen"): fiscal("reopen"),
+        ("GET", "/fiscal_years"): get("/fiscal_years"),
+        ("GET", "/export/ledger"): get("/export/ledger"),
+        ("GET", "/export/vendor_invoices"): get("/export/vendor_invoices"),
+        ("GET", "/export/sales_invoices"): get("/export/sales_invoices"),
+        ("GET", "/export/stock_moves"): get("/export/stock_moves"),
+        ("POST", "/journal_entries/import"): lambda c, i: ("/journal_entries/import?format=csv", {
+            "content": import_body.encode(), "headers": {"content-type": "text/csv"},
+        }),
+        ("GET", "/posting_rules"): get("/posting_rules"),
+        ("PUT", "/posting_rules/{document_type}/{role}"): send(
+            "/posting_rules/vendor_invoice/expense", {"account_id": ctx["expense_account_id"]}
+        ),
+    }
+
+
+def count_rows(response):
+    """عدد الصفوف في الاستجابة: طول القائمة، أو items/results، أو أسطر الملف المصدَّر"""
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        if isinstance(body, list):
+            return len(body)
+        for key in ("items", "results"):
+            if isinstance(body, dict) and isinstance(body.get(key), list):
+                return len(body[key])
+        return 1
+    lines = response.text.count("\n")
+    return max(lines - 1, 0) if response.headers.get("content-type", "").startswith("text/csv") else lines
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    # ru_maxrss بالكيلوبايت على Linux وبالبايت على macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def measure(client, counter, method, make, repeat, warmup):
+    timings, rows, queries = [], 0, 0
+    for i in range(warmup + repeat):
+        url, kwargs = make(client, i)
+        before = counter.count
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            return {"error": f"{response.status_code}: {response.text[:200]}"}
+        if i < warmup:
+            continue
+        timings.append(elapsed)
+        queries += counter.count - before
+        rows += count_rows(response)
+
+    timings.sort()
+    return {
+        "requests": repeat,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "rows_per_request": rows / repeat,
+        "rows_per_second": round(rows / sum(timings), 1) if sum(timings) else None,
+        "queries_per_request": queries / repeat,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat, warmup, only=None):
+    counter = QueryCounter()
+    ctx = context()
+    table = cases(ctx)
+    results = {}
+    with TestClient(app) as client:
+        for route in app.routes:
+            if route.path in DOCS:
+                continue
+            for method in sorted(route.methods):
+                name = f"{method} {route.path}"
+                if only and not re.search(only, name):
+                    continue
+                make = table.get((method, route.path))
+                if make is None:
+                    results[name] = {"skipped": "لا توجد حالة قياس لهذا المسار في CASES"}
+                else:
+                    results[name] = measure(client, counter, method, make, repeat, warmup)
+                print(format_result(name, results[name]))
+    return results
+
+
+def format_result(name, result):
+    if "p50_ms" not in result:
+        return f"{name:<55} {result.get('error') or result.get('skipped')}"
+    return (
+        f"{name:<55} p50 {result['p50_ms']:9.2f}  p95 {result['p95_ms']:9.2f}  p99 {result['p99_ms']:9.2f} ms"
+        f"  {result['queries_per_request']:7.1f} q/req  {result['rows_per_request']:9.0f} rows"
+        f"  {result['peak_rss_mb']:8.1f} MB"
+    )
+
+
+def compare(current, baseline, threshold):
+    """طباعة التغير في p95 وعدد الاستعلامات لكل مسار؛ يعيد المسارات التي تراجعت"""
+    regressions = []
+    print(f"\n{'route':<55} {'p95 before':>11} {'p95 after':>10} {'ratio':>7} {'queries':>15}")
+    for name, after in current["routes"].items():
+        before = baseline["routes"].get(name, {})
+        if "p95_ms" not in after or "p95_ms" not in before:
+            continue
+        ratio = after["p95_ms"] / before["p95_ms"] if before["p95_ms"] else float("inf")
+        queries = f"{before['queries_per_request']:g} -> {after['queries_per_request']:g}"
+        regressed = ratio > threshold or after["queries_per_request"] > before["queries_per_request"]
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<55} {before['p95_ms']:11.2f} {after['p95_ms']:10.2f} {ratio:7.2f} {queries:>15}"
+            f"{'  <-' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="عدد الطلبات المقاسة لكل مسار")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--routes", help="تعبير نمطي لاختيار المسارات، مثلاً '^GET /(accounts|stock_moves)$'")
+    parser.add_argument("--output", help="حفظ النتائج في ملف JSON")
+    parser.add_argument("--compare", help="ملف JSON سابق للمقارنة به")
+    parser.add_argument("--threshold", type=float, default=1.2, help="نسبة p95 التي تُعد تراجعاً")
+    args = parser.parse_args()
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "database": dialect_of(DATABASE_URL),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+        },
+        "routes": run(args.repeat, args.warmup, args.routes),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} مسار تراجع أداؤه")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""
+قياس عدد المستندات المرحّلة في الثانية (فواتير موردين، دفعات، مصروفات، فواتير مبيعات)
+مع عدة عملاء متزامنين، عبر تطبيق FastAPI نفسه داخل العملية.
+
+يكتب في قاعدة البيانات المعرّفة في database/database.py، لذا يُشغَّل على قاعدة تجريبية.
+للمقارنة قبل/بعد: شغّله على الـ commit السابق ثم على الحالي بنفس المعاملات.
+
+    cd erp_project
+    python -m benchmarks.posting_throughput --clients 1 4 16 --docs 200
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from database.database import SessionLocal
+from main import app
+from models import Account, Department, Product, Vendor
+
+REQUIRED_ACCOUNTS = [
+    ("مستهلكات", "BENCH-5001", "Expense"),
+    ("حساب الموردين", "BENCH-2001", "Liability"),
+    ("حسابات العملاء", "BENCH-1101", "Asset"),
+    ("ايرادات مبيعات", "BENCH-4001", "Revenue"),
+    ("صندوق القياس", "BENCH-1001", "Asset"),
+]
+
+
+def prepare():
+    """التأكد من وجود الحسابات والمورد والقسم والمنتج المطلوبة للترحيل"""
+    db = SessionLocal()
+    try:
+        accounts = {}
+        for name, code, type_ in REQUIRED_ACCOUNTS:
+            acc = db.query(Account).filter(Account.name == name).first()
+            if not acc:
+                acc = Account(name=name, code=code, type=type_)
+                db.add(acc)
+                db.flush()
+            accounts[name] = acc.id
+
+        vendor = db.query(Vendor).first() or Vendor(name="مورد القياس")
+        department = db.query(Department).filter(Department.name == "قسم القياس").first() or Department(name="قسم القياس")
+        product = db.query(Product).first() or Product(name="منتج القياس", quantity_on_hand=10 ** 9)
+        db.add_all([vendor, department, product])
+        db.commit()
+        return {
+            "cash_account_id": accounts["صندوق القياس"],
+            "expense_account_id": accounts["مستهلكات"],
+            "vendor_id": vendor.id,
+            "department_id": department.id,
+            "product_id": product.id,
+        }
+    finally:
+        db.close()
+
+
+def documents(ctx):
+    today = date.today().isoformat()
+    return {
+        "vendor_invoice": ("/vendor_invoices_with_stock", {
+            "vendor_id": ctx["vendor_id"], "department_id": ctx["department_id"], "date": today, "total": 30,
+            "lines": [{"product_name": "صنف", "quantity": 3, "unit_price": 10}],
+        }),
+        "payment": ("/payments", {
+            "vendor_id": ctx["vendor_id"], "date": today, "amount": 10, "account_id": ctx["cash_account_id"],
+        }),
+        "daily_expense": ("/daily_expense", {
+            "amount": 5, "description": "قياس", "expense_account_id": ctx["expense_account_id"],
+            "credit_account_id": ctx["cash_account_id"],
+        }),
+        "sales_invoice": ("/sales_invoices_with_stock", {
+            "customer_name": "عميل", "date": today, "total": 20, "department_id": ctx["department_id"],
+            "items": [{"product_id": ctx["product_id"], "quantity": 1, "price": 20}],
+        }),
+    }
+
+
+def run(url, body, clients, docs):
+    def worker(n):
+        with TestClient(app) as client:
+            for _ in range(n):
+                r = client.post(url, json=body)
+                r.raise_for_status()
+
+    per_client = [docs // clients + (1 if i < docs % clients else 0) for i in range(clients)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, per_client))
+    elapsed = time.perf_counter() - started
+    return docs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--docs", type=int, default=200, help="عدد المستندات لكل نوع ولكل مستوى تزامن")
+    parser.add_argument("--output", help="حفظ النتائج في ملف JSON")
+    args = parser.parse_args()
+
+    ctx = prepare()
+    results = []
+    for name, (url, body) in documents(ctx).items():
+        for clients in args.clients:
+            rate = run(url, body, clients, args.docs)
+            results.append({"document": name, "clients": clients, "docs_per_second": round(rate, 1)})
+            print(f"{name:<15} clients={clients:<4} {rate:10.1f} docs/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
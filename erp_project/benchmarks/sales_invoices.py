@@ -0,0 +1,91 @@
+"""
+قياس إنشاء فاتورة مبيعات بعدد سطور مختلف (افتراضياً 1 و50 و500 سطر)
+
+كل سطر منتج مختلف من بيانات benchmarks/datagen.py، فيظهر إن كان زمن الفاتورة
+أو عدد استعلاماتها ينمو مع عدد السطور. النتائج بنفس صيغة benchmarks.endpoints
+(p50/p95/p99، الاستعلامات لكل طلب، السطور في الثانية) وتُقارن بنفس --compare:
+
+    cd erp_project
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.datagen --scale small
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.sales_invoices --output before.json
+    ... (commit جديد)
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.sales_invoices --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import time
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from benchmarks.endpoints import QueryCounter, compare, context, format_result, git_commit, measure
+from database.database import DATABASE_URL, SessionLocal, dialect_of
+from main import app
+from models import Product
+
+
+def _product_ids(count):
+    db = SessionLocal()
+    try:
+        return [p for (p,) in db.query(Product.id).order_by(Product.id).limit(count)]
+    finally:
+        db.close()
+
+
+def run(line_counts, repeat, warmup):
+    ctx = context()
+    product_ids = _product_ids(max(line_counts))
+    if len(product_ids) < max(line_counts):
+        raise SystemExit(f"عدد المنتجات ({len(product_ids)}) أقل من {max(line_counts)}: شغّل datagen بحجم أكبر")
+
+    counter = QueryCounter()
+    url = f"/sales_invoices_with_stock?warehouse_id={ctx['warehouse_id']}"
+    results = {}
+    with TestClient(app) as client:
+        for lines in line_counts:
+            body = {
+                "customer_name": "عميل جملة", "date": date.today().isoformat(), "total": 10 * lines,
+                "department_id": ctx["department_id"],
+                "items": [{"product_id": product_ids[i], "quantity": 1, "price": 10} for i in range(lines)],
+            }
+            name = f"POST /sales_invoices_with_stock [{lines} lines]"
+            results[name] = measure(client, counter, "POST", lambda c, i: (url, {"json": body}), repeat, warmup)
+            print(format_result(name, results[name]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="1,50,500", help="أعداد السطور مفصولة بفواصل")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", help="حفظ النتائج في ملف JSON")
+    parser.add_argument("--compare", help="ملف JSON سابق للمقارنة به")
+    parser.add_argument("--threshold", type=float, default=1.2, help="نسبة p95 التي تُعد تراجعاً")
+    args = parser.parse_args()
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "database": dialect_of(DATABASE_URL),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+        },
+        "routes": run([int(n) for n in args.lines.split(",")], args.repeat, args.warmup),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} حالة تراجع أداؤها")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+"""
+إقفال السنة المالية وضغط دفتر الأستاذ
+
+1) قيد إقفال بتاريخ 31/12 ينقل أرصدة الإيرادات والمصروفات إلى حساب الأرباح المحتجزة
+   (يُرحّل عادياً فيُحدّث جداول الأرصدة).
+2) قيد أرصدة أول السنة بتاريخ 1/1 من السنة التالية بصافي رصيد كل حساب
+   (بدون apply_lines: جداول الأرصدة تشمل السنوات المقفلة أصلاً).
+3) نقل سطور السنة المقفلة إلى transaction_lines_archive وحذف سطور قيد أرصدة أول
+   السنة السابق، فيبقى حجم transaction_lines بحجم السنة المفتوحة فقط.
+كل ذلك في معاملة واحدة.
+"""
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, literal, select
+
+from balances import TOLERANCE, period_totals, reverse_journal_entry
+from fiscal import last_closed_year
+from models import (
+    FISCAL_CLOSE, YEAR_OPENING, Account, FiscalYearClose, JournalEntry, TransactionLine,
+    TransactionLineArchive,
+)
+from posting import build_entry, post
+
+
+def _net_balances(db, as_of, account_types=None):
+    """صافي (مدين - دائن) لكل حساب كما في تاريخ as_of، للحسابات ذات الرصيد فقط"""
+    totals = period_totals(end_date=as_of)
+    query = (
+        db.query(Account.id, totals.c.debit_total - totals.c.credit_total)
+        .join(totals, totals.c.account_id == Account.id)
+    )
+    if account_types:
+        query = query.filter(Account.type.in_(account_types))
+    return [(account_id, float(net)) for account_id, net in query.order_by(Account.id).all() if abs(net) > TOLERANCE]
+
+
+def _lines_for(balances):
+    """تحويل صافي الرصيد إلى سطر مدين أو دائن"""
+    return [(account_id, net, 0.0) if net > 0 else (account_id, 0.0, -net) for account_id, net in balances]
+
+
+def close_fiscal_year(db, year, retained_earnings_account_id):
+    if year >= date.today().year:
+        raise HTTPException(status_code=400, detail=f"السنة المالية {year} لم تنتهِ بعد")
+    closed = last_closed_year(db)
+    if closed is not None and year <= closed:
+        raise HTTPException(status_code=400, detail=f"السنة المالية {year} مقفلة بالفعل")
+    # السنوات تُقفل بالتتابع، وإلا أُرشفت سطور سنة غير مقفلة تحت سنة لاحقة
+    if closed is not None and year != closed + 1:
+        raise HTTPException(status_code=400, detail=f"يجب إقفال السنة المالية {closed + 1} أولاً")
+
+    retained = db.query(Account).filter(Account.id == retained_earnings_account_id).first()
+    if not retained or retained.type != "Equity":
+        raise HTTPException(status_code=400, detail="حساب الأرباح المحتجزة يجب أن يكون حساب حقوق ملكية")
+
+    year_end = date(year, 12, 31)
+
+    # 1) قيد الإقفال: عكس أرصدة الإيرادات والمصروفات والفرق في الأرباح المحتجزة
+    income = _net_balances(db, year_end, ("Revenue", "Expense"))
+    closing_entry = None
+    if income:
+        lines = _lines_for([(account_id, -net) for account_id, net in income])
+        net_income = sum(-net for _, net in income)  # دائن - مدين = صافي الربح
+        if abs(net_income) > TOLERANCE:
+            lines += _lines_for([(retained.id, -net_income)])
+        closing_entry = build_entry(year_end, f"قيد إقفال السنة المالية {year}", lines, source_type=FISCAL_CLOSE)
+        closing_entry.source_id = year
+        post(db, closing_entry)
+
+    # 2) قيد أرصدة أول السنة التالية (لا يُحدّث جداول الأرصدة)
+    opening_entry = build_entry(
+        date(year + 1, 1, 1),
+        f"أرصدة أول السنة المالية {year + 1}",
+        _lines_for(_net_balances(db, year_end)),
+        source_type=YEAR_OPENING,
+    )
+    opening_entry.source_id = year + 1
+    db.add(opening_entry)
+
+    # 3) أرشفة سطور السنة وحذف سطور قيد أرصدة أول السنة السابق (ملخّص لسطور مؤرشفة)
+    previous_openings = select(JournalEntry.id).where(
+        JournalEntry.source_type == YEAR_OPENING, JournalEntry.date <= year_end
+    )
+    db.execute(
+        delete(TransactionLine)
+        .where(TransactionLine.journal_entry_id.in_(previous_openings))
+        .execution_options(synchronize_session=False)
+    )
+    year_entries = select(JournalEntry.id).where(JournalEntry.date <= year_end)
+    db.execute(
+        insert(TransactionLineArchive).from_select(
+            ["id", "journal_entry_id", "account_id", "debit", "credit", "fiscal_year"],
+            select(
+                TransactionLine.id,
+                TransactionLine.journal_entry_id,
+                TransactionLine.account_id,
+                TransactionLine.debit,
+                TransactionLine.credit,
+                literal(year),
+            ).where(TransactionLine.journal_entry_id.in_(year_entries)),
+        )
+    )
+    archived = db.execute(
+        delete(TransactionLine)
+        .where(TransactionLine.journal_entry_id.in_(year_entries))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    db.flush()
+    record = FiscalYearClose(
+        year=year,
+        closed_on=date.today(),
+        retained_earnings_account_id=retained.id,
+        closing_entry_id=closing_entry.id if closing_entry else None,
+        opening_entry_id=opening_entry.id,
+    )
+    db.add(record)
+    db.commit()
+    return {
+        "year": year,
+        "closing_entry_id": record.closing_entry_id,
+        "opening_entry_id": record.opening_entry_id,
+        "archived_lines": archived,
+    }
+
+
+def reopen_fiscal_year(db, year):
+    """
+    إعادة فتح آخر سنة مقفلة (عكس close_fiscal_year): إرجاع سطورها من الأرشيف،
+    حذف قيد الإقفال وقيد أرصدة أول السنة التالية، وإعادة سطور قيد أرصدة أول
+    السنة نفسها إن كانت السنة السابقة مقفلة.
+    """
+    record = db.get(FiscalYearClose, year)
+    if not record:
+        raise HTTPException(status_code=404, detail=f"السنة المالية {year} غير مقفلة")
+    if year != last_closed_year(db):
+        raise HTTPException(status_code=400, detail="يمكن إعادة فتح آخر سنة مقفلة فقط")
+
+    closing_entry_id, opening_entry_id = record.closing_entry_id, record.opening_entry_id
+    db.delete(record)
+    db.flush()
+
+    # 1) قيد أرصدة أول السنة التالية (لم يُطبّق على جداول الأرصدة)
+    db.query(TransactionLine).filter(TransactionLine.journal_entry_id == opening_entry_id).delete(synchronize_session=False)
+    db.query(JournalEntry).filter(JournalEntry.id == opening_entry_id).delete(synchronize_session=False)
+
+    # 2) إرجاع سطور السنة من الأرشيف بنفس أرقامها
+    db.execute(
+        insert(TransactionLine).from_select(
+            ["id", "journal_entry_id", "account_id", "debit", "credit"],
+            select(
+                TransactionLineArchive.id,
+                TransactionLineArchive.journal_entry_id,
+                TransactionLineArchive.account_id,
+                TransactionLineArchive.debit,
+                TransactionLineArchive.credit,
+            ).where(TransactionLineArchive.fiscal_year == year),
+        )
+    )
+    restored = db.execute(
+        delete(TransactionLineArchive)
+        .where(TransactionLineArchive.fiscal_year == year)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # 3) عكس قيد الإقفال وحذفه
+    if closing_entry_id is not None:
+        reverse_journal_entry(db, closing_entry_id)
+        db.query(TransactionLine).filter(TransactionLine.journal_entry_id == closing_entry_id).delete(synchronize_session=False)
+        db.query(JournalEntry).filter(JournalEntry.id == closing_entry_id).delete(synchronize_session=False)
+
+    # 4) سطور قيد أرصدة أول هذه السنة حُذفت عند إقفالها؛ تُعاد من الأرصدة في نهاية السنة السابقة
+    previous = db.get(FiscalYearClose, year - 1)
+    if previous and previous.opening_entry_id is not None:
+        db.add_all([
+            TransactionLine(journal_entry_id=previous.opening_entry_id, account_id=account_id, debit=debit, credit=credit)
+            for account_id, debit, credit in _lines_for(_net_balances(db, date(year - 1, 12, 31)))
+        ])
+
+    db.commit()
+    return {"year": year, "restored_lines": restored}
+
+
+def _closing_totals(start_date=None, end_date=None):
+    """مجاميع سطور قيود الإقفال في فترة (قيود الإقفال مؤرشفة دائماً مع سنتها)"""
+    query = (
+        select(
+            TransactionLineArchive.account_id.label("account_id"),
+            func.coalesce(func.sum(TransactionLineArchive.debit), 0).label("debit_total"),
+            func.coalesce(func.sum(TransactionLineArchive.credit), 0).label("credit_total"),
+        )
+        .join(JournalEntry, JournalEntry.id == TransactionLineArchive.journal_entry_id)
+        .where(JournalEntry.source_type == FISCAL_CLOSE)
+    )
+    if start_date:
+        query = query.where(JournalEntry.date >= start_date)
+    if end_date:
+        query = query.where(JournalEntry.date <= end_date)
+    return query.group_by(TransactionLineArchive.account_id).subquery()
+
+
+def income_totals(start_date=None, end_date=None):
+    """مثل period_totals لكن بدون أثر قيود الإقفال، حتى تبقى قائمة دخل السنة المقفلة صحيحة"""
+    totals = period_totals(start_date, end_date)
+    closing = _closing_totals(start_date, end_date)
+    return (
+        select(
+            totals.c.account_id.label("account_id"),
+            (totals.c.debit_total - func.coalesce(closing.c.debit_total, 0)).label("debit_total"),
+            (totals.c.credit_total - func.coalesce(closing.c.credit_total, 0)).label("credit_total"),
+        )
+        .outerjoin(closing, closing.c.account_id == totals.c.account_id)
+        .subquery()
+    )
@@ -1,8 +1,77 @@
+"""
+إعدادات قاعدة البيانات من متغيرات البيئة (مع قيم افتراضية للتشغيل المحلي)
+
+DATABASE_URL إن وُجد يُستخدم كما هو، وإلا يُبنى من DB_CONFIG (DB_HOST، DB_PORT...).
+إعدادات الـ pool لمجموعتين منفصلتين من الاتصالات:
+- OLTP: الترحيل والشاشات العادية، بمهلة استعلام قصيرة.
+- REPORT: التقارير الثقيلة، بـ pool صغير ومهلة أطول، فلا يستهلك تقرير طويل
+  اتصالات ترحيل الفواتير.
+"""
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
 # إعدادات قاعدة البيانات
 DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'mrmr.dp2',
-    'user': 'openpg',
-    'password': '740203'
+    'host': os.getenv("DB_HOST", "localhost"),
+    'port': _env_int("DB_PORT", 5432),
+    'database': os.getenv("DB_NAME", "erp2_db"),
+    'user': os.getenv("DB_USER", "openpg"),
+    'password': os.getenv("DB_PASSWORD", "740203"),
 }
+
+DATABASE_URL = os.getenv("DATABASE_URL") or (
+    "postgresql://{user}:{password}@{host}:{port}/{database}".format(**DB_CONFIG)
+)
+
+# ASYNC_DB=1 يجعل نقاط القراءة والترحيل async على AsyncSession بدل الـ threadpool
+ASYNC_DB = _env_bool("ASYNC_DB", False)
+
+# مشترك بين المجموعتين
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)            # ثوانٍ (-1 للتعطيل)
+STATEMENT_CACHE_SIZE = _env_int("DB_STATEMENT_CACHE_SIZE", 500)  # ذاكرة SQL المترجم في SQLAlchemy وجمل asyncpg المُعدّة
+
+# OLTP
+POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 5000)
+
+# التقارير
+REPORT_DATABASE_URL = os.getenv("REPORT_DATABASE_URL") or DATABASE_URL
+REPORT_POOL_SIZE = _env_int("DB_REPORT_POOL_SIZE", 3)
+REPORT_MAX_OVERFLOW = _env_int("DB_REPORT_MAX_OVERFLOW", 2)
+REPORT_POOL_TIMEOUT = _env_int("DB_REPORT_POOL_TIMEOUT", 10)
+REPORT_STATEMENT_TIMEOUT_MS = _env_int("DB_REPORT_STATEMENT_TIMEOUT_MS", 60000)
+
+# نسخ القراءة (read replicas) للتقارير: روابط مفصولة بفواصل، فارغ = التقارير على الأساسي
+REPLICA_DATABASE_URLS = [u.strip() for u in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if u.strip()]
+REPLICA_RETRY_SECONDS = _env_int("REPLICA_RETRY_SECONDS", 30)   # مدة استبعاد نسخة لا تستجيب
+READ_YOUR_WRITES_SECONDS = _env_int("READ_YOUR_WRITES_SECONDS", 5)  # تثبيت العميل على الأساسي بعد الكتابة (0 للتعطيل)
+
+# SQLite (التشغيل المدمج بدون خادم: DATABASE_URL=sqlite:///erp.db)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_KB = _env_int("SQLITE_CACHE_KB", 20000)
+
+# إنذار N+1 (metrics.py): تسجيل أي طلب ينفّذ أكثر من هذا العدد من الاستعلامات (0 للتعطيل)
+N_PLUS_ONE_THRESHOLD = _env_int("N_PLUS_ONE_THRESHOLD", 50)
+
+# خصم المخزون (inventory.adjust_products): رفض البيع أو الصرف بكمية أكبر من الرصيد
+# بدل تصفير الرصيد، ويمكن تجاوزه لكل طلب بـ reject_if_insufficient
+REJECT_INSUFFICIENT_STOCK = _env_bool("REJECT_INSUFFICIENT_STOCK", False)
+
+# تنبيهات حد إعادة الطلب (low_stock.py): فترة فحص التنبيهات الجديدة في البث والـ long-poll،
+# وتعليق keep-alive في البث الصامت، وأقصى انتظار لطلب long-poll واحد، وعمر اتصال البث
+# (يعيد المتصفح الاتصال بعده من Last-Event-ID)
+LOW_STOCK_POLL_MS = _env_int("LOW_STOCK_POLL_MS", 1000)
+LOW_STOCK_HEARTBEAT_SECONDS = _env_int("LOW_STOCK_HEARTBEAT_SECONDS", 15)
+LOW_STOCK_MAX_WAIT_SECONDS = _env_int("LOW_STOCK_MAX_WAIT_SECONDS", 30)
+LOW_STOCK_STREAM_MAX_SECONDS = _env_int("LOW_STOCK_STREAM_MAX_SECONDS", 300)
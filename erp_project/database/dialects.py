@@ -0,0 +1,87 @@
+"""
+ما يختلف بين PostgreSQL وSQLite في مكان واحد
+
+- month_of(column): الشهر 'YYYY-MM' من عمود تاريخ (to_char في PostgreSQL،
+  strftime في SQLite)، لتجميع الحركات حسب الشهر بنفس الاستعلام على القاعدتين.
+- configure_sqlite(engine): إعدادات SQLite للتشغيل المدمج (بدون خادم):
+  WAL حتى لا تنتظر القراءة الكتابة، foreign_keys لتعمل ON DELETE CASCADE كما
+  في PostgreSQL، وbusy_timeout بدل الفشل الفوري عند انشغال القاعدة.
+  immediate=True يبدأ كل معاملة بـ BEGIN IMMEDIATE فتحجز المعاملة الكتابة من
+  أولها؛ بدونه تفشل معاملتان قرأتا ثم حاولتا الكتابة معاً (database is locked).
+- insert_returning_ids(db, model, rows): إدخال بالجملة مع أرقام الصفوف بنفس الترتيب.
+"""
+from sqlalchemy import String, event, func, insert, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from config import settings
+
+
+class month_of(FunctionElement):
+    type = String()
+    name = "month_of"
+    inherit_cache = True
+
+
+@compiles(month_of)
+def _month_of_postgresql(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(month_of, "sqlite")
+def _month_of_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size=-{settings.SQLITE_CACHE_KB}",
+)
+
+
+def configure_sqlite(engine, immediate=False):
+    """تطبيق الإعدادات على كل اتصال جديد (لا يفعل شيئاً لغير SQLite)"""
+    if engine.dialect.name != "sqlite":
+        return engine
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+        if immediate:
+            # pysqlite يبدأ المعاملة بنفسه (BEGIN مؤجل)؛ نتولى ذلك في "begin"
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+        @event.listens_for(sync_engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def insert_returning_ids(db, model, rows):
+    """
+    إدخال rows (قائمة قواميس) في جدول model وإرجاع أرقامها (id) بنفس ترتيب rows.
+
+    PostgreSQL: INSERT متعدد الصفوف مع RETURNING المرتب (sort_by_parameter_order).
+    SQLite لا يجمّع RETURNING المرتب (جملة لكل صف)، فيُدخل بـ executemany وتُقرأ
+    الأرقام بعد أكبر رقم قبل الإدخال: المعاملة تحمل قفل الكتابة الوحيد، والأرقام
+    الجديدة متتالية بترتيب الإدخال. الصف الواحد جملة INSERT ... RETURNING واحدة.
+    """
+    if not rows:
+        return []
+    if len(rows) == 1:
+        return [db.execute(insert(model.__table__).returning(model.id), rows[0]).scalar_one()]
+    if db.get_bind().dialect.name == "sqlite":
+        last_id = db.query(func.max(model.id)).scalar() or 0
+        db.execute(insert(model.__table__), rows)
+        return db.scalars(select(model.id).where(model.id > last_id).order_by(model.id)).all()
+    return db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
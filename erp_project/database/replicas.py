@@ -0,0 +1,96 @@
+"""
+توجيه جلسات التقارير (get_report_db) إلى نسخ القراءة (read replicas)
+
+- النسخ تُستخدم بالتناوب (round robin)؛ النسخة التي يفشل الاتصال بها تُستبعد
+  REPLICA_RETRY_SECONDS ثم تُجرَّب من جديد، وإن لم تتوفر أي نسخة تُستخدم
+  قاعدة البيانات الأساسية (pool التقارير).
+- "اقرأ ما كتبته": بعد أي طلب كتابة ناجح يحمل العميل كوكي PIN_COOKIE لمدة
+  READ_YOUR_WRITES_SECONDS، وخلالها تُقرأ تقاريره من الأساسي لأن النسخ قد تتأخر.
+  الكوكي يحمل الحالة، فلا تحتاج عمليات الخادم (workers) إلى مشاركة أي شيء.
+- AsyncReadRouter نفس التوجيه لجلسات AsyncSession (ASYNC_DB=1).
+"""
+import itertools
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database.dialects import configure_sqlite
+
+PIN_COOKIE = "erp_primary_pin"
+
+
+class ReadRouter:
+    def __init__(self, primary_factory, replica_urls, engine_options=None, retry_seconds=30):
+        self.primary_factory = primary_factory
+        self.retry_seconds = retry_seconds
+        self.replicas = [self._factory(url, engine_options(url) if engine_options else {}) for url in replica_urls]
+        self._down_until = [0.0] * len(self.replicas)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _factory(self, url, options):
+        return sessionmaker(autocommit=False, autoflush=False, bind=configure_sqlite(create_engine(url, **options)))
+
+    def _candidates(self):
+        if not self.replicas:
+            return []
+        start = next(self._next) % len(self.replicas)
+        now = time.monotonic()
+        order = self.replicas[start:] + self.replicas[:start]
+        indexes = list(range(start, len(self.replicas))) + list(range(start))
+        return [(i, factory) for i, factory in zip(indexes, order) if self._down_until[i] <= now]
+
+    def _mark_down(self, index):
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def session(self, pin_primary=False):
+        """جلسة قراءة على نسخة متاحة، أو على الأساسي"""
+        if not pin_primary:
+            for index, factory in self._candidates():
+                db = factory()
+                try:
+                    db.connection()  # حجز الاتصال الآن ليظهر فشل النسخة قبل أول استعلام
+                    return db
+                except OperationalError:
+                    db.close()
+                    self._mark_down(index)
+        return self.primary_factory()
+
+
+class AsyncReadRouter(ReadRouter):
+    """ReadRouter لجلسات AsyncSession: replica_urls بروابط المشغّل غير المتزامن (asyncpg/aiosqlite)"""
+
+    def _factory(self, url, options):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        return async_sessionmaker(configure_sqlite(create_async_engine(url, **options)), autoflush=False)
+
+    async def session(self, pin_primary=False):
+        if not pin_primary:
+            for index, factory in self._candidates():
+                db = factory()
+                try:
+                    await db.connection()
+                    return db
+                except OperationalError:
+                    await db.close()
+                    self._mark_down(index)
+        return self.primary_factory()
+
+
+def is_pinned(cookies):
+    """هل كتب العميل مؤخراً (الكوكي يحمل وقت انتهاء التثبيت)"""
+    try:
+        return float(cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin(response, seconds):
+    """تثبيت العميل على الأساسي لمدة seconds بعد الكتابة"""
+    if seconds > 0:
+        response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite="lax")
@@ -0,0 +1,156 @@
+"""
+تصدير دفتر الأستاذ والمستندات بصيغة CSV أو NDJSON كبث (streaming)
+
+الاستعلام يُنفّذ بمؤشر من جهة الخادم (yield_per يفعّل stream_results) فتُقرأ
+الصفوف على دفعات، وكل دفعة تُكتب وتُرسل فوراً؛ الذاكرة ثابتة مهما كان حجم
+التصدير. الجلسة تُفتح داخل المولّد نفسه لأن جلسة Depends تُغلق قبل انتهاء البث.
+"""
+import csv
+import io
+import json
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+
+from ledger import not_year_opening
+from models import (
+    Account, Department, JournalEntry, Payment, Product, SalesInvoice, StockMove, TransactionLine,
+    Vendor, VendorInvoice, Warehouse,
+)
+
+BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _rows(session_factory, statement):
+    db = session_factory()
+    try:
+        result = db.execute(statement.execution_options(yield_per=BATCH_SIZE))
+        for partition in result.mappings().partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def _csv(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # ليفتح Excel الملف بترميز UTF-8 (أسماء عربية)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([row[c] for c in columns] for row in rows)
+        yield buffer.getvalue()
+
+
+def _ndjson(partitions):
+    for rows in partitions:
+        yield "".join(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n" for row in rows)
+
+
+def export_response(session_factory, name, statement, fmt="csv"):
+    columns = [c.name for c in statement.selected_columns]
+    partitions = _rows(session_factory, statement)
+    body = _csv(columns, partitions) if fmt == "csv" else _ndjson(partitions)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+def _between(statement, column, start_date, end_date):
+    if start_date:
+        statement = statement.where(column >= start_date)
+    if end_date:
+        statement = statement.where(column <= end_date)
+    return statement
+
+
+def ledger_statement(account_id=None, start_date=None, end_date=None):
+    PaymentVendor = Vendor.__table__.alias("payment_vendor")
+    InvoiceVendor = Vendor.__table__.alias("invoice_vendor")
+    statement = (
+        select(
+            TransactionLine.id.label("id"),
+            JournalEntry.date.label("date"),
+            TransactionLine.journal_entry_id.label("journal_entry_id"),
+            JournalEntry.description.label("entry_desc"),
+            Account.code.label("account_code"),
+            Account.name.label("account_name"),
+            func.coalesce(InvoiceVendor.c.name, PaymentVendor.c.name).label("vendor_name"),
+            TransactionLine.debit.label("debit"),
+            TransactionLine.credit.label("credit"),
+        )
+        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .join(Account, Account.id == TransactionLine.account_id)
+        .outerjoin(VendorInvoice, VendorInvoice.journal_entry_id == JournalEntry.id)
+        .outerjoin(InvoiceVendor, InvoiceVendor.c.id == VendorInvoice.vendor_id)
+        .outerjoin(Payment, Payment.journal_entry_id == JournalEntry.id)
+        .outerjoin(PaymentVendor, PaymentVendor.c.id == Payment.vendor_id)
+        .where(not_year_opening())  # نفس سطور /ledger: بدون قيود أرصدة أول السنة
+    )
+    if account_id is not None:
+        statement = statement.where(TransactionLine.account_id == account_id)
+    statement = _between(statement, JournalEntry.date, start_date, end_date)
+    return statement.order_by(JournalEntry.date, TransactionLine.id)
+
+
+def vendor_invoices_statement(start_date=None, end_date=None):
+    statement = (
+        select(
+            VendorInvoice.id.label("id"),
+            VendorInvoice.date.label("date"),
+            Vendor.name.label("vendor_name"),
+            Department.name.label("department_name"),
+            VendorInvoice.total.label("total"),
+            VendorInvoice.journal_entry_id.label("journal_entry_id"),
+        )
+        .outerjoin(Vendor, Vendor.id == VendorInvoice.vendor_id)
+        .outerjoin(Department, Department.id == VendorInvoice.department_id)
+    )
+    statement = _between(statement, VendorInvoice.date, start_date, end_date)
+    return statement.order_by(VendorInvoice.date, VendorInvoice.id)
+
+
+def sales_invoices_statement(start_date=None, end_date=None):
+    statement = (
+        select(
+            SalesInvoice.id.label("id"),
+            SalesInvoice.date.label("date"),
+            SalesInvoice.customer_name.label("customer_name"),
+            Department.name.label("department_name"),
+            SalesInvoice.total.label("total"),
+            SalesInvoice.journal_entry_id.label("journal_entry_id"),
+        )
+        .outerjoin(Department, Department.id == SalesInvoice.department_id)
+    )
+    statement = _between(statement, SalesInvoice.date, start_date, end_date)
+    return statement.order_by(SalesInvoice.date, SalesInvoice.id)
+
+
+def stock_moves_statement(start_date=None, end_date=None):
+    statement = (
+        select(
+            StockMove.id.label("id"),
+            StockMove.date.label("date"),
+            Product.name.label("product_name"),
+            Warehouse.name.label("warehouse_name"),
+            Department.name.label("department_name"),
+            StockMove.quantity.label("quantity"),
+            StockMove.move_type.label("move_type"),
+            StockMove.reference.label("reference"),
+            StockMove.purpose.label("purpose"),
+        )
+        .outerjoin(Product, Product.id == StockMove.product_id)
+        .outerjoin(Warehouse, Warehouse.id == StockMove.warehouse_id)
+        .outerjoin(Department, Department.id == StockMove.department_id)
+    )
+    statement = _between(statement, StockMove.date, start_date, end_date)
+    return statement.order_by(StockMove.date, StockMove.id)
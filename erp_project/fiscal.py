@@ -0,0 +1,19 @@
+"""
+قفل السنوات المالية المقفلة: أي ترحيل أو حذف بتاريخ في سنة مقفلة يُرفض.
+"""
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from models import FiscalYearClose
+
+
+def last_closed_year(db):
+    """آخر سنة مالية مقفلة (أو None)"""
+    return db.query(func.max(FiscalYearClose.year)).scalar()
+
+
+def ensure_open(db, entry_date):
+    """رفض أي تعديل على قيود بتاريخ يقع في سنة مالية مقفلة"""
+    closed = last_closed_year(db)
+    if closed is not None and entry_date is not None and entry_date.year <= closed:
+        raise HTTPException(status_code=400, detail=f"السنة المالية {entry_date.year} مقفلة")
@@ -0,0 +1,175 @@
+"""
+استيراد القيود بالجملة من ملف CSV أو NDJSON
+
+كل صف = سطر قيد: entry_ref, date, description, account_code, debit, credit
+الصفوف ذات نفس entry_ref تكوّن قيداً واحداً. يُتحقق من كل صف (التاريخ، رمز
+الحساب من خريطة code -> id تُقرأ باستعلام واحد، المبالغ) ومن توازن كل قيد،
+ثم تُحفظ القيود السليمة دفعة واحدة داخل معاملة واحدة:
+journal_entries بـ INSERT متعدد الصفوف مع RETURNING، وtransaction_lines
+بـ COPY على PostgreSQL (أو executemany على غيره)، ثم تُحدَّث جداول الأرصدة
+بـ apply_deltas مرة واحدة لكل الملف (كل صف يومي يُحدَّث مرة واحدة).
+"""
+import csv
+import io
+import json
+import math
+from collections import OrderedDict, namedtuple
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from balances import TOLERANCE, apply_deltas
+from fiscal import last_closed_year
+from models import JOURNAL_IMPORT, Account, JournalEntry, TransactionLine
+
+COLUMNS = ("entry_ref", "date", "description", "account_code", "debit", "credit")
+
+Line = namedtuple("Line", "account_id debit credit")
+
+
+def decode_body(content):
+    """نص جسم الطلب (UTF-8 مع BOM أو بدونه)؛ الملف بترميز آخر يُرفض بـ 400 بدل خطأ 500"""
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"الملف ليس بترميز UTF-8 (البايت {exc.start})")
+
+
+def _parse(content, fmt):
+    text = decode_body(content)
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = {"_error": "سطر JSON غير صالح"}
+        if not isinstance(row, dict):
+            row = {"_error": "كل سطر يجب أن يكون كائن JSON"}
+        rows.append(row)
+    return rows
+
+
+def _amount(value):
+    if value in (None, ""):
+        return 0.0
+    amount = float(value)
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError
+    return amount
+
+
+def _validate(rows, account_ids, closed_year):
+    """إرجاع (القيود السليمة بالترتيب، قائمة الأخطاء لكل صف)"""
+    entries = OrderedDict()
+    errors = []
+    invalid_refs = set()
+
+    for number, row in enumerate(rows, start=1):
+        ref = str(row.get("entry_ref") or "").strip()
+        try:
+            if row.get("_error"):
+                raise ValueError(row["_error"])
+            if not ref:
+                raise ValueError("entry_ref مطلوب")
+            try:
+                entry_date = date.fromisoformat(str(row.get("date") or "").strip())
+            except ValueError:
+                raise ValueError("تاريخ غير صالح (YYYY-MM-DD)")
+            if closed_year is not None and entry_date.year <= closed_year:
+                raise ValueError(f"السنة المالية {entry_date.year} مقفلة")
+            account_id = account_ids.get(str(row.get("account_code") or "").strip())
+            if account_id is None:
+                raise ValueError(f"رمز حساب غير موجود: {row.get('account_code')}")
+            try:
+                debit, credit = _amount(row.get("debit")), _amount(row.get("credit"))
+            except (TypeError, ValueError):
+                raise ValueError("مبلغ غير صالح")
+            if (debit > 0) == (credit > 0):
+                raise ValueError("يجب أن يحتوي السطر على مدين أو دائن فقط")
+
+            entry = entries.setdefault(ref, {"date": entry_date, "description": row.get("description"), "lines": [], "rows": []})
+            if entry["date"] != entry_date:
+                raise ValueError("كل سطور القيد يجب أن تحمل نفس التاريخ")
+            entry["lines"].append(Line(account_id, debit, credit))
+            entry["rows"].append(number)
+        except ValueError as exc:
+            errors.append({"row": number, "entry_ref": ref or None, "error": str(exc)})
+            if ref:
+                invalid_refs.add(ref)
+
+    for ref, entry in entries.items():
+        if ref in invalid_refs:
+            continue
+        debit = sum(l.debit for l in entry["lines"])
+        credit = sum(l.credit for l in entry["lines"])
+        if abs(debit - credit) > TOLERANCE:
+            invalid_refs.add(ref)
+            errors.append({
+                "row": entry["rows"][0],
+                "entry_ref": ref,
+                "error": f"القيد غير متوازن: مدين {debit} / دائن {credit}",
+            })
+
+    valid = [(ref, entry) for ref, entry in entries.items() if ref not in invalid_refs]
+    return valid, sorted(errors, key=lambda e: e["row"])
+
+
+def _copy_lines(db, lines):
+    """COPY transaction_lines FROM STDIN عبر اتصال psycopg2 الخاص بالجلسة"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (l["journal_entry_id"], l["account_id"], l["debit"], l["credit"]) for l in lines
+    )
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY transaction_lines (journal_entry_id, account_id, debit, credit) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def import_journal_entries(db, content, fmt="csv", all_or_nothing=False):
+    rows = _parse(content, fmt)
+    account_ids = dict(db.query(Account.code, Account.id).all())
+    valid, errors = _validate(rows, account_ids, last_closed_year(db))
+
+    if not valid or (errors and all_or_nothing):
+        db.rollback()
+        return {"imported_entries": 0, "imported_lines": 0, "errors": errors}
+
+    entry_ids = db.scalars(
+        insert(JournalEntry).returning(JournalEntry.id, sort_by_parameter_order=True),
+        [
+            {"date": entry["date"], "description": entry["description"] or ref, "source_type": JOURNAL_IMPORT}
+            for ref, entry in valid
+        ],
+    ).all()
+
+    lines = [
+        {"journal_entry_id": entry_id, "account_id": l.account_id, "debit": l.debit, "credit": l.credit}
+        for entry_id, (ref, entry) in zip(entry_ids, valid)
+        for l in entry["lines"]
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_lines(db, lines)
+    else:
+        db.execute(insert(TransactionLine), lines)
+
+    # تحديث الأرصدة مرة واحدة بمجاميع كل (حساب، تاريخ)
+    deltas = {}
+    for ref, entry in valid:
+        for l in entry["lines"]:
+            debit, credit = deltas.get((l.account_id, entry["date"]), (0.0, 0.0))
+            deltas[(l.account_id, entry["date"])] = (debit + l.debit, credit + l.credit)
+    apply_deltas(db, deltas)
+
+    db.commit()
+    return {"imported_entries": len(entry_ids), "imported_lines": len(lines), "errors": errors}
@@ -0,0 +1,324 @@
+"""
+أرصدة المخزون لكل منتج في كل مخزن (stock_balances) المشتقة من حركات المخزون:
+    quantity = مجموع الحركات الواردة (in) - الصادرة (out) للمنتج في المخزن
+
+كل مسار ينشئ حركة مخزون يستدعي apply_moves داخل نفس المعاملة التي تحفظ الحركة،
+وكل مسار حذف يستدعي reverse_moves قبل حذف الحركات. قراءة رصيد منتج في مخزن
+بحث واحد على المفتاح (product_id, warehouse_id) بدل جمع كل حركاته.
+
+Product.quantity_on_hand يبقى الرصيد الإجمالي الذي تعرضه الشاشات الحالية، ويُعدَّل
+بـ adjust_products: قفل صفوف المنتجات بترتيب رقمها ثم جملة UPDATE ... RETURNING واحدة
+لكل المنتجات بدل قراءته وتعديله في Python، فلا يضيع خصم بائعَين متزامنين لنفس المنتج.
+نفس المعاملة تسجّل تنبيه المنتج الذي عبر حد إعادة الطلب (low_stock.py).
+
+الصرف بأكثر من المتاح:
+- مع reject_if_insufficient يُرفض إن لم يكفِ الرصيد الإجمالي أو رصيد المخزن الذي يُصرف منه
+  (صفوف stock_balances تُقفل مع صفوف المنتجات قبل الفحص، short_balances).
+- بدونه يتوقف quantity_on_hand عند الصفر، أما رصيد المخزن فيتبع الحركات كما هي وقد
+  يصبح سالباً فيظهر العجز في المخزن. لذلك لا يُقارن quantity_on_hand بمجموع أرصدة
+  المخازن (وفيه أيضاً الرصيد الافتتاحي الذي لم يدخل مخزناً)، ويقارن verify الأرصدة
+  بالحركات فقط، وهي متطابقة في الحالتين.
+
+أمر إعادة البناء والتحقق (من داخل مجلد erp_project):
+    python -m inventory verify    # يعرض الفروقات بين الجدول وحركات المخزون
+    python -m inventory rebuild   # يعيد حساب الجدول من StockMove
+"""
+import argparse
+import sys
+from collections import namedtuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, select, tuple_, update
+
+from balances import TOLERANCE, upsert_insert
+from low_stock import is_below, record_crossings
+from models import STOCK_TRANSFER, Product, StockBalance, StockMove
+
+SIGNS = {"in": 1, "out": -1}
+
+# حركة مخزون قبل إدخالها بالجملة (INSERT بقاموس لكل صف عبر _asdict)
+Move = namedtuple(
+    "Move",
+    "product_id warehouse_id department_id date quantity move_type reference purpose source_type source_id",
+    defaults=(None, None),
+)
+
+
+def signed_quantity():
+    """كمية الحركة بإشارتها: موجبة للوارد وسالبة للصادر"""
+    return case(
+        (StockMove.move_type == "in", StockMove.quantity),
+        (StockMove.move_type == "out", -StockMove.quantity),
+        else_=0.0,
+    )
+
+
+def lock_products(db, product_ids):
+    """
+    {product_id: quantity_on_hand} للمنتجات الموجودة باستعلام IN واحد، مع قفل صفوفها
+    (SELECT ... FOR UPDATE) بترتيب رقمها حتى نهاية المعاملة: فاتورتان متزامنتان تأخذان
+    أقفال منتجاتهما بنفس الترتيب فلا يحدث deadlock. (SQLite يتجاهل FOR UPDATE)
+    """
+    return {
+        p.id: p.quantity_on_hand or 0.0
+        for p in db.query(Product.id, Product.quantity_on_hand)
+        .filter(Product.id.in_(list(product_ids)))
+        .order_by(Product.id)
+        .with_for_update()
+    }
+
+
+def update_products(db, deltas, on_hand):
+    """
+    quantity_on_hand = quantity_on_hand + delta لكل المنتجات في جملة UPDATE ... RETURNING
+    واحدة (CASE على id)، مع التصفير إن صار الرصيد سالباً.
+    on_hand = الأرصدة المقفولة قبل التعديل (lock_products): المنتج الذي عبر حد إعادة
+    الطلب بهذا التعديل يُسجَّل له تنبيه في نفس المعاملة (low_stock.record_crossings).
+    إرجاع {product_id: (name, quantity_on_hand, reorder_level)} بعد التعديل.
+    """
+    if not deltas:
+        return {}
+    updated = func.coalesce(Product.quantity_on_hand, 0.0) + case(deltas, value=Product.id, else_=0.0)
+    rows = db.execute(
+        update(Product)
+        .where(Product.id.in_(list(deltas)))
+        .values(quantity_on_hand=case((updated > 0, updated), else_=0.0))
+        .returning(Product.id, Product.name, Product.quantity_on_hand, Product.reorder_level),
+        execution_options={"synchronize_session": False},
+    ).all()
+    record_crossings(db, {row.id: is_below(on_hand[row.id], row.reorder_level) for row in rows}, rows)
+    return {row.id: row for row in rows}
+
+
+def lock_balances(db, keys):
+    """
+    {(product_id, warehouse_id): quantity} لأرصدة المخازن المطلوبة باستعلام واحد، مع قفل
+    صفوفها بترتيب المفتاح (نفس ترتيب apply_moves) حتى نهاية المعاملة. المفتاح الذي ليس
+    له صف لا يظهر في النتيجة (رصيده صفر).
+    """
+    keys = sorted(keys)
+    if not keys:
+        return {}
+    return {
+        (b.product_id, b.warehouse_id): b.quantity or 0.0
+        for b in db.query(StockBalance.product_id, StockBalance.warehouse_id, StockBalance.quantity)
+        .filter(tuple_(StockBalance.product_id, StockBalance.warehouse_id).in_(keys))
+        .order_by(StockBalance.product_id, StockBalance.warehouse_id)
+        .with_for_update()
+    }
+
+
+def short_balances(db, deltas):
+    """
+    deltas = {(product_id, warehouse_id): صافي الحركة}. إرجاع {المفتاح: الرصيد المتاح}
+    للمفاتيح التي يتجاوز صرفها رصيد المخزن. يقفل أرصدة المفاتيح المصروفة (lock_balances).
+    """
+    outgoing = [key for key, delta in deltas.items() if delta < 0]
+    balances = lock_balances(db, outgoing)
+    return {
+        key: balances.get(key, 0.0)
+        for key in sorted(outgoing)
+        if balances.get(key, 0.0) + deltas[key] < -TOLERANCE
+    }
+
+
+def adjust_products(db, deltas, reject_if_insufficient=False, warehouse_id=None):
+    """
+    تعديل Product.quantity_on_hand بـ deltas = {product_id: delta} (سالب للصرف)
+    وإرجاع {product_id: (name, quantity_on_hand, reorder_level)} بعد التعديل.
+
+    استعلامان مهما كان عدد المنتجات: قفل الصفوف (lock_products) ثم التعديل على
+    القيمة المخزّنة نفسها في قاعدة البيانات (update_products)، فلا يضيع خصم بائعَين
+    متزامنين لنفس المنتج.
+
+    الصرف بكمية أكبر من الرصيد يصفّر الرصيد (السلوك السابق)، أو يُرفض بـ 409
+    مع reject_if_insufficient فيُلغى الطلب كله. warehouse_id = المخزن الذي تُصرف منه
+    الكميات: مع reject_if_insufficient يجب أن يكفي رصيد المنتج فيه أيضاً.
+    المنتجات غير الموجودة لا تظهر في النتيجة. لا تقوم بـ commit.
+    """
+    on_hand = lock_products(db, deltas)
+    if reject_if_insufficient:
+        for product_id in sorted(on_hand):
+            if on_hand[product_id] + deltas[product_id] < -TOLERANCE:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"الكمية المتاحة من المنتج {product_id} ({on_hand[product_id]}) أقل من المطلوب ({-deltas[product_id]})",
+                )
+        if warehouse_id is not None:
+            short = short_balances(db, {(product_id, warehouse_id): deltas[product_id] for product_id in on_hand})
+            if short:
+                (product_id, _), available = next(iter(short.items()))
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"الكمية المتاحة من المنتج {product_id} في المخزن {warehouse_id} ({available}) أقل من المطلوب ({-deltas[product_id]})",
+                )
+    return update_products(db, {product_id: deltas[product_id] for product_id in on_hand}, on_hand)
+
+
+def _deltas(moves, sign=1):
+    """{(product_id, warehouse_id): delta} لحركات لها منتج ومخزن"""
+    deltas = {}
+    for m in moves:
+        if m.product_id is None or m.warehouse_id is None:
+            continue
+        key = (m.product_id, m.warehouse_id)
+        deltas[key] = deltas.get(key, 0.0) + sign * SIGNS.get(m.move_type, 0) * (m.quantity or 0)
+    return deltas
+
+
+def _increment(db, rows):
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + delta لكل الصفوف في
+    جملة واحدة (executemany)؛ rows = [{product_id, warehouse_id, quantity: delta}, ...]
+    بمفاتيح غير مكررة.
+    """
+    stmt = upsert_insert(db, StockBalance)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["product_id", "warehouse_id"],
+            set_={"quantity": StockBalance.quantity + stmt.excluded.quantity},
+        ),
+        rows,
+    )
+
+
+def _withdraw(db, product_id, warehouse_id, quantity):
+    """
+    خصم كمية من رصيد المخزن بشرط كفايته في جملة UPDATE واحدة، فلا يخصم
+    تحويلان متزامنان نفس الكمية مرتين.
+    """
+    updated = (
+        db.query(StockBalance)
+        .filter(
+            StockBalance.product_id == product_id,
+            StockBalance.warehouse_id == warehouse_id,
+            StockBalance.quantity >= quantity - TOLERANCE,
+        )
+        .update({StockBalance.quantity: StockBalance.quantity - quantity}, synchronize_session=False)
+    )
+    if not updated:
+        raise HTTPException(status_code=400, detail="الكمية في المخزن المصدر غير كافية")
+
+
+def apply_moves(db, moves, sign=1):
+    """
+    إضافة حركات مخزون إلى أرصدة المخازن (sign=-1 لعكسها عند الحذف).
+    المفاتيح تُحدَّث بترتيب ثابت فلا يحدث deadlock بين معاملتين متزامنتين.
+    لا تقوم بـ commit؛ التعديل يُحفظ مع معاملة الحركة نفسها.
+    """
+    rows = [
+        {"product_id": product_id, "warehouse_id": warehouse_id, "quantity": delta}
+        for (product_id, warehouse_id), delta in sorted(_deltas(moves, sign).items())
+        if delta
+    ]
+    if rows:
+        _increment(db, rows)
+
+
+def reverse_moves(db, query):
+    """عكس أثر الحركات التي يعيدها query (على StockMove) قبل حذفها"""
+    moves = query.with_entities(
+        StockMove.product_id, StockMove.warehouse_id, StockMove.move_type, StockMove.quantity
+    ).all()
+    apply_moves(db, moves, sign=-1)
+
+
+def transfer(db, product_id, from_warehouse_id, to_warehouse_id, quantity, move_date,
+             reference=None, department_id=None):
+    """
+    تحويل كمية بين مخزنين: حركة صادر من المصدر ووارد إلى الوجهة في نفس المعاملة،
+    مرتبطتان بـ source_type=stock_transfer و source_id = رقم حركة الصادر.
+    الرصيد الإجمالي للمنتج لا يتغير. لا تقوم بـ commit.
+    """
+    if from_warehouse_id == to_warehouse_id:
+        raise HTTPException(status_code=400, detail="المخزن المصدر والوجهة متطابقان")
+    if quantity <= 0:
+        raise HTTPException(status_code=400, detail="كمية التحويل يجب أن تكون أكبر من صفر")
+
+    legs = [
+        StockMove(
+            product_id=product_id, warehouse_id=warehouse_id, department_id=department_id, date=move_date,
+            quantity=quantity, move_type=move_type, reference=reference, purpose="transfer",
+            source_type=STOCK_TRANSFER,
+        )
+        for warehouse_id, move_type in ((from_warehouse_id, "out"), (to_warehouse_id, "in"))
+    ]
+    db.add_all(legs)
+    db.flush()
+    for leg in legs:
+        leg.source_id = legs[0].id
+
+    # نفس ترتيب المفاتيح في apply_moves
+    for warehouse_id in sorted((from_warehouse_id, to_warehouse_id)):
+        if warehouse_id == from_warehouse_id:
+            _withdraw(db, product_id, warehouse_id, quantity)
+        else:
+            _increment(db, [{"product_id": product_id, "warehouse_id": warehouse_id, "quantity": quantity}])
+    return legs
+
+
+def _move_totals(db):
+    rows = db.execute(
+        select(StockMove.product_id, StockMove.warehouse_id, func.sum(signed_quantity()))
+        .where(StockMove.product_id.isnot(None), StockMove.warehouse_id.isnot(None))
+        .group_by(StockMove.product_id, StockMove.warehouse_id)
+    ).all()
+    return {(product_id, warehouse_id): float(total or 0) for product_id, warehouse_id, total in rows}
+
+
+def verify(db):
+    """
+    إرجاع قائمة الأرصدة المخزّنة التي تختلف عن مجموع حركات المخزون. الرصيد السالب بعد
+    صرف بلا reject_if_insufficient ليس فرقاً: هو مجموع الحركات نفسه.
+    """
+    expected = _move_totals(db)
+    stored = {(b.product_id, b.warehouse_id): b.quantity or 0.0 for b in db.query(StockBalance).all()}
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        if abs(expected.get(key, 0.0) - stored.get(key, 0.0)) > TOLERANCE:
+            drift.append({
+                "table": StockBalance.__tablename__,
+                "key": key,
+                "expected_quantity": expected.get(key, 0.0),
+                "stored_quantity": stored.get(key, 0.0),
+            })
+    return drift
+
+
+def rebuild(db):
+    """إعادة حساب stock_balances بالكامل من StockMove"""
+    totals = _move_totals(db)
+    db.query(StockBalance).delete(synchronize_session=False)
+    db.add_all([
+        StockBalance(product_id=product_id, warehouse_id=warehouse_id, quantity=quantity)
+        for (product_id, warehouse_id), quantity in totals.items()
+    ])
+    db.commit()
+    return len(totals)
+
+
+def main(argv=None):
+    from database.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="إعادة بناء أو التحقق من أرصدة المخازن")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db)
+            print(f"تمت إعادة بناء {count} رصيد منتج في مخزن")
+            return 0
+
+        drift = verify(db)
+        for d in drift:
+            print(f"{d['table']} {d['key']}: quantity {d['stored_quantity']} != {d['expected_quantity']}")
+        print(f"{len(drift)} صف به فروقات")
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
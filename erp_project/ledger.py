@@ -0,0 +1,225 @@
+"""
+دفتر الأستاذ مقسّم إلى صفحات (keyset pagination على (date, journal_entry_id, id))
+
+الترتيب يتبع الفهرس ix_journal_entries_date_id ثم سطور كل قيد عبر
+ix_transaction_lines_journal_entry_id، فتُقرأ الصفحة من موضع المؤشر مباشرة
+وتتوقف عند LIMIT بدل ترتيب كل السطور التي بعده.
+
+الرصيد الجاري لكل سطر = الرصيد الافتتاحي للحساب قبل أول سطر له في الصفحة
+(يُحسب في قاعدة البيانات) + مجموع تراكمي داخل الصفحة بدالة نافذة (window function).
+الرصيد الافتتاحي = الرصيد التراكمي حتى اليوم السابق من account_daily_balances
++ سطور نفس اليوم التي تسبق السطر، لذلك تكلفة الصفحة لا تعتمد على موقعها في الدفتر.
+
+قيد أرصدة أول السنة (year_opening) لا يظهر في الدفتر: الرصيد التراكمي اليومي
+يشمل السنوات المقفلة أصلاً، والقيد مجرد تلخيص لسطورها المؤرشفة.
+"""
+from sqlalchemy import and_, func, literal, or_, select, union_all
+from sqlalchemy.orm import aliased
+
+from models import YEAR_OPENING, Account, AccountDailyBalance, JournalEntry, Payment, TransactionLine, Vendor, VendorInvoice
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def _after(after_date, after_entry_id, after_id):
+    """
+    شرط (date, journal_entry_id, id) > المؤشر بصيغة تعمل على كل قواعد البيانات،
+    مع حد date >= after_date الذي يستطيع الفهرس استخدامه مباشرة.
+    """
+    return and_(
+        JournalEntry.date >= after_date,
+        or_(
+            JournalEntry.date > after_date,
+            JournalEntry.id > after_entry_id,
+            and_(JournalEntry.id == after_entry_id, TransactionLine.id > after_id),
+        ),
+    )
+
+
+def _before(key_entry_id, key_id):
+    """سطور نفس اليوم التي تسبق (journal_entry_id, id) في ترتيب الدفتر"""
+    return or_(
+        TransactionLine.journal_entry_id < key_entry_id,
+        and_(TransactionLine.journal_entry_id == key_entry_id, TransactionLine.id < key_id),
+    )
+
+
+def not_year_opening():
+    """استبعاد قيود أرصدة أول السنة من الدفتر"""
+    return or_(JournalEntry.source_type.is_(None), JournalEntry.source_type != YEAR_OPENING)
+
+
+def _opening_balances(db, first_keys):
+    """
+    رصيد كل حساب (مدين - دائن) قبل أول سطر له في الصفحة، باستعلامين ثابتين
+    first_keys: {account_id: (date, journal_entry_id, line_id)}
+    """
+    if not first_keys:
+        return {}
+
+    # 1) الرصيد التراكمي حتى نهاية اليوم السابق: آخر صف يومي قبل التاريخ لكل حساب
+    Earlier = aliased(AccountDailyBalance)
+    prior_conditions = [
+        and_(
+            AccountDailyBalance.account_id == account_id,
+            AccountDailyBalance.day == (
+                select(func.max(Earlier.day))
+                .where(Earlier.account_id == account_id, Earlier.day < key_date)
+                .scalar_subquery()
+            ),
+        )
+        for account_id, (key_date, key_entry_id, key_id) in first_keys.items()
+    ]
+    opening = {
+        account_id: float(debit or 0) - float(credit or 0)
+        for account_id, debit, credit in db.execute(
+            select(
+                AccountDailyBalance.account_id,
+                AccountDailyBalance.debit_total,
+                AccountDailyBalance.credit_total,
+            ).where(or_(*prior_conditions))
+        ).all()
+    }
+
+    # 2) سطور نفس اليوم التي تسبق أول سطر للحساب في الصفحة
+    same_day_conditions = [
+        and_(
+            TransactionLine.account_id == account_id,
+            JournalEntry.date == key_date,
+            _before(key_entry_id, key_id),
+        )
+        for account_id, (key_date, key_entry_id, key_id) in first_keys.items()
+    ]
+    rows = db.execute(
+        select(
+            TransactionLine.account_id,
+            func.coalesce(func.sum(func.coalesce(TransactionLine.debit, 0) - func.coalesce(TransactionLine.credit, 0)), 0),
+        )
+        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .where(or_(*same_day_conditions), not_year_opening())
+        .group_by(TransactionLine.account_id)
+    ).all()
+    for account_id, total in rows:
+        opening[account_id] = opening.get(account_id, 0.0) + float(total or 0)
+    return opening
+
+
+def resolve_vendor_names(db, journal_entry_ids):
+    """
+    اسم المورد لكل قيد في استعلام واحد: من فاتورة المورد المرتبطة بالقيد أولاً،
+    وإن لم توجد فمن الدفعة المرتبطة به.
+    """
+    ids = [i for i in journal_entry_ids if i is not None]
+    if not ids:
+        return {}
+
+    from_invoices = (
+        select(VendorInvoice.journal_entry_id.label("journal_entry_id"), Vendor.name.label("name"), literal(0).label("priority"))
+        .join(Vendor, Vendor.id == VendorInvoice.vendor_id)
+        .where(VendorInvoice.journal_entry_id.in_(ids))
+    )
+    from_payments = (
+        select(Payment.journal_entry_id.label("journal_entry_id"), Vendor.name.label("name"), literal(1).label("priority"))
+        .join(Vendor, Vendor.id == Payment.vendor_id)
+        .where(Payment.journal_entry_id.in_(ids))
+    )
+    rows = db.execute(union_all(from_invoices, from_payments)).all()
+
+    names = {}
+    for journal_entry_id, name, priority in sorted(rows, key=lambda r: r.priority):
+        names.setdefault(journal_entry_id, name)
+    return names
+
+
+def ledger_page(
+    db,
+    account_id=None,
+    start_date=None,
+    end_date=None,
+    journal_entry_id=None,
+    after_date=None,
+    after_id=None,
+    limit=DEFAULT_PAGE_SIZE,
+    after_journal_entry_id=None,
+):
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    PaymentVendor = Vendor.__table__.alias("payment_vendor")
+    InvoiceVendor = Vendor.__table__.alias("invoice_vendor")
+
+    page = (
+        select(
+            TransactionLine.id.label("id"),
+            TransactionLine.journal_entry_id.label("journal_entry_id"),
+            TransactionLine.account_id.label("account_id"),
+            TransactionLine.debit.label("debit"),
+            TransactionLine.credit.label("credit"),
+            JournalEntry.date.label("date"),
+            JournalEntry.description.label("entry_desc"),
+            Account.name.label("account_name"),
+            func.coalesce(InvoiceVendor.c.name, PaymentVendor.c.name).label("vendor_name"),
+        )
+        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .join(Account, Account.id == TransactionLine.account_id)
+        .outerjoin(VendorInvoice, VendorInvoice.journal_entry_id == JournalEntry.id)
+        .outerjoin(InvoiceVendor, InvoiceVendor.c.id == VendorInvoice.vendor_id)
+        .outerjoin(Payment, Payment.journal_entry_id == JournalEntry.id)
+        .outerjoin(PaymentVendor, PaymentVendor.c.id == Payment.vendor_id)
+        .where(not_year_opening())
+    )
+
+    if account_id is not None:
+        page = page.where(TransactionLine.account_id == account_id)
+    if journal_entry_id is not None:
+        page = page.where(TransactionLine.journal_entry_id == journal_entry_id)
+    if start_date:
+        page = page.where(JournalEntry.date >= start_date)
+    if end_date:
+        page = page.where(JournalEntry.date <= end_date)
+    if after_date is not None and after_id is not None:
+        if after_journal_entry_id is None:
+            # مؤشر قديم بدون رقم القيد: يُستنتج من السطر نفسه
+            after_journal_entry_id = (
+                select(TransactionLine.journal_entry_id).where(TransactionLine.id == after_id).scalar_subquery()
+            )
+        page = page.where(_after(after_date, after_journal_entry_id, after_id))
+
+    page = page.order_by(JournalEntry.date, JournalEntry.id, TransactionLine.id).limit(limit).subquery()
+
+    # المجموع التراكمي داخل الصفحة فقط (بعد LIMIT)
+    running = func.sum(
+        func.coalesce(page.c.debit, 0) - func.coalesce(page.c.credit, 0)
+    ).over(partition_by=page.c.account_id, order_by=(page.c.date, page.c.journal_entry_id, page.c.id))
+
+    rows = db.execute(
+        select(page, running.label("page_balance")).order_by(page.c.date, page.c.journal_entry_id, page.c.id)
+    ).all()
+
+    first_keys = {}
+    for r in rows:
+        first_keys.setdefault(r.account_id, (r.date, r.journal_entry_id, r.id))
+    opening = _opening_balances(db, first_keys)
+
+    items = [
+        {
+            "id": r.id,
+            "journal_entry_id": r.journal_entry_id,
+            "account_id": r.account_id,
+            "date": r.date,
+            "entry_desc": r.entry_desc,
+            "account_name": r.account_name,
+            "vendor_name": r.vendor_name,
+            "debit": r.debit,
+            "credit": r.credit,
+            "balance": opening.get(r.account_id, 0.0) + float(r.page_balance or 0),
+        }
+        for r in rows
+    ]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = {"after_date": last.date, "after_journal_entry_id": last.journal_entry_id, "after_id": last.id}
+
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,157 @@
+"""
+تنبيهات حد إعادة الطلب
+
+المنتج "تحت الحد" إذا كان quantity_on_hand < reorder_level، وهو نفس شرط فهرس
+ix_products_below_reorder الجزئي، فقائمة المنتجات تحت الحد (below_reorder) تُقرأ من
+الفهرس بدل فحص جدول المنتجات.
+
+record_crossings تُستدعى داخل معاملة تعديل الرصيد نفسها (inventory.update_products
+وتعديل المنتج)، وتكتب في low_stock_alerts صفاً لكل منتج عبر الحد نزولاً (below) أو
+صعوداً (recovered). التنبيه يُعتمد أو يُلغى مع الحركة التي سببته.
+
+القراءة بترتيب id بعد آخر تنبيه استلمه العميل: long-poll (wait_for_alerts) أو
+server-sent events (event_stream) يكمل من Last-Event-ID عند إعادة الاتصال.
+في PostgreSQL تأخذ المعاملة التي تكتب تنبيهاً قفلاً استشارياً حتى نهايتها
+(pg_advisory_xact_lock)، فتُعتمد التنبيهات بترتيب أرقامها ولا يفوت القارئ تنبيهاً
+برقم أصغر اعتُمد بعد تقدّمه. العبور نادر، فلا يتسلسل إلا ما يكتب تنبيهاً.
+"""
+import asyncio
+import json
+import time
+
+from sqlalchemy import func, insert, select
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from models import LowStockAlert, Product
+
+BELOW = "below"
+RECOVERED = "recovered"
+
+# مفتاح القفل الاستشاري لكتابة التنبيهات
+ALERTS_LOCK_KEY = 7140025
+
+
+def is_below(quantity_on_hand, reorder_level):
+    """نفس شرط الفهرس الجزئي: القيمة الفارغة (NULL) لا تُعد تحت الحد"""
+    return quantity_on_hand is not None and reorder_level is not None and quantity_on_hand < reorder_level
+
+
+def record_crossings(db, was_below, products):
+    """
+    was_below = {product_id: هل كان تحت الحد قبل التعديل}، وproducts صفوف المنتجات بعده
+    (id, quantity_on_hand, reorder_level). تكتب تنبيهاً لكل منتج تغيّرت حالته وتعيد
+    قائمة التنبيهات. لا تقوم بـ commit.
+    """
+    alerts = []
+    for p in sorted(products, key=lambda p: p.id):
+        below = is_below(p.quantity_on_hand, p.reorder_level)
+        if below != was_below[p.id]:
+            alerts.append({
+                "product_id": p.id,
+                "state": BELOW if below else RECOVERED,
+                "quantity_on_hand": p.quantity_on_hand,
+                "reorder_level": p.reorder_level,
+            })
+    if alerts:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(select(func.pg_advisory_xact_lock(ALERTS_LOCK_KEY)))
+        db.execute(insert(LowStockAlert.__table__), alerts)
+    return alerts
+
+
+def below_reorder(db):
+    """المنتجات تحت حد إعادة الطلب حالياً (من الفهرس الجزئي)"""
+    rows = (
+        db.query(Product.id, Product.name, Product.quantity_on_hand, Product.reorder_level)
+        .filter(Product.quantity_on_hand < Product.reorder_level)
+        .order_by(Product.id)
+        .all()
+    )
+    return [
+        {"product_id": r.id, "name": r.name, "quantity_on_hand": r.quantity_on_hand, "reorder_level": r.reorder_level}
+        for r in rows
+    ]
+
+
+def alerts_after(db, after_id=0, limit=100):
+    rows = (
+        db.query(LowStockAlert, Product.name)
+        .join(Product, Product.id == LowStockAlert.product_id)
+        .filter(LowStockAlert.id > after_id)
+        .order_by(LowStockAlert.id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "id": a.id,
+            "product_id": a.product_id,
+            "product_name": name,
+            "state": a.state,
+            "quantity_on_hand": a.quantity_on_hand,
+            "reorder_level": a.reorder_level,
+            "created_at": a.created_at.isoformat() if a.created_at else None,
+        }
+        for a, name in rows
+    ]
+
+
+def _latest_id(session_factory):
+    db = session_factory()
+    try:
+        return db.query(func.max(LowStockAlert.id)).scalar() or 0
+    finally:
+        db.close()
+
+
+async def latest_alert_id(session_factory):
+    """رقم آخر تنبيه (0 إن لم يوجد): بداية بث لا يريد التنبيهات السابقة"""
+    return await run_in_threadpool(_latest_id, session_factory)
+
+
+def _fetch(session_factory, after_id, limit):
+    db = session_factory()
+    try:
+        return alerts_after(db, after_id, limit)
+    finally:
+        db.close()
+
+
+async def wait_for_alerts(session_factory, after_id=0, limit=100, wait=0):
+    """long-poll: التنبيهات بعد after_id، أو انتظار أولها حتى wait ثانية (قائمة فارغة بعدها)"""
+    deadline = time.monotonic() + min(wait, settings.LOW_STOCK_MAX_WAIT_SECONDS)
+    while True:
+        alerts = await run_in_threadpool(_fetch, session_factory, after_id, limit)
+        remaining = deadline - time.monotonic()
+        if alerts or remaining <= 0:
+            return alerts
+        await asyncio.sleep(min(settings.LOW_STOCK_POLL_MS / 1000, remaining))
+
+
+def format_event(alert):
+    return f"id: {alert['id']}\nevent: {alert['state']}\ndata: {json.dumps(alert, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(session_factory, after_id, is_disconnected):
+    """
+    بث SSE: كل تنبيه بعد after_id حدث (id, event = below/recovered, data = JSON)،
+    وتعليق keep-alive كل LOW_STOCK_HEARTBEAT_SECONDS حتى لا يقطع الوسطاء الاتصال الصامت.
+    ينتهي البث بعد LOW_STOCK_STREAM_MAX_SECONDS فيعيد المتصفح الاتصال (EventSource)
+    من Last-Event-ID، ولا يبقى اتصال واحد مفتوحاً على نفس الخادم إلى الأبد.
+    """
+    started = last_sent = time.monotonic()
+    while not await is_disconnected():
+        alerts = await run_in_threadpool(_fetch, session_factory, after_id, 100)
+        for alert in alerts:
+            yield format_event(alert)
+            after_id = alert["id"]
+        if time.monotonic() - started >= settings.LOW_STOCK_STREAM_MAX_SECONDS:
+            return
+        if alerts:
+            last_sent = time.monotonic()
+            continue
+        if time.monotonic() - last_sent >= settings.LOW_STOCK_HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(settings.LOW_STOCK_POLL_MS / 1000)
@@ -1,11 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends
+import re
+import time
+from fastapi import FastAPI, HTTPException, Depends, Body, APIRouter, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session,joinedload,aliased
-from database.database import SessionLocal
+from config import settings
+from database.database import (
+    ASYNC_DB, AsyncSessionLocal, SessionLocal, async_read_router, read_router,
+)
+from database.dialects import insert_returning_ids
+from database.replicas import is_pinned, pin
 from models import *
+from account_tree import add_account, move_account, remove_account, rollup
+from balances import TOLERANCE, period_totals, reverse_journal_entry
+from closing import close_fiscal_year, income_totals, reopen_fiscal_year
+from exports import (
+    export_response, ledger_statement, sales_invoices_statement, stock_moves_statement, vendor_invoices_statement,
+)
+from fiscal import ensure_open
+from importer import import_journal_entries
+from stock_importer import import_stock_moves
+from inventory import SIGNS, Move, adjust_products, apply_moves, reverse_moves, transfer
+from low_stock import below_reorder, event_stream, is_below, latest_alert_id, record_crossings, wait_for_alerts
+from ledger import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ledger_page, resolve_vendor_names
+import metrics
+import posting_rules
+from posting import build_entry, post
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date
-from sqlalchemy import func, asc ,String
+from sqlalchemy import func, asc, or_, case, insert
 app = FastAPI()
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -26,6 +52,59 @@ def get_db():
     finally:
         db.close()
 
+# التقارير (نقاط القراءة فقط): نسخة قراءة إن وُجدت، وإلا pool التقارير على الأساسي
+# بمهلة استعلام أطول (config/settings.py). العميل الذي كتب للتو يُقرأ من الأساسي.
+def get_report_db(request: Request):
+    db = read_router.session(pin_primary=is_pinned(request.cookies))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# التصدير يفتح جلسته داخل البث نفسه (تعيش حتى آخر صف)، فيأخذ مصنع جلسات التقارير
+def get_report_sessions(request: Request):
+    pin_primary = is_pinned(request.cookies)
+    return lambda: read_router.session(pin_primary=pin_primary)
+
+
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    response = await call_next(request)
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        pin(response, settings.READ_YOUR_WRITES_SECONDS)
+    return response
+
+
+# قياس كل طلب (metrics.py): الاستعلامات وزمنها وزمن التحويل، ومدرّجاتها في /metrics
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    stats, token = metrics.start_request()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.end_request(token)
+    seconds = time.perf_counter() - started
+    route = request.scope.get("route")
+    if route is not None and route.path != "/metrics":
+        metrics.record(request.method, route.path, stats, seconds)
+    response.headers["Server-Timing"] = metrics.server_timing(stats, seconds)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(OperationalError)
+def statement_timeout_handler(request: Request, exc: OperationalError):
+    # 57014 = query_canceled: الاستعلام تجاوز statement_timeout
+    if getattr(exc.orig, "pgcode", None) == "57014":
+        return JSONResponse(status_code=503, content={"detail": "انتهت مهلة الاستعلام، ضيّق نطاق التقرير"})
+    raise exc
+
 # ---------------- Employees ----------------
 class EmployeeSchema(BaseModel):
     name: str
@@ -57,7 +136,7 @@ class DepartmentResponse(DepartmentSchema):
 # ---------------- Attendance ----------------
 class AttendanceSchema(BaseModel):
     employee_id: int
-    date: str
+    date: date
     status: str
 
 class AttendanceResponse(AttendanceSchema):
@@ -190,6 +269,15 @@ class StockMoveResponse(StockMoveSchema):
     class Config:
         orm_mode = True
 
+class StockTransferSchema(BaseModel):
+    product_id: int
+    from_warehouse_id: int
+    to_warehouse_id: int
+    date: date
+    quantity: float
+    reference: str | None = None
+    department_id: int | None = None
+
     
 
 # ================== Payments Schemas ==================
@@ -550,13 +638,9 @@ def get_accounts(db: Session = Depends(get_db)):
         Account.code,
         Account.type,
         Account.parent_id,
-        func.coalesce(func.sum(TransactionLine.debit), 0).label("total_debit"),
-        func.coalesce(func.sum(TransactionLine.credit), 0).label("total_credit"),
-    ).outerjoin(TransactionLine, TransactionLine.account_id == Account.id).group_by(  Account.id,
-    Account.name,
-    Account.code,
-    Account.type,
-    Account.parent_id).all()
+        func.coalesce(AccountBalance.debit_total, 0).label("total_debit"),
+        func.coalesce(AccountBalance.credit_total, 0).label("total_credit"),
+    ).outerjoin(AccountBalance, AccountBalance.account_id == Account.id).all()
 
     result = []
     for acc in accounts:
@@ -578,19 +662,14 @@ def get_accounts(db: Session = Depends(get_db)):
 @app.post("/accounts", response_model=AccountResponse)
 def create_account(account: AccountSchema, db: Session = Depends(get_db)):
     acc = Account(**account.dict())
+    if acc.parent_id is not None and not db.get(Account, acc.parent_id):
+        raise HTTPException(status_code=404, detail="Parent account not found")
+    acc.totals = AccountBalance(debit_total=0.0, credit_total=0.0)
     db.add(acc)
-    db.commit()
-    db.refresh(acc)
+    db.flush()
+    add_account(db, acc)
 
     if acc.balance > 0:
-        entry = JournalEntry(
-            date=date.today(),
-            description=f"قيد افتتاحي للحساب {acc.name}"
-        )
-        db.add(entry)
-        db.commit()
-        db.refresh(entry)
-
         if acc.type in ["Asset", "Expense"]:
             debit = acc.balance
             credit = 0
@@ -598,15 +677,17 @@ def create_account(account: AccountSchema, db: Session = Depends(get_db)):
             debit = 0
             credit = acc.balance
 
-        line = TransactionLine(
-            journal_entry_id=entry.id,
-            account_id=acc.id,
-            debit=debit,
-            credit=credit
+        entry = build_entry(
+            date.today(),
+            f"قيد افتتاحي للحساب {acc.name}",
+            [(acc.id, debit, credit)],
+            source_type=OPENING_BALANCE
         )
-        db.add(line)
-        db.commit()
+        entry.source_id = acc.id
+        post(db, entry)
 
+    db.commit()
+    db.refresh(acc)
     return acc
 
 @app.put("/accounts/{account_id}", response_model=AccountResponse)
@@ -614,6 +695,10 @@ def update_account(account_id: int, updated: AccountSchema, db: Session = Depend
     acc = db.query(Account).filter(Account.id == account_id).first()
     if not acc:
         raise HTTPException(status_code=404, detail="Account not found")
+    if updated.parent_id != acc.parent_id:
+        if updated.parent_id is not None and not db.get(Account, updated.parent_id):
+            raise HTTPException(status_code=404, detail="Parent account not found")
+        move_account(db, acc.id, updated.parent_id)
     for field, value in updated.dict().items():
         setattr(acc, field, value)
     db.commit()
@@ -624,16 +709,33 @@ def delete_account(account_id: int, db: Session = Depends(get_db)):
     acc = db.query(Account).filter(Account.id == account_id).first()
     if not acc:
         raise HTTPException(status_code=404, detail="Account not found")
+    if posting_rules.in_use(db, acc.id):
+        raise HTTPException(status_code=400, detail="الحساب مستخدم في قاعدة ترحيل؛ غيّر القاعدة أولاً")
+    remove_account(db, acc.id)
     db.delete(acc)
     db.commit()
     return {"message": "Account deleted"}
 
+@app.get("/accounts/rollup")
+def get_accounts_rollup(
+    account_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_report_db)
+):
+    """رصيد كل حساب مجمّعاً مع كل فروعه بأي عمق، لكل ما رُحّل أو لفترة محددة"""
+    result = rollup(db, account_id, start_date, end_date)
+    if account_id is not None and not result:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return result
+
 @app.get("/journal_entries", response_model=List[JournalEntryResponse])
 def get_journal_entries(db: Session = Depends(get_db)):
     return db.query(JournalEntry).all()
 
 @app.post("/journal_entries", response_model=JournalEntryResponse)
 def create_journal_entry(entry: JournalEntrySchema, db: Session = Depends(get_db)):
+    ensure_open(db, entry.date)
     j = JournalEntry(**entry.dict())
     db.add(j)
     db.commit()
@@ -641,7 +743,7 @@ def create_journal_entry(entry: JournalEntrySchema, db: Session = Depends(get_db
     return j
 
 @app.get("/transaction_lines")
-def get_transaction_lines(db: Session = Depends(get_db)):
+def get_transaction_lines(db: Session = Depends(get_report_db)):
     VendorAlias = aliased(Vendor)
 
     lines = (
@@ -687,39 +789,82 @@ def get_transaction_lines(db: Session = Depends(get_db)):
 
     return ledger_data
 
-@app.get("/transaction_lines_with_vendor")
-def get_transaction_lines_with_vendor(db: Session = Depends(get_db)):
-    lines = db.query(TransactionLine).all()
-    result = []
-
-    for line in lines:
-        vendor_name = None
+@app.get("/ledger")
+def get_ledger(
+    account_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    journal_entry_id: Optional[int] = None,
+    after_date: Optional[date] = None,
+    after_id: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after_journal_entry_id: Optional[int] = None,
+    db: Session = Depends(get_report_db)
+):
+    """
+    دفتر الأستاذ مقسّم لصفحات: الصفحة التالية تُطلب بتمرير next_cursor
+    (after_date و after_journal_entry_id و after_id) من الاستجابة السابقة.
+    """
+    return ledger_page(
+        db,
+        account_id=account_id,
+        start_date=start_date,
+        end_date=end_date,
+        journal_entry_id=journal_entry_id,
+        after_date=after_date,
+        after_id=after_id,
+        limit=limit,
+        after_journal_entry_id=after_journal_entry_id,
+    )
 
-        # ✅ البحث عن فاتورة مرتبطة بنفس رقم القيد (الربط الجديد)
-        vi = db.query(VendorInvoice).filter(VendorInvoice.journal_entry_id == line.journal_entry_id).first()
-        if vi and vi.vendor:
-            vendor_name = vi.vendor.name
+@app.get("/transaction_lines_with_vendor")
+def get_transaction_lines_with_vendor(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_report_db)
+):
+    """
+    سطور القيود مع اسم المورد. عدد الاستعلامات ثابت (استعلامان) مهما كان عدد السطور:
+    واحد للسطور مع الحساب والقيد، وواحد لأسماء الموردين لكل قيود الصفحة دفعة واحدة.
+    """
+    query = (
+        db.query(
+            TransactionLine.id,
+            TransactionLine.journal_entry_id,
+            TransactionLine.account_id,
+            TransactionLine.debit,
+            TransactionLine.credit,
+            Account.name.label("account_name"),
+            JournalEntry.date.label("entry_date"),
+            JournalEntry.description.label("entry_desc"),
+        )
+        .outerjoin(Account, Account.id == TransactionLine.account_id)
+        .outerjoin(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .order_by(TransactionLine.id)
+    )
+    if after_id is not None:
+        query = query.filter(TransactionLine.id > after_id)
+    if limit:
+        query = query.limit(limit)
+    lines = query.all()
 
-        # ✅ إذا لم توجد فاتورة، نبحث عن دفعة مرتبطة بالقيد
-        if not vendor_name:
-            payment = db.query(Payment).filter(Payment.journal_entry_id == line.journal_entry_id).first()
-            if payment and payment.vendor:
-                vendor_name = payment.vendor.name
+    vendor_names = resolve_vendor_names(db, {line.journal_entry_id for line in lines})
 
-        result.append({
+    return [
+        {
             "id": line.id,
             "journal_entry_id": line.journal_entry_id,
             "account_id": line.account_id,
-            "account_name": line.account.name if line.account else None,
-            "date": line.journal_entry.date if line.journal_entry else None,
-            "entry_desc": line.journal_entry.description if line.journal_entry else None,
+            "account_name": line.account_name,
+            "date": line.entry_date,
+            "entry_desc": line.entry_desc,
             "debit": line.debit,
             "credit": line.credit,
             "balance": 0,  # سيتم حسابه في الفرونت
-            "vendor_name": vendor_name
-        })
-
-    return result
+            "vendor_name": vendor_names.get(line.journal_entry_id)
+        }
+        for line in lines
+    ]
 
 # ------------------- Inventory CRUD -------------------
 @app.get("/products", response_model=List[ProductResponse])
@@ -737,11 +882,14 @@ def create_product(product: ProductSchema, db: Session = Depends(get_db)):
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
 def update_product(product_id: int, product: ProductSchema, db: Session = Depends(get_db)):
-    p = db.query(Product).filter(Product.id == product_id).first()
+    p = db.query(Product).filter(Product.id == product_id).with_for_update().first()
     if not p:
         raise HTTPException(status_code=404, detail="Product not found")
+    was_below = {p.id: is_below(p.quantity_on_hand, p.reorder_level)}
     for key, value in product.dict().items():
         setattr(p, key, value)
+    # تعديل الرصيد أو حد إعادة الطلب يدويًا قد يعبر الحد أيضًا
+    record_crossings(db, was_below, [p])
     db.commit()
     db.refresh(p)
     return p
@@ -758,6 +906,75 @@ def create_warehouse(wh: WarehouseSchema, db: Session = Depends(get_db)):
     db.refresh(w)
     return w
 
+# ------------------- أرصدة المخازن -------------------
+@app.get("/warehouses/{warehouse_id}/stock")
+def get_warehouse_stock(warehouse_id: int, db: Session = Depends(get_db)):
+    """رصيد كل منتج في المخزن من جدول stock_balances"""
+    if db.query(Warehouse.id).filter(Warehouse.id == warehouse_id).first() is None:
+        raise HTTPException(status_code=404, detail="المخزن غير موجود")
+    rows = (
+        db.query(StockBalance.product_id, Product.name, StockBalance.quantity)
+        .join(Product, Product.id == StockBalance.product_id)
+        .filter(StockBalance.warehouse_id == warehouse_id)
+        .order_by(StockBalance.product_id)
+        .all()
+    )
+    return [{"product_id": r.product_id, "product_name": r.name, "quantity": r.quantity} for r in rows]
+
+
+@app.get("/products/{product_id}/stock")
+def get_product_stock(product_id: int, warehouse_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    رصيد المنتج في كل مخزن، أو في مخزن واحد بتمرير warehouse_id
+    (بحث واحد على المفتاح (product_id, warehouse_id)).
+    """
+    product = db.query(Product.id, Product.quantity_on_hand).filter(Product.id == product_id).first()
+    if product is None:
+        raise HTTPException(status_code=404, detail="المنتج غير موجود")
+    query = (
+        db.query(StockBalance.warehouse_id, Warehouse.name, StockBalance.quantity)
+        .join(Warehouse, Warehouse.id == StockBalance.warehouse_id)
+        .filter(StockBalance.product_id == product_id)
+    )
+    if warehouse_id is not None:
+        query = query.filter(StockBalance.warehouse_id == warehouse_id)
+    rows = query.order_by(StockBalance.warehouse_id).all()
+    return {
+        "product_id": product_id,
+        "quantity_on_hand": product.quantity_on_hand,
+        "warehouses": [
+            {"warehouse_id": r.warehouse_id, "warehouse_name": r.name, "quantity": r.quantity} for r in rows
+        ],
+    }
+
+
+@app.post("/stock_transfers")
+def create_stock_transfer(body: StockTransferSchema, db: Session = Depends(get_db)):
+    """تحويل كمية من مخزن إلى آخر: حركتا صادر ووارد تُحفظان معاً أو لا تُحفظ أي منهما"""
+    if db.query(Product.id).filter(Product.id == body.product_id).first() is None:
+        raise HTTPException(status_code=404, detail="المنتج غير موجود")
+    warehouse_ids = {body.from_warehouse_id, body.to_warehouse_id}
+    if db.query(Warehouse.id).filter(Warehouse.id.in_(warehouse_ids)).count() != len(warehouse_ids):
+        raise HTTPException(status_code=404, detail="المخزن غير موجود")
+
+    out_move, in_move = transfer(
+        db, body.product_id, body.from_warehouse_id, body.to_warehouse_id, body.quantity, body.date,
+        reference=body.reference, department_id=body.department_id,
+    )
+    db.commit()
+
+    balances = dict(
+        db.query(StockBalance.warehouse_id, StockBalance.quantity)
+        .filter(StockBalance.product_id == body.product_id, StockBalance.warehouse_id.in_(warehouse_ids))
+        .all()
+    )
+    return {
+        "out_move_id": out_move.id,
+        "in_move_id": in_move.id,
+        "from_quantity": balances.get(body.from_warehouse_id),
+        "to_quantity": balances.get(body.to_warehouse_id),
+    }
+
 @app.get("/vendor_invoices", response_model=List[VendorInvoiceResponse])
 def get_vendor_invoices(db: Session = Depends(get_db)):
     """
@@ -815,85 +1032,61 @@ def create_vendor_invoice(
     move_type: str = "consumable",  # "inventory" أو "consumable"
     db: Session = Depends(get_db)
 ):
-    # 1️⃣ إنشاء القيد المحاسبي أولاً
-    journal_entry = JournalEntry(
-        date=inv.date,
-        description=f"فاتورة {'مستهلكات' if move_type=='consumable' else 'مخزنية'} رقم مؤقت"
-    )
-    db.add(journal_entry)
-    db.commit()
-    db.refresh(journal_entry)
+    kind = 'مستهلكات' if move_type=='consumable' else 'مخزنية'
 
-    # 2️⃣ إنشاء الفاتورة وربطها بالقيد
+    # 1️⃣ الحسابات من قواعد الترحيل (ذاكرة، بدون استعلام) قبل أي كتابة
+    expense_account_id = posting_rules.resolve(db, VENDOR_INVOICE, posting_rules.EXPENSE)
+    vendor_account_id = posting_rules.resolve(db, VENDOR_INVOICE, posting_rules.PAYABLE)
+
+    # 2️⃣ بناء الفاتورة وسطورها والقيد (مدين المصروف / دائن المورد) في الذاكرة
     invoice = VendorInvoice(
         vendor_id=inv.vendor_id,
         department_id=inv.department_id,
         date=inv.date,
         total=inv.total,
-        journal_entry_id=journal_entry.id  # ✅ الربط المهم هنا
+        lines=[
+            VendorInvoiceLine(
+                product_name=line.product_name,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+            )
+            for line in inv.lines
+        ]
     )
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
-
-    # 🔹 بعد إنشاء الفاتورة، نحدث وصف القيد ليحمل رقم الفاتورة الحقيقي
-    journal_entry.description = f"فاتورة {'مستهلكات' if move_type=='consumable' else 'مخزنية'} رقم {invoice.id}"
-    db.commit()
-
-    # 3️⃣ إنشاء القيود المحاسبية
-    expense_account = db.query(Account).filter(Account.name == "مستهلكات").first()
-    if not expense_account:
-        raise HTTPException(status_code=400, detail="حساب المصروف (مستهلكات) غير موجود")
-
-    vendor_account = db.query(Account).filter(Account.name == "حساب الموردين").first()
-    if not vendor_account:
-        raise HTTPException(status_code=400, detail="حساب المورد (حساب الموردين) غير موجود")
-
-    # سطر مدين → المصروف
-    t1 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=expense_account.id,
-        debit=inv.total,
-        credit=0.0
+    invoice.journal_entry = build_entry(
+        inv.date,
+        f"فاتورة {kind} رقم مؤقت",
+        [
+            (expense_account_id, inv.total, 0.0),
+            (vendor_account_id, 0.0, inv.total),
+        ],
+        source_type=VENDOR_INVOICE
     )
 
-    # سطر دائن → المورد
-    t2 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=vendor_account.id,
-        debit=0.0,
-        credit=inv.total
-    )
-    db.add_all([t1, t2])
-    db.commit()
+    # 3️⃣ حفظ الكل في معاملة واحدة
+    post(db, invoice.journal_entry, invoice)
 
-    # 4️⃣ إضافة سطور الفاتورة (المنتجات)
-    invoice_lines_response = []
-    for line in inv.lines:
-        subtotal = line.quantity * line.unit_price
-        line_obj = VendorInvoiceLine(
-            invoice_id=invoice.id,
-            product_name=line.product_name,
-            quantity=line.quantity,
-            unit_price=line.unit_price,
-        )
-        db.add(line_obj)
-
-        invoice_lines_response.append({
-            "id": line_obj.id,
-            "product_name": line.product_name,
-            "quantity": line.quantity,
-            "unit_price": line.unit_price,
-            "subtotal": subtotal
-        })
+    # 🔹 بعد إنشاء الفاتورة، نحدث وصف القيد ليحمل رقم الفاتورة الحقيقي
+    invoice.journal_entry.description = f"فاتورة {kind} رقم {invoice.id}"
 
+    response = VendorInvoiceResponse(
+        id=invoice.id,
+        vendor_id=invoice.vendor_id,
+        department_id=invoice.department_id,
+        date=invoice.date,
+        total=invoice.total,
+        lines=[
+            VendorInvoiceLineResponse(
+                product_name=line.product_name,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+                subtotal=line.subtotal
+            )
+            for line in invoice.lines
+        ]
+    )
     db.commit()
-    db.refresh(invoice)
-
-    # 5️⃣ إضافة العلاقات ORM
-    invoice.lines = db.query(VendorInvoiceLine).filter(VendorInvoiceLine.invoice_id == invoice.id).all()
-
-    return invoice
+    return response
 
 # ---------------- DELETE Vendor Invoice -----------------
 @app.delete("/vendor_invoices/{invoice_id}")
@@ -902,13 +1095,15 @@ def delete_vendor_invoice(invoice_id: int, db: Session = Depends(get_db)):
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    # 🔹 ابحث عن القيد المحاسبي المرتبط بالفاتورة
+    # 🔹 ابحث عن القيد المحاسبي المرتبط بالفاتورة (بحث مفهرس على المستند المصدر)
     journal = db.query(JournalEntry).filter(
-        JournalEntry.description.like(f"%فاتورة%{invoice_id}%")
+        JournalEntry.source_type == VENDOR_INVOICE,
+        JournalEntry.source_id == invoice.id
     ).first()
 
     if journal:
-        # حذف سطور القيد
+        # عكس أثر القيد على أرصدة الحسابات ثم حذف سطوره
+        reverse_journal_entry(db, journal.id)
         db.query(TransactionLine).filter(TransactionLine.journal_entry_id == journal.id).delete()
         # حذف القيد نفسه
         db.delete(journal)
@@ -1035,51 +1230,114 @@ def get_invoices_by_department(
 
 # ---------------- Stock Moves ----------------
 @app.get("/stock_moves", response_model=list)
-def get_stock_moves(db: Session = Depends(get_db)):
-    """عرض كل حركات المخزون مع اسم المنتج واسم القسم وحالة المخزون الحالية"""
-    moves = db.query(StockMove).all()
-    result = []
-    for m in moves:
-        product = db.query(Product).filter(Product.id == m.product_id).first()
-        department = db.query(Department).filter(Department.id == m.department_id).first() if m.department_id else None
-        current_qty = product.quantity_on_hand if product else None
-        low_stock_alert = (product.quantity_on_hand < product.reorder_level) if product else False
-        result.append({
+def get_stock_moves(
+    product_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    move_type: Optional[str] = None,
+    purpose: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    after_date: Optional[date] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    حركات المخزون مع اسم المنتج واسم القسم وحالة المخزون الحالية في استعلام واحد.
+    الترتيب (date, id)؛ الصفحة التالية تُطلب بتمرير after_date و after_id لآخر حركة.
+    الفلترة بالمنتج أو المخزن مع التاريخ تستخدم فهرسي (product_id, date, id) و(warehouse_id, date, id).
+    """
+    query = (
+        db.query(
+            StockMove.id,
+            StockMove.product_id,
+            StockMove.warehouse_id,
+            StockMove.department_id,
+            StockMove.date,
+            StockMove.quantity,
+            StockMove.move_type,
+            StockMove.reference,
+            StockMove.purpose,
+            Product.name.label("product_name"),
+            Product.quantity_on_hand,
+            Product.reorder_level,
+            Department.name.label("department_name"),
+        )
+        .outerjoin(Product, Product.id == StockMove.product_id)
+        .outerjoin(Department, Department.id == StockMove.department_id)
+    )
+    if product_id is not None:
+        query = query.filter(StockMove.product_id == product_id)
+    if warehouse_id is not None:
+        query = query.filter(StockMove.warehouse_id == warehouse_id)
+    if department_id is not None:
+        query = query.filter(StockMove.department_id == department_id)
+    if move_type:
+        query = query.filter(StockMove.move_type == move_type)
+    if purpose:
+        query = query.filter(StockMove.purpose == purpose)
+    if start_date:
+        query = query.filter(StockMove.date >= start_date)
+    if end_date:
+        query = query.filter(StockMove.date <= end_date)
+    if after_date is not None:
+        # حد date >= after_date يستخدمه الفهرس، والمقارنة الكاملة للمؤشر بعده
+        query = query.filter(
+            StockMove.date >= after_date,
+            or_(StockMove.date > after_date, StockMove.id > (after_id or 0)),
+        )
+    query = query.order_by(StockMove.date, StockMove.id)
+    if limit is not None:
+        # مثل ledger_page: حجم الصفحة بين 1 و MAX_PAGE_SIZE
+        query = query.limit(max(1, min(limit, MAX_PAGE_SIZE)))
+
+    return [
+        {
             "id": m.id,
             "product_id": m.product_id,
-            "product_name": product.name if product else None,
+            "product_name": m.product_name,
             "warehouse_id": m.warehouse_id,
             "department_id": m.department_id,
-            "department_name": department.name if department else None,
+            "department_name": m.department_name,
             "date": m.date,
             "quantity": m.quantity,
             "move_type": m.move_type,
             "reference": m.reference,
             "purpose": m.purpose,
-            "current_quantity": current_qty,
-            "low_stock_alert": low_stock_alert,
-            "reorder_level": product.reorder_level if product else None
-        })
-    return result
+            "current_quantity": m.quantity_on_hand,
+            "low_stock_alert": (
+                m.quantity_on_hand < (m.reorder_level or 0) if m.quantity_on_hand is not None else False
+            ),
+            "reorder_level": m.reorder_level,
+        }
+        for m in query.all()
+    ]
 
 
 @app.post("/stock_moves", response_model=dict)
-def create_stock_move(move: StockMoveSchema, db: Session = Depends(get_db)):
-    """إضافة حركة مخزون جديدة مع إرجاع اسم المنتج والقسم"""
-    product = db.query(Product).filter(Product.id == move.product_id).first()
+def create_stock_move(
+    move: StockMoveSchema,
+    reject_if_insufficient: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    إضافة حركة مخزون جديدة مع إرجاع اسم المنتج والقسم.
+    reject_if_insufficient (افتراضياً REJECT_INSUFFICIENT_STOCK): رفض الصرف بأكثر من الرصيد بـ 409
+    بدل تصفيره.
+    """
+    if move.move_type not in SIGNS:
+        raise HTTPException(status_code=400, detail="move_type يجب أن يكون 'in' أو 'out'")
+    if reject_if_insufficient is None:
+        reject_if_insufficient = settings.REJECT_INSUFFICIENT_STOCK
+
+    # تعديل الكمية حسب نوع الحركة في جملة UPDATE ... RETURNING واحدة
+    product = adjust_products(
+        db, {move.product_id: SIGNS[move.move_type] * move.quantity}, reject_if_insufficient, move.warehouse_id
+    ).get(move.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="المنتج غير موجود")
 
-    # تعديل الكمية حسب نوع الحركة
-    if move.move_type == "in":
-        product.quantity_on_hand += move.quantity
-    elif move.move_type == "out":
-        product.quantity_on_hand -= move.quantity
-        if product.quantity_on_hand < 0:
-            product.quantity_on_hand = 0
-    else:
-        raise HTTPException(status_code=400, detail="move_type يجب أن يكون 'in' أو 'out'")
-
     # إنشاء الحركة
     stock_move = StockMove(
         product_id=move.product_id,
@@ -1093,9 +1351,8 @@ def create_stock_move(move: StockMoveSchema, db: Session = Depends(get_db)):
     )
 
     db.add(stock_move)
-    db.commit()
-    db.refresh(stock_move)
-    db.refresh(product)
+    apply_moves(db, [stock_move])
+    db.flush()
 
     # جلب اسم القسم
     dep_name = None
@@ -1105,7 +1362,8 @@ def create_stock_move(move: StockMoveSchema, db: Session = Depends(get_db)):
 
     low_stock_alert = product.quantity_on_hand < (product.reorder_level or 0)
 
-    return {
+    # الاستجابة تُبنى قبل commit: أي قراءة بعده تفتح معاملة جديدة (قفل كتابة في SQLite)
+    response = {
         "id": stock_move.id,
         "product_id": stock_move.product_id,
         "product_name": product.name,
@@ -1120,11 +1378,35 @@ def create_stock_move(move: StockMoveSchema, db: Session = Depends(get_db)):
         "reorder_level": product.reorder_level,
         "low_stock_alert": low_stock_alert,
     }
+    db.commit()
+    return response
+
+
+async def raw_body(request: Request) -> bytes:
+    """جسم الطلب كما هو: FastAPI يحلل application/json بنفسه إن طُلب الجسم كـ Body"""
+    return await request.body()
+
+
+@app.post("/stock_moves/batch")
+def create_stock_moves_batch(
+    content: bytes = Depends(raw_body),
+    reject_if_insufficient: Optional[bool] = None,
+    all_or_nothing: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    حركات مخزون بالجملة: جسم الطلب مصفوفة JSON أو NDJSON (حركة لكل سطر).
+    الحركات السليمة تُحفظ في معاملة واحدة، والنتيجة لكل عنصر بترتيبه (row):
+    رقم الحركة (id) أو سبب رفضها (error). all_or_nothing=true يرفض الدفعة كاملة عند أي خطأ.
+    """
+    if reject_if_insufficient is None:
+        reject_if_insufficient = settings.REJECT_INSUFFICIENT_STOCK
+    return import_stock_moves(db, content, reject_if_insufficient, all_or_nothing)
 
 
 # ------------------- Inventory Report -------------------
 @app.get("/inventory_report")
-def inventory_report(db: Session = Depends(get_db)):
+def inventory_report(db: Session = Depends(get_report_db)):
     products = db.query(Product).all()
     report = []
     for p in products:
@@ -1139,6 +1421,46 @@ def inventory_report(db: Session = Depends(get_db)):
         })
     return report
 
+# ------------------- تنبيهات حد إعادة الطلب -------------------
+@app.get("/products/below_reorder")
+def get_products_below_reorder(db: Session = Depends(get_report_db)):
+    """المنتجات التي رصيدها الآن تحت حد إعادة الطلب (من الفهرس الجزئي بدل فحص كل المنتجات)"""
+    return below_reorder(db)
+
+
+@app.get("/low_stock_alerts")
+async def get_low_stock_alerts(
+    after_id: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0),
+    session_factory=Depends(get_report_sessions),
+):
+    """
+    تنبيهات عبور حد إعادة الطلب (below / recovered) بعد after_id بترتيب رقمها.
+    wait > 0 يجعله long-poll: ينتظر أول تنبيه جديد حتى wait ثانية (بحد LOW_STOCK_MAX_WAIT_SECONDS).
+    """
+    return await wait_for_alerts(session_factory, after_id, limit, wait)
+
+
+@app.get("/low_stock_alerts/stream")
+async def stream_low_stock_alerts(
+    request: Request, after_id: Optional[int] = None, session_factory=Depends(get_report_sessions),
+):
+    """
+    بث server-sent events لتنبيهات عبور حد إعادة الطلب. بعد انقطاع الاتصال يكمل المتصفح
+    من Last-Event-ID، وafter_id يبدأ من رقم معيّن؛ بدونهما يبدأ من التنبيهات الجديدة فقط.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after_id = int(last_event_id)
+    elif after_id is None:
+        after_id = await latest_alert_id(session_factory)
+    return StreamingResponse(
+        event_stream(session_factory, after_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # ------------------- Purchasing CRUD -------------------
 @app.get("/vendors", response_model=List[VendorResponse])
 def get_vendors(db: Session = Depends(get_db)):
@@ -1243,71 +1565,50 @@ def get_payments(db: Session = Depends(get_db)):
 @app.post("/payments", response_model=PaymentResponse)
 def create_payment(payment: PaymentSchema, db: Session = Depends(get_db)):
 
-    # 1️⃣ إنشاء قيد يومية
-    journal_entry = JournalEntry(
-        date=payment.date,
-        description=f"دفعة لمورد {payment.vendor_id} - {payment.reference or ''}",
-       
-    )
-    db.add(journal_entry)
-    db.commit()
-    db.refresh(journal_entry)
-
-    # 2️⃣ حساب الموردين
-    vendor_account = db.query(Account).filter(Account.name == "حساب الموردين").first()
-    if not vendor_account:
-        raise HTTPException(status_code=400, detail="Accounts Payable account not found")
-
-    t1 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=vendor_account.id,
-        debit=payment.amount,
-        credit=0.0
-    )
+    # 1️⃣ حساب الموردين من قواعد الترحيل
+    vendor_account_id = posting_rules.resolve(db, PAYMENT, posting_rules.PAYABLE)
 
-    # 3️⃣ الحساب المختار
+    # 2️⃣ الحساب المختار
     user_account = db.get(Account, payment.account_id)
     if not user_account:
         raise HTTPException(status_code=400, detail="Selected account not found")
 
-    t2 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=user_account.id,
-        debit=0.0,
-        credit=payment.amount
+    # 3️⃣ قيد يومية: مدين الموردين / دائن الحساب المختار
+    journal_entry = build_entry(
+        payment.date,
+        f"دفعة لمورد {payment.vendor_id} - {payment.reference or ''}",
+        [
+            (vendor_account_id, payment.amount, 0.0),
+            (payment.account_id, 0.0, payment.amount),
+        ],
+        source_type=PAYMENT
     )
 
-    db.add_all([t1, t2])
-    db.commit()
-
-    # 4️⃣ حفظ الدفعة نفسها (✔️ مع account_id و reference)
+    # 4️⃣ حفظ الدفعة نفسها (✔️ مع account_id و reference) مع القيد في معاملة واحدة
     p = Payment(
         vendor_id=payment.vendor_id,
         date=payment.date,
         amount=payment.amount,
-        journal_entry_id=journal_entry.id,
+        journal_entry=journal_entry,
         account_id=payment.account_id,
         reference=payment.reference
     )
-    db.add(p)
-    db.commit()
-    db.refresh(p)
-
-
-
+    post(db, journal_entry, p)
 
     # 5️⃣ جلب اسم المورد واسم الحساب لعرضه في Ledger مباشرة
     vendor = db.get(Vendor, payment.vendor_id)
-    return {
+    response = {
         "id": p.id,
         "vendor_id": p.vendor_id,
         "vendor_name": vendor.name if vendor else None,  # اسم المورد الصحيح
         "date": p.date,
         "amount": p.amount,
-        "journal_entry_id": p.journal_entry_id,
+        "journal_entry_id": journal_entry.id,
         "account_id": payment.account_id,
         "account_name": user_account.name  # اسم الحساب المستخدم
     }
+    db.commit()
+    return response
 
 
 @app.delete("/payments/{payment_id}")
@@ -1319,6 +1620,7 @@ def delete_payment(payment_id: int, db: Session = Depends(get_db)):
     # حذف القيد المرتبط بالدفعة إن وجد
     journal = db.query(JournalEntry).filter(JournalEntry.id == payment.journal_entry_id).first()
     if journal:
+        reverse_journal_entry(db, journal.id)
         db.query(TransactionLine).filter(TransactionLine.journal_entry_id == journal.id).delete()
         db.delete(journal)
 
@@ -1329,27 +1631,28 @@ def delete_payment(payment_id: int, db: Session = Depends(get_db)):
 
 @app.post("/daily_expense")
 def create_daily_expense(expense: DailyExpenseSchema, db: Session = Depends(get_db)):
-    # إنشاء قيد اليومية
-    journal_entry = JournalEntry(date=date.today(), description=expense.description)
-    db.add(journal_entry)
-    db.commit()
-    db.refresh(journal_entry)
-
     # جلب الحسابات
     expense_account = db.get(Account, expense.expense_account_id)
     credit_account = db.get(Account, expense.credit_account_id)
     if not expense_account or not credit_account:
         raise HTTPException(status_code=400, detail="حساب المصروف أو الحساب الدائن غير موجود")
 
-    # إنشاء سطور القيد
-    t1 = TransactionLine(journal_entry_id=journal_entry.id, account_id=expense_account.id, debit=expense.amount, credit=0)
-    t2 = TransactionLine(journal_entry_id=journal_entry.id, account_id=credit_account.id, debit=0, credit=expense.amount)
-    db.add_all([t1, t2])
+    # إنشاء قيد اليومية مع سطوره
+    journal_entry = build_entry(
+        date.today(),
+        expense.description,
+        [
+            (expense.expense_account_id, expense.amount, 0),
+            (expense.credit_account_id, 0, expense.amount),
+        ]
+    )
+    post(db, journal_entry)
+    journal_entry_id = journal_entry.id
     db.commit()
 
     return {
         "detail": "مصروف مسجل بنجاح ✅",
-        "journal_entry_id": journal_entry.id,
+        "journal_entry_id": journal_entry_id,
         "amount": expense.amount,
         "description": expense.description,
         "expense_account_id": expense.expense_account_id,
@@ -1357,32 +1660,62 @@ def create_daily_expense(expense: DailyExpenseSchema, db: Session = Depends(get_
     }
 
 @app.get("/daily_expense")
-def get_daily_expenses(db: Session = Depends(get_db)):
-    # جلب كل القيود التي تحتوي على مدين > 0 (مصروفات)
-    entries = db.query(JournalEntry).join(TransactionLine).filter(TransactionLine.debit > 0).all()
-    result = []
+def get_daily_expenses(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_report_db)
+):
+    """
+    المصروفات (قيد له سطر مدين وسطر دائن) باستعلام واحد:
+    أول سطر مدين وأول سطر دائن لكل قيد يُحددان بتجميع شرطي (min + case) في SQL
+    """
+    first_lines = (
+        db.query(
+            TransactionLine.journal_entry_id.label("journal_entry_id"),
+            func.min(case((TransactionLine.debit > 0, TransactionLine.id))).label("debit_line_id"),
+            func.min(case((TransactionLine.credit > 0, TransactionLine.id))).label("credit_line_id"),
+        )
+        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+    )
+    if start_date:
+        first_lines = first_lines.filter(JournalEntry.date >= start_date)
+    if end_date:
+        first_lines = first_lines.filter(JournalEntry.date <= end_date)
+    first_lines = first_lines.group_by(TransactionLine.journal_entry_id).subquery()
 
-    for e in entries:
-        # جلب سطر المصروف وسطر الدائن لكل JournalEntry
-        expense_line = db.query(TransactionLine).filter(
-            TransactionLine.journal_entry_id == e.id,
-            TransactionLine.debit > 0
-        ).first()
-
-        credit_line = db.query(TransactionLine).filter(
-            TransactionLine.journal_entry_id == e.id,
-            TransactionLine.credit > 0
-        ).first()
-
-        if expense_line and credit_line:
-            result.append({
-                "journal_entry_id": e.id,
-                "description": e.description,
-                "amount": expense_line.debit,
-                "expense_account_id": expense_line.account_id,
-                "credit_account_id": credit_line.account_id
-            })
-    return result
+    DebitLine = aliased(TransactionLine)
+    CreditLine = aliased(TransactionLine)
+    query = (
+        db.query(
+            JournalEntry.id,
+            JournalEntry.date,
+            JournalEntry.description,
+            DebitLine.debit,
+            DebitLine.account_id.label("expense_account_id"),
+            CreditLine.account_id.label("credit_account_id"),
+        )
+        .join(first_lines, first_lines.c.journal_entry_id == JournalEntry.id)
+        .join(DebitLine, DebitLine.id == first_lines.c.debit_line_id)
+        .join(CreditLine, CreditLine.id == first_lines.c.credit_line_id)
+        .order_by(JournalEntry.id)
+        .offset(offset)
+    )
+    if limit:
+        query = query.limit(limit)
+
+    return [
+        {
+            "journal_entry_id": e.id,
+            "date": e.date,
+            "description": e.description,
+            "amount": e.debit,
+            "expense_account_id": e.expense_account_id,
+            "credit_account_id": e.credit_account_id
+        }
+        for e in query.all()
+    ]
 
 
 @app.delete("/daily_expense/{journal_entry_id}")
@@ -1392,7 +1725,8 @@ def delete_daily_expense(journal_entry_id: int, db: Session = Depends(get_db)):
     if not journal:
         raise HTTPException(status_code=404, detail="Journal Entry not found")
     
-    # حذف كل سطور القيد المرتبطة
+    # حذف كل سطور القيد المرتبطة بعد عكس أثرها على الأرصدة
+    reverse_journal_entry(db, journal.id)
     db.query(TransactionLine).filter(TransactionLine.journal_entry_id == journal.id).delete()
     
     # حذف القيد نفسه
@@ -1403,129 +1737,150 @@ def delete_daily_expense(journal_entry_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/trial_balance")
-def trial_balance(db: Session = Depends(get_db)):
+def trial_balance(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_report_db)
+):
+    """ميزان المراجعة لكل ما رُحّل، أو لفترة محددة من جدول الأرصدة اليومية التراكمية"""
+    totals = period_totals(start_date, end_date)
     result = (
         db.query(
             Account.id,
             Account.name,
-            func.coalesce(func.sum(TransactionLine.debit), 0).label("debit_total"),
-            func.coalesce(func.sum(TransactionLine.credit), 0).label("credit_total")
+            func.coalesce(totals.c.debit_total, 0).label("debit_total"),
+            func.coalesce(totals.c.credit_total, 0).label("credit_total")
         )
-        .outerjoin(TransactionLine, TransactionLine.account_id == Account.id)
-        .group_by(Account.id)
+        .outerjoin(totals, totals.c.account_id == Account.id)
         .all()
     )
     return [{"id": r.id, "name": r.name, "debit": r.debit_total, "credit": r.credit_total} for r in result]
-@app.get("/income_statement")
-def income_statement(db: Session = Depends(get_db)):
-    revenues = db.query(
-        func.coalesce(func.sum(TransactionLine.credit - TransactionLine.debit), 0)
-    ).join(Account).filter(Account.type == "Revenue").scalar()
 
-    expenses = db.query(
-        func.coalesce(func.sum(TransactionLine.debit - TransactionLine.credit), 0)
-    ).join(Account).filter(Account.type == "Expense").scalar()
+def _sum_by_type(db, totals, account_type, credit_normal):
+    """مجموع أرصدة نوع حسابات معيّن (credit_normal: الرصيد الطبيعي دائن)"""
+    if credit_normal:
+        amount = totals.c.credit_total - totals.c.debit_total
+    else:
+        amount = totals.c.debit_total - totals.c.credit_total
+    return (
+        db.query(func.coalesce(func.sum(amount), 0))
+        .select_from(Account)
+        .join(totals, totals.c.account_id == Account.id)
+        .filter(Account.type == account_type)
+        .scalar()
+    )
+
+@app.get("/income_statement")
+def income_statement(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_report_db)
+):
+    totals = income_totals(start_date, end_date)
+    revenues = _sum_by_type(db, totals, "Revenue", credit_normal=True)
+    expenses = _sum_by_type(db, totals, "Expense", credit_normal=False)
 
     net_income = revenues - expenses
     return {"revenues": revenues, "expenses": expenses, "net_income": net_income}
-@app.get("/balance_sheet")
-def balance_sheet(db: Session = Depends(get_db)):
-    assets = db.query(
-        func.coalesce(func.sum(TransactionLine.debit - TransactionLine.credit), 0)
-    ).join(Account).filter(Account.type == "Asset").scalar()
 
-    liabilities = db.query(
-        func.coalesce(func.sum(TransactionLine.credit - TransactionLine.debit), 0)
-    ).join(Account).filter(Account.type == "Liability").scalar()
-
-    equity = db.query(
-        func.coalesce(func.sum(TransactionLine.credit - TransactionLine.debit), 0)
-    ).join(Account).filter(Account.type == "Equity").scalar()
+@app.get("/balance_sheet")
+def balance_sheet(as_of: Optional[date] = None, db: Session = Depends(get_report_db)):
+    """الميزانية العمومية كما في تاريخ as_of (أو كل ما رُحّل إن لم يُحدد)"""
+    totals = period_totals(end_date=as_of)
+    assets = _sum_by_type(db, totals, "Asset", credit_normal=False)
+    liabilities = _sum_by_type(db, totals, "Liability", credit_normal=True)
+    equity = _sum_by_type(db, totals, "Equity", credit_normal=True)
 
     return {"assets": assets, "liabilities": liabilities, "equity": equity}
 
 
 # ---------------- إنشاء فاتورة مبيعات ----------------
 @app.post("/sales_invoices_with_stock", response_model=SalesInvoiceResponse)
-def create_sales_invoice(invoice: SalesInvoiceSchema, warehouse_id: int = 1, db: Session = Depends(get_db)):
-    # إنشاء الفاتورة
+def create_sales_invoice(
+    invoice: SalesInvoiceSchema,
+    warehouse_id: int = 1,
+    reject_if_insufficient: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    reject_if_insufficient (افتراضياً REJECT_INSUFFICIENT_STOCK): رفض الفاتورة كلها بـ 409
+    إن كانت كمية أي منتج أكبر من رصيده، بدل تصفير الرصيد.
+    """
+    if reject_if_insufficient is None:
+        reject_if_insufficient = settings.REJECT_INSUFFICIENT_STOCK
+
+    # الحسابات: مدين العميل / دائن المبيعات
+    customer_account_id = posting_rules.resolve(db, SALES_INVOICE, posting_rules.RECEIVABLE)
+    sales_account_id = posting_rules.resolve(db, SALES_INVOICE, posting_rules.REVENUE)
+
+    # خصم المخزون أولاً: كل منتجات الفاتورة باستعلام IN واحد (يقفلها بترتيب رقمها)
+    # وجملة UPDATE واحدة بصافي كل منتج، مهما كان عدد السطور
+    quantities = {}
+    for item in invoice.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0.0) - item.quantity
+    products = adjust_products(db, quantities, reject_if_insufficient, warehouse_id)
+    missing = sorted(set(quantities) - set(products))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"منتجات غير موجودة: {missing}")
+
+    # الفاتورة والقيد اليومي
     si = SalesInvoice(
         customer_name=invoice.customer_name,
         date=invoice.date,
         total=invoice.total,
-        department_id=invoice.department_id
+        department_id=invoice.department_id,
     )
-    db.add(si)
-    db.commit()
-    db.refresh(si)
-
-    # إنشاء القيد اليومي تلقائي
-    journal_entry = JournalEntry(
-        date=invoice.date,
-        description=f"فاتورة مبيعات رقم {si.id}"
+    si.journal_entry = build_entry(
+        invoice.date,
+        "فاتورة مبيعات",
+        [
+            (customer_account_id, invoice.total, 0.0),
+            (sales_account_id, 0.0, invoice.total),
+        ],
+        source_type=SALES_INVOICE
     )
-    db.add(journal_entry)
-    db.commit()
-    db.refresh(journal_entry)
-    si.journal_entry_id = journal_entry.id
-
-    # سطر مدين → حساب العميل
-    customer_account = db.query(Account).filter(Account.name == "حسابات العملاء").first()
-    if not customer_account:
-        raise HTTPException(status_code=400, detail="حساب العملاء غير موجود")
-
-    t1 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=customer_account.id,
-        debit=invoice.total,
-        credit=0.0
-    )
-
-    # سطر دائن → حساب المبيعات
-    sales_account = db.query(Account).filter(Account.name == "ايرادات مبيعات").first()
-    if not sales_account:
-        raise HTTPException(status_code=400, detail="حساب المبيعات غير موجود")
-
-    t2 = TransactionLine(
-        journal_entry_id=journal_entry.id,
-        account_id=sales_account.id,
-        debit=0.0,
-        credit=invoice.total
-    )
-
-    db.add_all([t1, t2])
-    db.commit()
-
-    # إضافة المنتجات وحركات المخزون
-    for item in invoice.items:
-        sii = SalesInvoiceItem(
-            sales_invoice_id=si.id,
+    post(db, si.journal_entry, si)
+    si.journal_entry.description = f"فاتورة مبيعات رقم {si.id}"
+
+    # عناصر الفاتورة وحركات المخزون بالجملة
+    item_ids = insert_returning_ids(db, SalesInvoiceItem, [
+        {"sales_invoice_id": si.id, "product_id": item.product_id, "quantity": item.quantity, "price": item.price}
+        for item in invoice.items
+    ])
+    moves = [
+        Move(
             product_id=item.product_id,
+            warehouse_id=warehouse_id,
+            department_id=invoice.department_id,
+            date=invoice.date,
             quantity=item.quantity,
-            price=item.price
+            move_type="out",
+            reference=f"Sales Invoice {si.id}",
+            purpose="stock",
+            source_type=SALES_INVOICE,
+            source_id=si.id,
         )
-        db.add(sii)
-
-        # خصم المخزون
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            product.quantity_on_hand -= item.quantity
-            if product.quantity_on_hand < 0:
-                product.quantity_on_hand = 0
-
-            stock_move = StockMove(
-                product_id=item.product_id,
-                warehouse_id=warehouse_id,
-                date=invoice.date,
-                quantity=item.quantity,
-                move_type="out",
-                reference=f"Sales Invoice {si.id}",
-                department_id=invoice.department_id
-            )
-            db.add(stock_move)
+        for item in invoice.items
+    ]
+    if moves:
+        db.execute(insert(StockMove.__table__), [m._asdict() for m in moves])
+    apply_moves(db, moves)
+
+    # الاستجابة من الكائنات في الذاكرة بدون إعادة قراءة الفاتورة
+    response = SalesInvoiceResponse(
+        id=si.id,
+        customer_name=si.customer_name,
+        date=si.date,
+        total=si.total,
+        department_id=si.department_id,
+        journal_entry_id=si.journal_entry.id,
+        items=[
+            SalesInvoiceItemResponse(id=item_id, product_id=item.product_id, quantity=item.quantity, price=item.price)
+            for item_id, item in zip(item_ids, invoice.items)
+        ]
+    )
     db.commit()
-    db.refresh(si)
-    return db.query(SalesInvoice).options(joinedload(SalesInvoice.items)).get(si.id)
+    return response
 
 # ---------------- جلب كل فواتير المبيعات ----------------
 @app.get("/sales_invoices", response_model=List[SalesInvoiceResponse])
@@ -1551,10 +1906,13 @@ def delete_sales_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
     journal_entry_id = invoice.journal_entry_id
 
-    # 1️⃣ حذف حركات المخزون
-    db.query(StockMove).filter(
-        StockMove.reference == f"Sales Invoice {invoice.id}"
-    ).delete()
+    # 1️⃣ حذف حركات المخزون بعد عكس أثرها على أرصدة المخازن
+    moves = db.query(StockMove).filter(
+        StockMove.source_type == SALES_INVOICE,
+        StockMove.source_id == invoice.id
+    )
+    reverse_moves(db, moves)
+    moves.delete()
 
     # 2️⃣ حذف عناصر الفاتورة
     db.query(SalesInvoiceItem).filter(
@@ -1570,6 +1928,7 @@ def delete_sales_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
     # 5️⃣ حذف القيود المحاسبية
     if journal_entry_id:
+        reverse_journal_entry(db, journal_entry_id)
         db.query(TransactionLine).filter(
             TransactionLine.journal_entry_id == journal_entry_id
         ).delete()
@@ -1584,27 +1943,42 @@ def delete_sales_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/expense_analysis")
-def expense_analysis(db: Session = Depends(get_db)):
+def expense_analysis(
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+    db: Session = Depends(get_report_db)
+):
     """
-    تحليل المصروفات حسب الحساب والشهر (يدعم PostgreSQL)
+    تحليل المصروفات حسب الحساب والشهر من جدول المجاميع الشهرية account_monthly_totals
+    from_month / to_month بصيغة YYYY-MM (اختيارية)
     """
-    from sqlalchemy import extract, func
+    for value in (from_month, to_month):
+        if value and not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", value):
+            raise HTTPException(status_code=400, detail="صيغة الشهر يجب أن تكون YYYY-MM")
 
-    expenses = (
+    query = (
         db.query(
             Account.name.label("account_name"),
-            func.concat(
-                func.cast(extract("year", JournalEntry.date), String),
-                "-",
-                func.lpad(func.cast(extract("month", JournalEntry.date), String), 2, "0")
-            ).label("month"),
-            func.sum(TransactionLine.debit - TransactionLine.credit).label("total")
+            AccountMonthlyTotal.month.label("month"),
+            func.sum(AccountMonthlyTotal.debit_total - AccountMonthlyTotal.credit_total).label("total")
         )
-        .join(TransactionLine, Account.id == TransactionLine.account_id)
-        .join(JournalEntry, JournalEntry.id == TransactionLine.journal_entry_id)
+        .join(AccountMonthlyTotal, Account.id == AccountMonthlyTotal.account_id)
         .filter(Account.type == "Expense")
-        .group_by("account_name", "month")
-        .order_by("month")
+    )
+    if from_month:
+        query = query.filter(AccountMonthlyTotal.month >= from_month)
+    if to_month:
+        query = query.filter(AccountMonthlyTotal.month <= to_month)
+
+    expenses = (
+        query
+        .group_by(Account.name, AccountMonthlyTotal.month)
+        # الأشهر التي حُذفت كل قيودها تبقى بصفر في الجدول
+        .having(or_(
+            func.abs(func.sum(AccountMonthlyTotal.debit_total)) > TOLERANCE,
+            func.abs(func.sum(AccountMonthlyTotal.credit_total)) > TOLERANCE,
+        ))
+        .order_by(AccountMonthlyTotal.month)
         .all()
     )
 
@@ -1625,17 +1999,285 @@ def expense_analysis(db: Session = Depends(get_db)):
     }
 @app.post("/adjust_journal_entry", response_model=JournalEntryResponse)
 def create_adjust_journal(entry: AdjustJournalEntrySchema, db: Session = Depends(get_db)):
-    journal = JournalEntry(date=entry.date, description=entry.description)
-    db.add(journal)
+    journal = build_entry(
+        entry.date,
+        entry.description,
+        [(l.account_id, l.debit, l.credit) for l in entry.lines]
+    )
+    post(db, journal)
+    response = JournalEntryResponse(id=journal.id, date=journal.date, description=journal.description)
     db.commit()
-    db.refresh(journal)
-    for l in entry.lines:
-        line = TransactionLine(
-            journal_entry_id=journal.id,
-            account_id=l.account_id,
-            debit=l.debit,
-            credit=l.credit
-        )
-        db.add(line)
+    return response
+
+
+# ================== إقفال السنة المالية ==================
+@app.post("/fiscal_years/{year}/close")
+def close_year(year: int, retained_earnings_account_id: int, db: Session = Depends(get_db)):
+    """إقفال السنة: قيد إقفال + أرصدة أول السنة التالية + أرشفة سطور السنة"""
+    return close_fiscal_year(db, year, retained_earnings_account_id)
+
+
+@app.post("/fiscal_years/{year}/reopen")
+def reopen_year(year: int, db: Session = Depends(get_db)):
+    """إعادة فتح آخر سنة مقفلة وإرجاع سطورها من الأرشيف"""
+    return reopen_fiscal_year(db, year)
+
+
+@app.get("/fiscal_years")
+def get_closed_fiscal_years(db: Session = Depends(get_db)):
+    rows = db.query(FiscalYearClose).order_by(FiscalYearClose.year).all()
+    return [
+        {
+            "year": r.year,
+            "closed_on": r.closed_on,
+            "retained_earnings_account_id": r.retained_earnings_account_id,
+            "closing_entry_id": r.closing_entry_id,
+            "opening_entry_id": r.opening_entry_id,
+        }
+        for r in rows
+    ]
+
+
+# ================== التصدير (CSV / NDJSON) ==================
+FILE_FORMAT = Query("csv", pattern="^(csv|ndjson)$")
+
+
+@app.get("/export/ledger")
+def export_ledger(
+    account_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = FILE_FORMAT,
+    sessions=Depends(get_report_sessions),
+):
+    return export_response(sessions, "ledger", ledger_statement(account_id, start_date, end_date), format)
+
+
+@app.get("/export/vendor_invoices")
+def export_vendor_invoices(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = FILE_FORMAT,
+    sessions=Depends(get_report_sessions),
+):
+    return export_response(sessions, "vendor_invoices", vendor_invoices_statement(start_date, end_date), format)
+
+
+@app.get("/export/sales_invoices")
+def export_sales_invoices(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = FILE_FORMAT,
+    sessions=Depends(get_report_sessions),
+):
+    return export_response(sessions, "sales_invoices", sales_invoices_statement(start_date, end_date), format)
+
+
+@app.get("/export/stock_moves")
+def export_stock_moves(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = FILE_FORMAT,
+    sessions=Depends(get_report_sessions),
+):
+    return export_response(sessions, "stock_moves", stock_moves_statement(start_date, end_date), format)
+
+
+# ================== استيراد القيود بالجملة ==================
+@app.post("/journal_entries/import")
+def import_journal_entries_file(
+    content: bytes = Body(..., media_type="text/csv"),
+    format: str = FILE_FORMAT,
+    all_or_nothing: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    جسم الطلب هو الملف نفسه (CSV أو NDJSON):
+    entry_ref, date, description, account_code, debit, credit
+    القيود السليمة تُحفظ في معاملة واحدة والأخطاء تُرجع لكل صف
+    (all_or_nothing=true يرفض الملف كاملاً عند أي خطأ).
+    """
+    return import_journal_entries(db, content, format, all_or_nothing)
+
+
+# ================== قواعد الترحيل ==================
+class PostingRuleSchema(BaseModel):
+    account_id: int
+
+
+@app.get("/posting_rules")
+def get_posting_rules(db: Session = Depends(get_db)):
+    """القواعد الفعّالة (المحفوظة + الافتراضية حسب اسم الحساب)"""
+    return posting_rules.rules(db)
+
+
+@app.put("/posting_rules/{document_type}/{role}")
+def set_posting_rule(document_type: str, role: str, rule: PostingRuleSchema, db: Session = Depends(get_db)):
+    posting_rules.check_key(document_type, role)
+    if not db.get(Account, rule.account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    existing = db.query(PostingRule).filter(
+        PostingRule.document_type == document_type, PostingRule.role == role
+    ).first()
+    if existing:
+        existing.account_id = rule.account_id
+    else:
+        db.add(PostingRule(document_type=document_type, role=role, account_id=rule.account_id))
     db.commit()
-    return journal
+    return {"document_type": document_type, "role": role, "account_id": rule.account_id}
+
+
+# ================== المسار غير المتزامن (ASYNC_DB=1) ==================
+# نفس منطق النقاط المتزامنة أعلاه يُنفّذ عبر AsyncSession.run_sync: الاستعلامات
+# تمر بـ asyncpg داخل حلقة الأحداث بدل حجز خيط من threadpool لكل طلب.
+# كود run_sync يعمل داخل حلقة الأحداث نفسها، لذلك تُنقل فقط النقاط ذات العمل
+# الخفيف في Python (صفحة محدودة أو تجميع في SQL). النقاط التي تمر على كل
+# الدفتر في Python (/transaction_lines، /inventory_report) تبقى متزامنة في الـ threadpool.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# مثل get_report_db: نسخة قراءة، أو الأساسي للعميل الذي كتب للتو
+async def get_async_report_db(request: Request):
+    db = await async_read_router.session(pin_primary=is_pinned(request.cookies))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def _run_sync(db, endpoint, *args, **kwargs):
+    return await db.run_sync(lambda session: endpoint(*args, db=session, **kwargs))
+
+
+async_router = APIRouter()
+
+
+@async_router.get("/accounts")
+async def get_accounts_async(db: AsyncSession = Depends(get_async_db)):
+    return await _run_sync(db, get_accounts)
+
+
+@async_router.get("/accounts/rollup")
+async def get_accounts_rollup_async(
+    account_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, get_accounts_rollup, account_id, start_date, end_date)
+
+
+@async_router.get("/ledger")
+async def get_ledger_async(
+    account_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    journal_entry_id: Optional[int] = None,
+    after_date: Optional[date] = None,
+    after_id: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after_journal_entry_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(
+        db, get_ledger, account_id, start_date, end_date, journal_entry_id, after_date, after_id, limit,
+        after_journal_entry_id,
+    )
+
+
+@async_router.get("/transaction_lines_with_vendor")
+async def get_transaction_lines_with_vendor_async(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, get_transaction_lines_with_vendor, after_id, limit)
+
+
+@async_router.get("/daily_expense")
+async def get_daily_expenses_async(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, get_daily_expenses, start_date, end_date, limit, offset)
+
+
+@async_router.get("/expense_analysis")
+async def expense_analysis_async(
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, expense_analysis, from_month, to_month)
+
+
+@async_router.get("/trial_balance")
+async def trial_balance_async(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, trial_balance, start_date, end_date)
+
+
+@async_router.get("/income_statement")
+async def income_statement_async(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_report_db)
+):
+    return await _run_sync(db, income_statement, start_date, end_date)
+
+
+@async_router.get("/balance_sheet")
+async def balance_sheet_async(as_of: Optional[date] = None, db: AsyncSession = Depends(get_async_report_db)):
+    return await _run_sync(db, balance_sheet, as_of)
+
+
+@async_router.post("/vendor_invoices_with_stock", response_model=VendorInvoiceResponse)
+async def create_vendor_invoice_async(
+    inv: VendorInvoiceSchema,
+    move_type: str = "consumable",
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _run_sync(db, create_vendor_invoice, inv, move_type)
+
+
+@async_router.post("/payments", response_model=PaymentResponse)
+async def create_payment_async(payment: PaymentSchema, db: AsyncSession = Depends(get_async_db)):
+    return await _run_sync(db, create_payment, payment)
+
+
+@async_router.post("/daily_expense")
+async def create_daily_expense_async(expense: DailyExpenseSchema, db: AsyncSession = Depends(get_async_db)):
+    return await _run_sync(db, create_daily_expense, expense)
+
+
+@async_router.post("/sales_invoices_with_stock", response_model=SalesInvoiceResponse)
+async def create_sales_invoice_async(
+    invoice: SalesInvoiceSchema,
+    warehouse_id: int = 1,
+    reject_if_insufficient: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _run_sync(db, create_sales_invoice, invoice, warehouse_id, reject_if_insufficient)
+
+
+@async_router.post("/adjust_journal_entry", response_model=JournalEntryResponse)
+async def create_adjust_journal_async(entry: AdjustJournalEntrySchema, db: AsyncSession = Depends(get_async_db)):
+    return await _run_sync(db, create_adjust_journal, entry)
+
+
+if ASYNC_DB:
+    # النسخ async تحل محل النسخ المتزامنة لنفس (المسار، الطريقة)
+    _async_routes = {(r.path, m) for r in async_router.routes for m in r.methods}
+    app.router.routes = [
+        r for r in app.router.routes
+        if not (isinstance(r, APIRoute) and any((r.path, m) in _async_routes for m in r.methods))
+    ]
+    app.include_router(async_router)
@@ -0,0 +1,173 @@
+"""
+قياس كل طلب: عدد استعلامات SQL وزمنها وزمن تحويل الاستجابة (serialization)
+
+- مستمعا before/after_cursor_execute على كل المحركات يضيفان كل استعلام وزمنه إلى
+  إحصاءات الطلب الحالي (ContextVar، فتصل إلى threadpool الخاص بالمسارات المتزامنة).
+- زمن التحويل هو زمن serialize_response في FastAPI (التحقق بـ response_model
+  وjsonable_encoder)، ولا توجد نقطة ربط رسمية له فيُغلَّف عند الاستيراد. الدالة داخلية
+  في FastAPI، لذلك إصداره مثبّت في requirements.txt، وtests/test_metrics.py يفشل إن
+  توقف FastAPI عن استدعائها بعد ترقية (فيُعرض زمن تحويل صفر بصمت).
+- middleware في main.py يبدأ الإحصاءات ويسجلها في مدرّجات (histograms) لكل مسار
+  تعرضها /metrics بصيغة Prometheus النصية، ويضيف ملخصها في ترويسة Server-Timing.
+- إنذار N+1: أي طلب ينفّذ أكثر من N_PLUS_ONE_THRESHOLD استعلاماً يُسجَّل في السجل
+  مع أكثر استعلام تكراراً فيه.
+
+المدرّجات في ذاكرة العملية، فمع أكثر من worker يجمعها Prometheus من كل عملية.
+في الاستجابات المتدفقة (التصدير) تشمل الأرقام ما نُفّذ قبل بدء الإرسال فقط.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+import fastapi.routing
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.by_statement = Counter()
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+# ---------------- SQL ----------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        started = getattr(context, "metrics_started", None)
+        if started is not None:
+            stats.db_seconds += time.perf_counter() - started
+        stats.by_statement[statement] += 1
+
+
+# ---------------- serialization ----------------
+# FastAPI يستدعي fastapi.routing.serialize_response باسمها من داخل الوحدة نفسها عند كل طلب،
+# فاستبدال الاسم في الوحدة يكفي (راجع تثبيت الإصدار في requirements.txt)
+_serialize_response = fastapi.routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return await _serialize_response(*args, **kwargs)
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+
+
+fastapi.routing.serialize_response = _timed_serialize_response
+
+
+# ---------------- المدرّجات ----------------
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # labels -> [counts لكل حد..., sum, count]
+
+    def observe(self, labels, value):
+        series = self.series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for (method, route), series in sorted(self.series.items()):
+            labels = f'method="{method}",route="{route}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+_lock = threading.Lock()
+REQUEST_SECONDS = Histogram("erp_request_duration_seconds", "Request duration", DURATION_BUCKETS)
+DB_SECONDS = Histogram("erp_db_duration_seconds", "Time spent executing SQL per request", DURATION_BUCKETS)
+SERIALIZE_SECONDS = Histogram(
+    "erp_serialization_duration_seconds", "Time spent validating and encoding the response", DURATION_BUCKETS
+)
+STATEMENTS = Histogram("erp_db_statements", "SQL statements per request", STATEMENT_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, SERIALIZE_SECONDS, STATEMENTS)
+N_PLUS_ONE = Counter()  # (method, route) -> عدد الطلبات التي تجاوزت الحد
+
+
+def record(method, route, stats, seconds):
+    labels = (method, route)
+    with _lock:
+        REQUEST_SECONDS.observe(labels, seconds)
+        DB_SECONDS.observe(labels, stats.db_seconds)
+        SERIALIZE_SECONDS.observe(labels, stats.serialize_seconds)
+        STATEMENTS.observe(labels, stats.statements)
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        alarm = threshold and stats.statements > threshold
+        if alarm:
+            N_PLUS_ONE[labels] += 1
+    if alarm:
+        statement, repeated = stats.by_statement.most_common(1)[0]
+        logger.warning(
+            "N+1: %s %s نفّذ %d استعلاماً (الحد %d)، أكثرها تكراراً %d مرة: %s",
+            method, route, stats.statements, threshold, repeated, " ".join(statement.split())[:200],
+        )
+
+
+def server_timing(stats, seconds):
+    """ملخص الطلب في ترويسة Server-Timing (تظهر في أدوات المطور في المتصفح)"""
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} statements", '
+        f"serialize;dur={stats.serialize_seconds * 1000:.1f}, "
+        f"total;dur={seconds * 1000:.1f}"
+    )
+
+
+def render():
+    """كل المقاييس بصيغة Prometheus النصية (text/plain; version=0.0.4)"""
+    with _lock:
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines += histogram.render()
+        lines += [
+            "# HELP erp_n_plus_one_total Requests that exceeded N_PLUS_ONE_THRESHOLD statements",
+            "# TYPE erp_n_plus_one_total counter",
+        ]
+        lines += [
+            f'erp_n_plus_one_total{{method="{method}",route="{route}"}} {count}'
+            for (method, route), count in sorted(N_PLUS_ONE.items())
+        ]
+    return "\n".join(lines) + "\n"
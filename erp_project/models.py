@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey,Numeric,Boolean,UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey,Numeric,Boolean,UniqueConstraint,Index,func
 from sqlalchemy.orm import relationship
 from database.database import Base
 
@@ -17,6 +17,88 @@ class Account(Base):
 
     parent = relationship("Account", remote_side=[id], backref="children")
     transaction_lines = relationship("TransactionLine", back_populates="account")
+    totals = relationship("AccountBalance", back_populates="account", uselist=False, cascade="all, delete-orphan")
+    monthly_totals = relationship("AccountMonthlyTotal", cascade="all, delete-orphan")
+    daily_balances = relationship("AccountDailyBalance", cascade="all, delete-orphan")
+
+
+class PostingRule(Base):
+    """الحساب المستخدم لكل دور في ترحيل نوع مستند (مثل vendor_invoice / payable)"""
+    __tablename__ = "posting_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_type = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False)
+
+    account = relationship("Account")
+
+    __table_args__ = (
+        UniqueConstraint("document_type", "role", name="uq_posting_rules_document_type_role"),
+    )
+
+
+class AccountClosure(Base):
+    """
+    جدول الإغلاق (closure table) لشجرة الحسابات: صف لكل (أصل، فرع) بأي عمق،
+    بما فيه الحساب مع نفسه بعمق 0، فيُجمع رصيد أي حساب مع كل فروعه باستعلام واحد.
+    """
+    __tablename__ = "account_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_account_closure_descendant_id", "descendant_id"),
+    )
+
+
+class AccountBalance(Base):
+    """مجاميع المدين والدائن لكل حساب، تُحدَّث مع كل ترحيل بدل تجميع دفتر الأستاذ كاملاً"""
+    __tablename__ = "account_balances"
+
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    debit_total = Column(Float, nullable=False, default=0.0)
+    credit_total = Column(Float, nullable=False, default=0.0)
+
+    account = relationship("Account", back_populates="totals")
+
+
+class AccountMonthlyTotal(Base):
+    """مجاميع المدين والدائن لكل حساب في كل شهر (تحليل المصروفات الشهري)"""
+    __tablename__ = "account_monthly_totals"
+
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    debit_total = Column(Float, nullable=False, default=0.0)
+    credit_total = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (Index("ix_account_monthly_totals_month", "month"),)
+
+
+class AccountDailyBalance(Base):
+    """
+    الرصيد التراكمي (مجموع المدين والدائن منذ البداية) لكل حساب في نهاية كل يوم فيه حركة.
+    الرصيد في أي تاريخ = آخر صف بتاريخ <= ذلك التاريخ.
+    """
+    __tablename__ = "account_daily_balances"
+
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    debit_total = Column(Float, nullable=False, default=0.0)
+    credit_total = Column(Float, nullable=False, default=0.0)
+
+
+# أنواع المستندات المصدر (JournalEntry.source_type و StockMove.source_type)
+VENDOR_INVOICE = "vendor_invoice"
+SALES_INVOICE = "sales_invoice"
+PAYMENT = "payment"
+OPENING_BALANCE = "opening_balance"  # القيد الافتتاحي عند إنشاء حساب
+FISCAL_CLOSE = "fiscal_close"        # قيد إقفال الإيرادات والمصروفات في حقوق الملكية
+YEAR_OPENING = "year_opening"        # أرصدة أول السنة بعد أرشفة سطور السنة المقفلة
+JOURNAL_IMPORT = "journal_import"    # قيود مستوردة بالجملة من ملف
+STOCK_TRANSFER = "stock_transfer"    # تحويل مخزون بين مخزنين (حركتا صادر ووارد)
 
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
@@ -24,9 +106,17 @@ class JournalEntry(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False)
     description = Column(String)
+    source_type = Column(String, nullable=True)  # vendor_invoice / sales_invoice / payment ...
+    source_id = Column(Integer, nullable=True)   # رقم المستند المصدر
 
     lines = relationship("TransactionLine", back_populates="journal_entry")
 
+    __table_args__ = (
+        # ترتيب دفتر الأستاذ (date, id) للتقسيم إلى صفحات
+        Index("ix_journal_entries_date_id", "date", "id"),
+        Index("ix_journal_entries_source", "source_type", "source_id"),
+    )
+
 
 class TransactionLine(Base):
     __tablename__ = "transaction_lines"
@@ -40,6 +130,37 @@ class TransactionLine(Base):
     journal_entry = relationship("JournalEntry", back_populates="lines")
     account = relationship("Account", back_populates="transaction_lines")
 
+    __table_args__ = (
+        Index("ix_transaction_lines_journal_entry_id", "journal_entry_id"),
+        Index("ix_transaction_lines_account_id_id", "account_id", "id"),
+        # إقفال السنة ينقل السطور إلى الأرشيف بأرقامها ثم يعيدها عند إعادة الفتح،
+        # فلا يجوز أن يعيد SQLite استخدام رقم سطر محذوف (PostgreSQL لا يعيده أصلاً)
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TransactionLineArchive(Base):
+    """سطور القيود المنقولة من transaction_lines عند إقفال السنة المالية"""
+    __tablename__ = "transaction_lines_archive"
+
+    id = Column(Integer, primary_key=True)  # نفس رقم السطر الأصلي
+    journal_entry_id = Column(Integer, ForeignKey("journal_entries.id"), index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"))
+    debit = Column(Float, default=0.0)
+    credit = Column(Float, default=0.0)
+    fiscal_year = Column(Integer, nullable=False, index=True)
+
+
+class FiscalYearClose(Base):
+    """السنوات المالية المقفلة؛ أي ترحيل بتاريخ في سنة مقفلة يُرفض"""
+    __tablename__ = "fiscal_year_closes"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    closed_on = Column(Date, nullable=False)
+    retained_earnings_account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    closing_entry_id = Column(Integer, ForeignKey("journal_entries.id"))
+    opening_entry_id = Column(Integer, ForeignKey("journal_entries.id"))
+
 
 # ==============================
 # قسم المخزون Inventory
@@ -57,6 +178,16 @@ class Product(Base):
     stock_moves = relationship("StockMove", back_populates="product")
     purchase_lines = relationship("PurchaseOrderLine", back_populates="product")
 
+    # فهرس جزئي بالمنتجات تحت حد إعادة الطلب فقط (GET /products/below_reorder):
+    # الاستعلام بنفس الشرط يقرأ الفهرس الصغير بدل فحص جدول المنتجات كله
+    __table_args__ = (
+        Index(
+            "ix_products_below_reorder", "id",
+            postgresql_where=quantity_on_hand < reorder_level,
+            sqlite_where=quantity_on_hand < reorder_level,
+        ),
+    )
+
 
 class Warehouse(Base):
     __tablename__ = "warehouses"
@@ -79,11 +210,48 @@ class StockMove(Base):
     move_type = Column(String)  # in / out
     reference = Column(String)
     purpose = Column(String, default="stock")
+    source_type = Column(String, nullable=True)  # sales_invoice ...
+    source_id = Column(Integer, nullable=True)
 
     product = relationship("Product", back_populates="stock_moves")
     warehouse = relationship("Warehouse", back_populates="stock_moves")
     department = relationship("Department", back_populates="stock_moves")  # <- يربط العلاقة
 
+    __table_args__ = (
+        Index("ix_stock_moves_source", "source_type", "source_id"),
+        Index("ix_stock_moves_date_id", "date", "id"),
+        Index("ix_stock_moves_product_id_date_id", "product_id", "date", "id"),
+        Index("ix_stock_moves_warehouse_id_date_id", "warehouse_id", "date", "id"),
+    )
+
+class StockBalance(Base):
+    """
+    الكمية الحالية لكل منتج في كل مخزن = مجموع حركاته الواردة - الصادرة.
+    تُحدَّث في نفس معاملة الحركة (inventory.apply_moves).
+    """
+    __tablename__ = "stock_balances"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (Index("ix_stock_balances_warehouse_id", "warehouse_id"),)
+
+
+class LowStockAlert(Base):
+    """
+    عبور منتج لحد إعادة الطلب: state = below عند نزول رصيده تحته، وrecovered عند عودته.
+    يُكتب في نفس معاملة تعديل الرصيد (low_stock.record_crossings) ويُقرأ بترتيب id.
+    """
+    __tablename__ = "low_stock_alerts"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    state = Column(String, nullable=False)  # below / recovered
+    quantity_on_hand = Column(Float, nullable=False)
+    reorder_level = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
 # ==============================
 # قسم المشتريات Purchasing
 # ==============================
@@ -0,0 +1,58 @@
+"""
+خدمة الترحيل: بناء القيد وسطوره والمستند المرتبط به في الذاكرة ثم حفظها
+داخل معاملة واحدة (يقوم المستدعي بالـ commit مرة واحدة).
+
+القيد والمستندات تُحفظ بعملية flush واحدة، وسطور القيد بـ insert_returning_ids
+(INSERT متعدد الصفوف مع RETURNING على PostgreSQL، وexecutemany على SQLite حيث
+يُدخل الـ flush كل سطر بجملة مستقلة)، فعدد الجمل لا ينمو بعدد السطور.
+السطور تُربط بالجلسة كصفوف محفوظة بأرقامها (ids) دون إعادة الاستعلام.
+"""
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from balances import apply_lines
+from database.dialects import insert_returning_ids
+from fiscal import ensure_open
+from models import JournalEntry, TransactionLine
+
+
+def build_entry(entry_date, description, lines, source_type=None):
+    """
+    إنشاء قيد في الذاكرة
+    lines: [(account_id, debit, credit), ...]
+    """
+    entry = JournalEntry(date=entry_date, description=description, source_type=source_type)
+    entry.lines = [
+        TransactionLine(account_id=account_id, debit=debit, credit=credit)
+        for account_id, debit, credit in lines
+    ]
+    return entry
+
+
+def post(db, entry, *documents):
+    """
+    حفظ القيد والمستندات المرتبطة به (فاتورة، دفعة...) وتحديث أرصدة الحسابات.
+    المستند الأول هو مصدر القيد (source_id) إذا كان للقيد source_type.
+    لا تقوم بـ commit: أي خطأ قبل commit المستدعي يُلغي الترحيل كاملاً.
+    """
+    ensure_open(db, entry.date)
+    lines = list(entry.lines)
+    entry.lines = []
+    db.add(entry)
+    db.add_all(documents)
+    db.flush()
+    if entry.source_type and documents:
+        entry.source_id = documents[0].id
+
+    ids = insert_returning_ids(db, TransactionLine, [
+        {"journal_entry_id": entry.id, "account_id": line.account_id, "debit": line.debit, "credit": line.credit}
+        for line in lines
+    ])
+    for line, line_id in zip(lines, ids):
+        line.id, line.journal_entry_id = line_id, entry.id
+        make_transient_to_detached(line)
+        db.add(line)
+    set_committed_value(entry, "lines", lines)
+
+    apply_lines(db, lines, entry.date)
+    return entry
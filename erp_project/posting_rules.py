@@ -0,0 +1,139 @@
+"""
+قواعد الترحيل: (نوع المستند، الدور) -> الحساب
+
+القواعد محفوظة في جدول posting_rules ومحمّلة في ذاكرة العملية، فيحدد الترحيل
+حساباته بدون أي استعلام. الذاكرة تُفرّغ تلقائياً بعد أي commit عدّل حساباً أو
+قاعدة، وتُعاد قراءتها عند أول ترحيل بعده. مع أكثر من عملية (workers) كل عملية
+تفرّغ ذاكرتها فقط، لذلك تنتهي صلاحية الذاكرة أيضاً بعد POSTING_RULES_TTL ثانية.
+
+الذاكرة لا تحمل إلا أرقام حسابات القواعد، والحساب المستخدم في قاعدة لا يُحذف
+(in_use)، فالقيمة القديمة في عملية أخرى تشير دائماً إلى حساب موجود. الحسابات
+التي يختارها المستخدم في الطلب تُتحقق منها من قاعدة البيانات مباشرة.
+
+إن لم توجد قاعدة لدور افتراضي يُستخدم الحساب الذي يحمل الاسم القديم
+(DEFAULT_ACCOUNT_NAMES) حتى تعمل قواعد البيانات القائمة بدون إعداد.
+"""
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import PAYMENT, SALES_INVOICE, VENDOR_INVOICE, Account, PostingRule
+
+# الأدوار
+EXPENSE = "expense"
+PAYABLE = "payable"
+RECEIVABLE = "receivable"
+REVENUE = "revenue"
+
+DEFAULT_ACCOUNT_NAMES = {
+    (VENDOR_INVOICE, EXPENSE): "مستهلكات",
+    (VENDOR_INVOICE, PAYABLE): "حساب الموردين",
+    (PAYMENT, PAYABLE): "حساب الموردين",
+    (SALES_INVOICE, RECEIVABLE): "حسابات العملاء",
+    (SALES_INVOICE, REVENUE): "ايرادات مبيعات",
+}
+
+TTL = float(os.getenv("POSTING_RULES_TTL", "60"))
+
+_lock = threading.Lock()
+_cache = None  # {"rules": {(document_type, role): account_id}, "loaded_at": ...}
+
+
+def _load_rules(db):
+    rules = {
+        (r.document_type, r.role): r.account_id
+        for r in db.query(PostingRule.document_type, PostingRule.role, PostingRule.account_id).all()
+    }
+    missing = {name for key, name in DEFAULT_ACCOUNT_NAMES.items() if key not in rules}
+    if missing:
+        by_name = {}
+        for account_id, name in (
+            db.query(Account.id, Account.name).filter(Account.name.in_(missing)).order_by(Account.id).all()
+        ):
+            by_name.setdefault(name, account_id)
+        for key, name in DEFAULT_ACCOUNT_NAMES.items():
+            if key not in rules and name in by_name:
+                rules[key] = by_name[name]
+    return rules
+
+
+def _load(db):
+    return {"rules": _load_rules(db), "loaded_at": time.monotonic()}
+
+
+def _get(db):
+    global _cache
+    cache = _cache
+    if cache is None or time.monotonic() - cache["loaded_at"] > TTL:
+        with _lock:
+            cache = _cache
+            if cache is None or time.monotonic() - cache["loaded_at"] > TTL:
+                cache = _cache = _load(db)
+    return cache
+
+
+def invalidate():
+    global _cache
+    _cache = None
+
+
+def check_key(document_type, role):
+    """رفض نوع مستند أو دور لا يستخدمه الترحيل (422): القاعدة عندها لن تُقرأ أبداً"""
+    if (document_type, role) not in DEFAULT_ACCOUNT_NAMES:
+        known = ", ".join(f"{d}/{r}" for d, r in sorted(DEFAULT_ACCOUNT_NAMES))
+        raise HTTPException(
+            status_code=422,
+            detail=f"لا يوجد دور {role} للمستند {document_type}؛ القواعد المعروفة: {known}",
+        )
+
+
+def resolve(db, document_type, role):
+    """رقم الحساب المرتبط بالدور في نوع المستند (بدون استعلام إذا كانت الذاكرة محمّلة)"""
+    account_id = _get(db)["rules"].get((document_type, role))
+    if account_id is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"لا توجد قاعدة ترحيل للمستند {document_type} والدور {role}",
+        )
+    return account_id
+
+
+def in_use(db, account_id):
+    """هل يستخدم الحساب في قاعدة ترحيل (من قاعدة البيانات مباشرة وليس من الذاكرة)"""
+    return account_id in _load_rules(db).values()
+
+
+def rules(db):
+    return [
+        {"document_type": document_type, "role": role, "account_id": account_id}
+        for (document_type, role), account_id in sorted(_get(db)["rules"].items())
+    ]
+
+
+# ---------------- تفريغ الذاكرة بعد تعديل حساب أو قاعدة ----------------
+def _touches_rules(session):
+    return any(
+        isinstance(obj, (Account, PostingRule))
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_dirty(session, flush_context, instances):
+    if _touches_rules(session):
+        session.info["posting_rules_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("posting_rules_dirty", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("posting_rules_dirty", None)
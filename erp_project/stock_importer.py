@@ -0,0 +1,159 @@
+"""
+استيراد حركات المخزون بالجملة (أجهزة المسح ومزامنة المخازن الليلية)
+
+جسم الطلب مصفوفة JSON أو NDJSON (كائن لكل سطر)، كل عنصر حركة:
+    product_id, warehouse_id, department_id (اختياري), date, quantity, move_type (in/out),
+    reference, purpose
+يُتحقق من كل عنصر، ومن وجود المنتجات والمخازن والأقسام باستعلام IN واحد لكل جدول
+(استعلام المنتجات يقفل صفوفها بترتيب رقمها حتى نهاية المعاملة)، ثم تُحفظ الحركات
+السليمة دفعة واحدة داخل معاملة واحدة:
+- صافي الحركات لكل منتج في جملة UPDATE واحدة لكل المنتجات (inventory.update_products)،
+- stock_moves بـ insert_returning_ids (INSERT متعدد الصفوف مع RETURNING، أو executemany على SQLite)،
+- أرصدة المخازن بـ inventory.apply_moves مرة واحدة.
+
+الرصيد الإجمالي يُعدَّل بصافي حركات الملف لكل منتج: صافي صرف أكبر من الرصيد يصفّره،
+أو تُرفض كل حركات ذلك المنتج مع reject_if_insufficient. مع reject_if_insufficient تُرفض
+كذلك كل حركات منتج في مخزن لا يكفي رصيده فيه صافي صرف الملف (inventory.short_balances).
+"""
+import json
+import math
+from datetime import date
+
+from balances import TOLERANCE
+from database.dialects import insert_returning_ids
+from importer import decode_body
+from inventory import SIGNS, Move, apply_moves, lock_products, short_balances, update_products
+from models import Department, StockMove, Warehouse
+
+
+def _parse(content):
+    """مصفوفة JSON إن بدأ الجسم بـ [، وإلا NDJSON؛ العنصر غير الصالح يصبح خطأ في صفه"""
+    text = decode_body(content).strip()
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+        except ValueError:
+            return [{"_error": "مصفوفة JSON غير صالحة"}]
+    else:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append({"_error": "سطر JSON غير صالح"})
+    return [item if isinstance(item, dict) else {"_error": "كل عنصر يجب أن يكون كائن JSON"} for item in items]
+
+
+def _as_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _ids(items, key):
+    return {i for i in (_as_id(item.get(key)) for item in items) if i is not None}
+
+
+def _validate(items, on_hand, warehouse_ids, department_ids):
+    """إرجاع ([(row, Move)] السليمة بالترتيب، قائمة الأخطاء لكل صف)"""
+    valid, errors = [], []
+    for number, item in enumerate(items, start=1):
+        try:
+            if item.get("_error"):
+                raise ValueError(item["_error"])
+            move_type = item.get("move_type")
+            if move_type not in SIGNS:
+                raise ValueError("move_type يجب أن يكون 'in' أو 'out'")
+            product_id = _as_id(item.get("product_id"))
+            if product_id not in on_hand:
+                raise ValueError(f"منتج غير موجود: {item.get('product_id')}")
+            warehouse_id = _as_id(item.get("warehouse_id"))
+            if warehouse_id not in warehouse_ids:
+                raise ValueError(f"مخزن غير موجود: {item.get('warehouse_id')}")
+            department_id = None
+            if item.get("department_id") is not None:
+                department_id = _as_id(item["department_id"])
+                if department_id not in department_ids:
+                    raise ValueError(f"قسم غير موجود: {item['department_id']}")
+            try:
+                move_date = date.fromisoformat(str(item.get("date") or "").strip())
+            except ValueError:
+                raise ValueError("تاريخ غير صالح (YYYY-MM-DD)")
+            try:
+                quantity = float(item.get("quantity"))
+            except (TypeError, ValueError):
+                raise ValueError("كمية غير صالحة")
+            if not math.isfinite(quantity) or quantity <= 0:
+                raise ValueError("الكمية يجب أن تكون أكبر من صفر")
+            for key in ("reference", "purpose"):
+                if item.get(key) is not None and not isinstance(item[key], str):
+                    raise ValueError(f"{key} يجب أن يكون نصاً")
+            valid.append((number, Move(
+                product_id, warehouse_id, department_id, move_date, quantity, move_type,
+                item.get("reference"), item.get("purpose") or "stock",
+            )))
+        except ValueError as exc:
+            errors.append({"row": number, "error": str(exc)})
+    return valid, errors
+
+
+def _net(valid):
+    deltas = {}
+    for _, m in valid:
+        deltas[m.product_id] = deltas.get(m.product_id, 0.0) + SIGNS[m.move_type] * m.quantity
+    return deltas
+
+
+def _net_by_warehouse(valid):
+    deltas = {}
+    for _, m in valid:
+        key = (m.product_id, m.warehouse_id)
+        deltas[key] = deltas.get(key, 0.0) + SIGNS[m.move_type] * m.quantity
+    return deltas
+
+
+def import_stock_moves(db, content, reject_if_insufficient=False, all_or_nothing=False):
+    items = _parse(content)
+
+    on_hand = lock_products(db, _ids(items, "product_id"))
+    warehouse_ids = {i for (i,) in db.query(Warehouse.id).filter(Warehouse.id.in_(_ids(items, "warehouse_id")))}
+    department_ids = {i for (i,) in db.query(Department.id).filter(Department.id.in_(_ids(items, "department_id")))}
+    valid, errors = _validate(items, on_hand, warehouse_ids, department_ids)
+
+    if reject_if_insufficient:
+        short = {p for p, delta in _net(valid).items() if on_hand[p] + delta < -TOLERANCE}
+        errors += [
+            {"row": number, "error": f"الكمية المتاحة من المنتج {m.product_id} ({on_hand[m.product_id]}) لا تكفي صافي الصرف"}
+            for number, m in valid if m.product_id in short
+        ]
+        valid = [(number, m) for number, m in valid if m.product_id not in short]
+
+        short = short_balances(db, _net_by_warehouse(valid))
+        errors += [
+            {"row": number, "error": f"الكمية المتاحة من المنتج {m.product_id} في المخزن {m.warehouse_id} "
+                                     f"({short[m.product_id, m.warehouse_id]}) لا تكفي صافي الصرف"}
+            for number, m in valid if (m.product_id, m.warehouse_id) in short
+        ]
+        valid = [(number, m) for number, m in valid if (m.product_id, m.warehouse_id) not in short]
+    errors.sort(key=lambda e: e["row"])
+
+    if not valid or (errors and all_or_nothing):
+        db.rollback()
+        return {"imported": 0, "results": errors, "errors": len(errors)}
+
+    update_products(db, _net(valid), on_hand)
+    move_ids = insert_returning_ids(db, StockMove, [m._asdict() for _, m in valid])
+    apply_moves(db, [m for _, m in valid])
+    db.commit()
+
+    results = sorted(
+        [{"row": number, "id": move_id} for (number, _), move_id in zip(valid, move_ids)] + errors,
+        key=lambda r: r["row"],
+    )
+    return {"imported": len(move_ids), "results": results, "errors": len(errors)}
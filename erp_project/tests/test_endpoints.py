@@ -0,0 +1,175 @@
+"""
+كل نقاط الـ API على كل قاعدة (conftest.engine: SQLite وPostgreSQL):
+سيناريو واحد يمر على كل مسار، والاختبار يفشل إن أُضيف مسار لا يغطيه السيناريو.
+"""
+from starlette.routing import Match
+
+import inventory
+import main
+from balances import verify
+from config import settings
+
+DOCS = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
+
+
+class Recorder:
+    """يغلّف TestClient ويسجل المسار (route) الذي طابقه كل طلب"""
+
+    def __init__(self, client):
+        self.client = client
+        self.hit = set()
+
+    def __call__(self, method, url, expected=200, **kwargs):
+        path = url.split("?", 1)[0]
+        for route in main.app.routes:
+            if route.matches({"type": "http", "path": path, "method": method})[0] == Match.FULL:
+                self.hit.add((method, route.path))
+                break
+        r = self.client.request(method, url, **kwargs)
+        assert r.status_code == expected, f"{method} {url}: {r.status_code} {r.text}"
+        return r.json() if r.headers.get("content-type", "").startswith("application/json") else r.text
+
+
+def test_every_endpoint(client, accounts, session_factory, monkeypatch):
+    call = Recorder(client)
+    expense, cash = accounts["مستهلكات"], accounts["الصندوق"]
+
+    # الموارد البشرية
+    dept = call("POST", "/departments", json={"name": "المبيعات", "description": None})["id"]
+    call("PUT", f"/departments/{dept}", json={"name": "المبيعات", "description": "فرع"})
+    employee_body = {
+        "name": "موظف", "phone": None, "department_id": dept, "job_title": None,
+        "salary": 1000, "payment_method": None,
+    }
+    emp = call("POST", "/employees", json=employee_body)["id"]
+    call("PUT", f"/employees/{emp}", json={**employee_body, "salary": 1200})
+    bonus = call("POST", "/bonuses", json={"employee_id": emp, "month": "2026-01", "amount": 50, "reason": None})["id"]
+    call("PUT", f"/bonuses/{bonus}", json={"employee_id": emp, "month": "2026-01", "amount": 60, "reason": "x"})
+    deduction = call("POST", "/deductions", json={"employee_id": emp, "month": "2026-01", "amount": 10, "reason": None})["id"]
+    call("PUT", f"/deductions/{deduction}", json={"employee_id": emp, "month": "2026-01", "amount": 20, "reason": "y"})
+    call("POST", "/attendances", json={"employee_id": emp, "date": "2026-01-02", "status": "present"})
+    slip = call("GET", f"/salary_slips/{emp}/2026-01")
+    assert slip["month"] == "2026-01"
+    for path in ("/employees", "/bonuses", "/deductions", "/attendances", "/departments"):
+        call("GET", path)
+    call("DELETE", f"/bonuses/{bonus}")
+    call("DELETE", f"/deductions/{deduction}")
+
+    # الحسابات
+    equity = call("POST", "/accounts", json={"name": "أرباح مبقاة", "code": "3001", "type": "Equity"})["id"]
+    child = call("POST", "/accounts", json={"name": "مستهلكات فرعية", "code": "5011", "type": "Expense", "parent_id": expense})["id"]
+    call("PUT", f"/accounts/{child}", json={"name": "مستهلكات فرعية", "code": "5011", "type": "Expense", "parent_id": expense})
+    temp = call("POST", "/accounts", json={"name": "مؤقت", "code": "9999", "type": "Asset"})["id"]
+    call("DELETE", f"/accounts/{temp}")
+    call("GET", "/accounts")
+    call("GET", "/posting_rules")
+    call("PUT", "/posting_rules/vendor_invoice/expense", json={"account_id": expense})
+
+    # الموردون والمخزون
+    vendor = call("POST", "/vendors", json={"name": "مورد", "contact": None})["id"]
+    warehouse = call("POST", "/warehouses", json={"name": "رئيسي", "location": None})["id"]
+    product = call("POST", "/products", json={"name": "ورق", "quantity_on_hand": 100, "reorder_level": 5})["id"]
+    call("PUT", f"/products/{product}", json={"name": "ورق", "quantity_on_hand": 100, "reorder_level": 10})
+    order = call("POST", "/purchase_orders", json={"vendor_id": vendor, "date": "2026-01-01"})["id"]
+    call("POST", "/purchase_order_lines", json={"order_id": order, "product_id": product, "quantity": 2, "unit_price": 3})
+    asset = call("POST", "/assets", json={"name": "حاسوب", "purchase_date": "2026-01-01", "cost": 900, "depreciation_rate": 0.2})["id"]
+    call("POST", "/depreciation_lines", json={"asset_id": asset, "date": "2026-12-31", "amount": 180})
+    for path in ("/vendors", "/warehouses", "/products", "/purchase_orders", "/purchase_order_lines", "/assets", "/depreciation_lines"):
+        call("GET", path)
+
+    # المستندات والترحيل (سنة 2025 لإقفالها لاحقاً)
+    invoice_body = {"vendor_id": vendor, "department_id": dept, "date": "2025-03-01", "total": 30,
+                    "lines": [{"product_name": "ورق", "quantity": 3, "unit_price": 10}]}
+    call("POST", "/vendor_invoices_with_stock", json=invoice_body)
+    extra_invoice = call("POST", "/vendor_invoices_with_stock?move_type=inventory",
+                         json={**invoice_body, "date": "2026-01-10"})["id"]
+    call("GET", "/vendor_invoices")
+    call("GET", f"/vendor_invoices/by_vendor/{vendor}")
+    call("GET", f"/vendor_invoices/by_department/{dept}")
+    call("DELETE", f"/vendor_invoices/{extra_invoice}")
+
+    call("POST", "/payments", json={"vendor_id": vendor, "date": "2025-04-01", "amount": 30, "account_id": cash})
+    extra_payment = call("POST", "/payments", json={"vendor_id": vendor, "date": "2026-01-11", "amount": 5, "account_id": cash})["id"]
+    call("GET", "/payments")
+    call("DELETE", f"/payments/{extra_payment}")
+
+    sale = {"customer_name": "عميل", "date": "2025-05-01", "total": 40, "department_id": dept,
+            "items": [{"product_id": product, "quantity": 4, "price": 10}]}
+    call("POST", f"/sales_invoices_with_stock?warehouse_id={warehouse}", json=sale)
+    extra_sale = call("POST", f"/sales_invoices_with_stock?warehouse_id={warehouse}", json={**sale, "date": "2026-01-12"})["id"]
+    call("GET", "/sales_invoices")
+    call("GET", f"/sales_invoices/by_department/{dept}")
+    call("DELETE", f"/sales_invoices/{extra_sale}")
+
+    call("POST", "/stock_moves", json={"product_id": product, "warehouse_id": warehouse, "date": "2026-01-03",
+                                       "quantity": 5, "move_type": "in", "department_id": dept})
+    call("GET", "/stock_moves")
+    call("GET", "/inventory_report")
+    branch = call("POST", "/warehouses", json={"name": "فرعي", "location": None})["id"]
+    moved = call("POST", "/stock_transfers", json={"product_id": product, "from_warehouse_id": warehouse,
+                                                   "to_warehouse_id": branch, "date": "2026-01-04", "quantity": 1})
+    assert (moved["from_quantity"], moved["to_quantity"]) == (0, 1)
+    call("GET", f"/warehouses/{branch}/stock")
+    batch = call("POST", "/stock_moves/batch", json=[
+        {"product_id": product, "warehouse_id": branch, "date": "2026-01-05", "quantity": 3, "move_type": "in"},
+        {"product_id": product, "warehouse_id": branch, "date": "2026-01-05", "quantity": 1, "move_type": "out"},
+    ])
+    assert batch["imported"] == 2
+    call("GET", f"/products/{product}/stock")
+
+    # تنبيهات حد إعادة الطلب (البث ينتهي بعد دورة قراءة واحدة)
+    call("PUT", f"/products/{product}", json={"name": "ورق", "quantity_on_hand": 3, "reorder_level": 10})
+    assert [p["product_id"] for p in call("GET", "/products/below_reorder")] == [product]
+    assert [a["state"] for a in call("GET", "/low_stock_alerts")] == ["below"]
+    monkeypatch.setattr(settings, "LOW_STOCK_STREAM_MAX_SECONDS", 0)
+    assert "event: below" in call("GET", "/low_stock_alerts/stream?after_id=0")
+
+    expense_entry = call("POST", "/daily_expense", json={"amount": 7, "description": "شاي",
+                                                         "expense_account_id": child, "credit_account_id": cash})
+    call("GET", "/daily_expense")
+    call("DELETE", f"/daily_expense/{expense_entry['journal_entry_id']}")
+    call("POST", "/adjust_journal_entry", json={"date": "2025-06-30", "description": "تسوية", "lines": [
+        {"account_id": expense, "debit": 2, "credit": 0}, {"account_id": cash, "debit": 0, "credit": 2},
+    ]})
+    call("POST", "/journal_entries", json={"date": "2026-01-05", "description": "رأس قيد"})
+    call("GET", "/journal_entries")
+    call("POST", "/journal_entries/import", content="entry_ref,date,description,account_code,debit,credit\n"
+         "A,2026-02-01,import,1001,15,\nA,2026-02-01,import,2001,,15\n",
+         headers={"content-type": "text/csv"})
+
+    # التقارير
+    call("GET", "/transaction_lines")
+    ledger = call("GET", f"/ledger?account_id={cash}&limit=2")
+    assert ledger["items"]
+    call("GET", "/transaction_lines_with_vendor")
+    call("GET", f"/accounts/rollup?account_id={expense}")
+    trial = call("GET", "/trial_balance")
+    assert abs(sum(a["debit"] - a["credit"] for a in trial)) < 1e-6
+    call("GET", "/income_statement?start_date=2025-01-01&end_date=2025-12-31")
+    call("GET", "/balance_sheet")
+    analysis = call("GET", "/expense_analysis?from_month=2025-01&to_month=2025-12")
+    assert analysis["total_expenses"] == 32
+    for path in ("/export/ledger", "/export/vendor_invoices", "/export/sales_invoices", "/export/stock_moves"):
+        call("GET", f"{path}?format=ndjson")
+    assert "erp_db_statements_bucket" in call("GET", "/metrics")
+
+    # إقفال السنة وإعادة فتحها
+    call("POST", f"/fiscal_years/2025/close?retained_earnings_account_id={equity}")
+    assert [y["year"] for y in call("GET", "/fiscal_years")] == [2025]
+    call("POST", "/fiscal_years/2025/reopen")
+
+    # الحذف في النهاية (ON DELETE CASCADE على الموظف)
+    call("DELETE", f"/employees/{emp}")
+    call("DELETE", f"/departments/{call('POST', '/departments', json={'name': 'مؤقت', 'description': None})['id']}")
+
+    with session_factory() as db:
+        assert verify(db) == []
+        assert inventory.verify(db) == []
+
+    routes = {
+        (method, route.path)
+        for route in main.app.routes
+        if route.path not in DOCS
+        for method in route.methods
+    }
+    assert routes - call.hit == set()
@@ -0,0 +1,40 @@
+import json
+
+from balances import verify
+
+
+def _expense(client, accounts, day, amount):
+    r = client.post("/adjust_journal_entry", json={"date": day, "description": "x", "lines": [
+        {"account_id": accounts["مستهلكات"], "debit": amount, "credit": 0},
+        {"account_id": accounts["الصندوق"], "debit": 0, "credit": amount},
+    ]})
+    assert r.status_code == 200, r.text
+
+
+def test_close_and_reopen_round_trip_after_new_postings(client, accounts, session_factory):
+    equity = client.post("/accounts", json={"name": "أرباح مبقاة", "code": "3001", "type": "Equity"}).json()["id"]
+    # سطور السنة المقفلة تحمل أكبر الأرقام، ثم تُضاف سطور بعد الإقفال
+    _expense(client, accounts, "2026-01-10", 5)
+    _expense(client, accounts, "2025-06-01", 7)
+
+    r = client.post(f"/fiscal_years/2025/close?retained_earnings_account_id={equity}")
+    assert r.status_code == 200, r.text
+    _expense(client, accounts, "2026-01-11", 3)
+
+    r = client.post("/fiscal_years/2025/reopen")
+    assert r.status_code == 200, r.text
+    trial = {a["id"]: a for a in client.get("/trial_balance").json()}
+    assert trial[accounts["مستهلكات"]]["debit"] == 15
+    with session_factory() as db:
+        assert verify(db) == []
+
+
+def test_ledger_export_matches_ledger_after_close(client, accounts):
+    equity = client.post("/accounts", json={"name": "أرباح مبقاة", "code": "3001", "type": "Equity"}).json()["id"]
+    _expense(client, accounts, "2025-06-01", 7)
+    _expense(client, accounts, "2026-01-10", 5)
+    assert client.post(f"/fiscal_years/2025/close?retained_earnings_account_id={equity}").status_code == 200
+
+    ledger = client.get("/ledger", params={"limit": 1000}).json()
+    exported = [json.loads(line) for line in client.get("/export/ledger", params={"format": "ndjson"}).text.splitlines()]
+    assert sorted(row["id"] for row in exported) == sorted(row["id"] for row in ledger["items"])
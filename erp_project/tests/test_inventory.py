@@ -0,0 +1,110 @@
+import pytest
+
+import inventory
+from models import StockBalance
+
+
+@pytest.fixture
+def product(stock, move_stock):
+    """منتج و10 وحدات واردة إلى المخزن الرئيسي"""
+    product = stock["add_product"](name="ورق")
+    r = move_stock(product, 10)
+    assert r.status_code == 200, r.text
+    return product
+
+
+def _by_warehouse(client, product_id):
+    body = client.get(f"/products/{product_id}/stock").json()
+    return {w["warehouse_id"]: w["quantity"] for w in body["warehouses"]}
+
+
+def test_moves_and_sales_update_warehouse_balance(client, stock, product, sell, session_factory):
+    main_wh, branch = stock["warehouses"]
+    r = sell([(product, 3)])
+    assert r.status_code == 200, r.text
+    assert _by_warehouse(client, product) == {main_wh: 7}
+    assert client.get(f"/warehouses/{main_wh}/stock").json() == [
+        {"product_id": product, "product_name": "ورق", "quantity": 7}
+    ]
+    assert client.get(f"/warehouses/{branch}/stock").json() == []
+
+    # حذف الفاتورة يعكس أثر حركاتها
+    assert client.delete(f"/sales_invoices/{r.json()['id']}").status_code == 200
+    assert _by_warehouse(client, product) == {main_wh: 10}
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_transfer_posts_both_legs(client, stock, product, session_factory):
+    main_wh, branch = stock["warehouses"]
+    r = client.post("/stock_transfers", json={
+        "product_id": product, "from_warehouse_id": main_wh, "to_warehouse_id": branch,
+        "date": "2026-01-03", "quantity": 4,
+    })
+    assert r.status_code == 200, r.text
+    assert (r.json()["from_quantity"], r.json()["to_quantity"]) == (6, 4)
+    assert _by_warehouse(client, product) == {main_wh: 6, branch: 4}
+
+    body = client.get(f"/products/{product}/stock", params={"warehouse_id": branch}).json()
+    assert body["quantity_on_hand"] == 10  # الرصيد الإجمالي لا يتغير بالتحويل
+    assert body["warehouses"] == [{"warehouse_id": branch, "warehouse_name": "فرعي", "quantity": 4}]
+
+    legs = client.get("/stock_moves", params={"purpose": "transfer"}).json()
+    assert sorted((m["warehouse_id"], m["move_type"]) for m in legs) == [(main_wh, "out"), (branch, "in")]
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_transfer_rejected_without_writing_either_leg(client, stock, product):
+    main_wh, branch = stock["warehouses"]
+    for body, status in [
+        ({"from_warehouse_id": main_wh, "to_warehouse_id": branch, "quantity": 11}, 400),
+        ({"from_warehouse_id": branch, "to_warehouse_id": main_wh, "quantity": 1}, 400),
+        ({"from_warehouse_id": main_wh, "to_warehouse_id": main_wh, "quantity": 1}, 400),
+        ({"from_warehouse_id": main_wh, "to_warehouse_id": 999, "quantity": 1}, 404),
+    ]:
+        r = client.post("/stock_transfers", json={"product_id": product, "date": "2026-01-03", **body})
+        assert r.status_code == status, r.text
+
+    assert _by_warehouse(client, product) == {main_wh: 10}
+    assert len(client.get("/stock_moves").json()) == 1
+
+
+def test_rebuild_recomputes_from_moves(client, stock, product, session_factory):
+    main_wh, branch = stock["warehouses"]
+    client.post("/stock_transfers", json={
+        "product_id": product, "from_warehouse_id": main_wh, "to_warehouse_id": branch,
+        "date": "2026-01-03", "quantity": 4,
+    })
+    with session_factory() as db:
+        db.query(StockBalance).filter(StockBalance.warehouse_id == branch).update({StockBalance.quantity: 100})
+        db.commit()
+        assert [d["key"] for d in inventory.verify(db)] == [(product, branch)]
+
+        assert inventory.rebuild(db) == 2
+        assert inventory.verify(db) == []
+    assert _by_warehouse(client, product) == {main_wh: 6, branch: 4}
+
+
+def test_reject_if_insufficient_checks_the_warehouse(client, stock, product, sell, move_stock, session_factory):
+    main_wh, branch = stock["warehouses"]
+    # الرصيد الإجمالي 10 يكفي، لكنه كله في المخزن الرئيسي
+    r = move_stock(product, 1, "out", warehouse_id=branch, params={"reject_if_insufficient": "true"})
+    assert r.status_code == 409, r.text
+    r = sell([(product, 1)], warehouse_id=branch, reject_if_insufficient="true")
+    assert r.status_code == 409, r.text
+
+    assert _by_warehouse(client, product) == {main_wh: 10}
+    assert len(client.get("/stock_moves").json()) == 1
+    assert client.get("/sales_invoices").json() == []
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_oversell_without_reject_clamps_only_the_total(client, stock, product, sell, on_hand, session_factory):
+    main_wh, _ = stock["warehouses"]
+    assert sell([(product, 15)]).status_code == 200
+    assert on_hand()[product] == 0
+    assert _by_warehouse(client, product) == {main_wh: -5}  # العجز ظاهر في المخزن
+    with session_factory() as db:
+        assert inventory.verify(db) == []
@@ -0,0 +1,79 @@
+import pytest
+
+from balances import verify
+
+
+def _import(client, body, fmt="csv", **params):
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    r = client.post(
+        "/journal_entries/import",
+        params={"format": fmt, **params},
+        content=body.encode(),
+        headers={"content-type": content_type},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_valid_entries_imported_and_errors_reported(client, accounts, session_factory):
+    result = _import(client, "\n".join([
+        "entry_ref,date,description,account_code,debit,credit",
+        "A,2026-01-01,open,1001,100,",
+        "A,2026-01-01,open,2001,,100",
+        "B,2026-01-02,bad,1001,10,",
+        "B,2026-01-02,bad,2001,,9",
+        "C,2026-01-03,x,9999,1,",
+        "C,2026-01-03,x,1001,,1",
+    ]))
+    assert result["imported_entries"] == 1
+    assert [(e["row"], e["entry_ref"]) for e in result["errors"]] == [(3, "B"), (5, "C")]
+
+    db = session_factory()
+    try:
+        assert verify(db) == []
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("line", ["[1, 2]", "42", '"text"', "not json"])
+def test_ndjson_non_object_lines_are_row_errors(client, accounts, line):
+    result = _import(client, line + "\n", fmt="ndjson")
+    assert result["imported_entries"] == 0
+    assert result["errors"][0]["row"] == 1
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_non_utf8_body_is_rejected_with_400(client, accounts, fmt):
+    body = "entry_ref,date,description,account_code,debit,credit\nA,2026-01-01,قيد,1001,1,\n".encode("cp1256")
+    r = client.post("/journal_entries/import", params={"format": fmt}, content=body,
+                    headers={"content-type": "text/csv"})
+    assert r.status_code == 400
+    assert "UTF-8" in r.json()["detail"]
+    assert client.get("/journal_entries").json() == []
+
+
+def test_non_finite_amounts_rejected(client, accounts):
+    result = _import(client, "\n".join([
+        '{"entry_ref": "X", "date": "2026-01-01", "account_code": "1001", "debit": "inf"}',
+        '{"entry_ref": "X", "date": "2026-01-01", "account_code": "2001", "credit": "inf"}',
+    ]), fmt="ndjson")
+    assert result["imported_entries"] == 0
+    assert len(result["errors"]) == 2
+
+
+def test_back_dated_import_keeps_daily_balances_consistent(client, accounts, session_factory):
+    client.post("/adjust_journal_entry", json={"date": "2026-03-01", "description": "later", "lines": [
+        {"account_id": accounts["الصندوق"], "debit": 5, "credit": 0},
+        {"account_id": accounts["حساب الموردين"], "debit": 0, "credit": 5},
+    ]})
+    rows = ["entry_ref,date,description,account_code,debit,credit"]
+    for day in range(1, 29):
+        rows.append(f"E{day},2026-02-{day:02d},x,1001,{day},")
+        rows.append(f"E{day},2026-02-{day:02d},x,2001,,{day}")
+    assert _import(client, "\n".join(rows))["imported_entries"] == 28
+
+    db = session_factory()
+    try:
+        assert verify(db) == []
+    finally:
+        db.close()
@@ -0,0 +1,73 @@
+import pytest
+
+from config import settings
+
+
+@pytest.fixture
+def product(stock):
+    """منتج رصيده 10 وحد إعادة طلبه 5"""
+    return stock["add_product"](10, reorder_level=5, name="ورق")
+
+
+def _states(client, after_id=0):
+    return [(a["product_id"], a["state"], a["quantity_on_hand"]) for a in client.get(
+        "/low_stock_alerts", params={"after_id": after_id}).json()]
+
+
+def test_alert_on_crossing_and_recovery_only(client, product, sell, move_stock):
+    assert sell([(product, 4)]).status_code == 200   # 6: فوق الحد
+    assert _states(client) == []
+    assert sell([(product, 3)]).status_code == 200   # 3: عبر الحد
+    assert sell([(product, 1)]).status_code == 200   # 2: ما زال تحته
+    assert _states(client) == [(product, "below", 3)]
+    assert client.get("/products/below_reorder").json() == [
+        {"product_id": product, "name": "ورق", "quantity_on_hand": 2, "reorder_level": 5}
+    ]
+
+    assert move_stock(product, 10).status_code == 200  # 12: عاد فوق الحد
+    assert _states(client) == [(product, "below", 3), (product, "recovered", 12)]
+    assert client.get("/products/below_reorder").json() == []
+
+
+def test_rejected_sale_writes_no_alert(client, product, sell):
+    assert sell([(product, 20)], reject_if_insufficient="true").status_code == 409
+    assert _states(client) == []
+
+
+def test_batch_and_product_edit_record_crossings(client, stock, product):
+    r = client.post("/stock_moves/batch", json=[
+        {"product_id": product, "warehouse_id": stock["warehouse"], "date": "2026-01-04", "quantity": 8, "move_type": "out"},
+    ])
+    assert r.status_code == 200, r.text
+    assert _states(client) == [(product, "below", 2)]
+
+    # خفض حد إعادة الطلب يدويًا يخرج المنتج من القائمة
+    r = client.put(f"/products/{product}", json={"name": "ورق", "quantity_on_hand": 2, "reorder_level": 1})
+    assert r.status_code == 200, r.text
+    assert _states(client)[-1] == (product, "recovered", 2)
+
+
+def test_long_poll_returns_after_id_or_waits(client, product, sell, monkeypatch):
+    monkeypatch.setattr(settings, "LOW_STOCK_POLL_MS", 10)
+    assert client.get("/low_stock_alerts", params={"wait": 0.05}).json() == []
+    sell([(product, 6)])
+    first = client.get("/low_stock_alerts", params={"wait": 5}).json()
+    assert [a["state"] for a in first] == ["below"]
+    assert client.get("/low_stock_alerts", params={"after_id": first[0]["id"], "wait": 0.05}).json() == []
+
+
+def test_stream_sends_events_and_resumes_from_last_event_id(client, product, sell, move_stock, monkeypatch):
+    monkeypatch.setattr(settings, "LOW_STOCK_STREAM_MAX_SECONDS", 0)  # دورة قراءة واحدة ثم ينتهي البث
+    sell([(product, 6)])
+    move_stock(product, 6)
+
+    r = client.get("/low_stock_alerts/stream", params={"after_id": 0})
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [block.splitlines() for block in r.text.strip().split("\n\n")]
+    assert [e[1] for e in events] == ["event: below", "event: recovered"]
+    first_id = int(events[0][0].removeprefix("id: "))
+
+    resumed = client.get("/low_stock_alerts/stream", headers={"Last-Event-ID": str(first_id)}).text
+    assert resumed.startswith(f"id: {first_id + 1}\nevent: recovered\n")
+    # بدون after_id ولا Last-Event-ID: التنبيهات الجديدة فقط
+    assert client.get("/low_stock_alerts/stream").text == ""
@@ -0,0 +1,68 @@
+import logging
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_serializer
+
+import main
+from config import settings
+
+
+def test_request_summary_header_and_prometheus_histograms(client, accounts):
+    r = client.get("/accounts")
+    assert r.status_code == 200
+    db, serialize, total = r.headers["server-timing"].split(", ")
+    assert db.startswith("db;dur=") and 'desc="' in db
+    assert serialize.startswith("serialize;dur=") and total.startswith("total;dur=")
+
+    r = client.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    for name in ("erp_request_duration_seconds", "erp_db_duration_seconds",
+                 "erp_serialization_duration_seconds", "erp_db_statements"):
+        assert f"# TYPE {name} histogram" in text
+        assert f'{name}_count{{method="GET",route="/accounts"}}' in text
+    assert 'route="/metrics"' not in text
+
+
+def test_n_plus_one_alarm_logs_requests_over_threshold(client, monkeypatch, caplog):
+    vendor = {"name": "v", "contact": None}  # INSERT ثم SELECT بعد commit
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 1)
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        client.post("/vendors", json=vendor)
+    assert any("N+1: POST /vendors" in m for m in caplog.messages)
+    assert 'erp_n_plus_one_total{method="POST",route="/vendors"}' in client.get("/metrics").text
+
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 0)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        client.post("/vendors", json=vendor)
+    assert not caplog.messages
+
+
+def test_serialization_time_comes_from_fastapi_serialize_response():
+    """
+    metrics يغلّف fastapi.routing.serialize_response الداخلية: إن توقف FastAPI عن
+    استدعائها بعد ترقية يصبح زمن التحويل صفراً ويفشل هذا الاختبار.
+    """
+    class Slow(BaseModel):
+        value: int
+
+        @field_serializer("value")
+        def _slow(self, value):
+            time.sleep(0.05)
+            return value
+
+    app = FastAPI()
+    app.middleware("http")(main.record_request_metrics)
+
+    @app.get("/slow", response_model=Slow)
+    def slow():
+        return {"value": 1}
+
+    with TestClient(app) as client:
+        r = client.get("/slow")
+    assert r.json() == {"value": 1}
+    serialize = r.headers["server-timing"].split(", ")[1]
+    assert float(serialize.removeprefix("serialize;dur=")) >= 50
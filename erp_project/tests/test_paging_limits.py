@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize("params", [{"limit": -1}, {"limit": 0}, {"limit": 1001}, {"offset": -1}])
+def test_daily_expense_rejects_out_of_range_paging(client, params):
+    assert client.get("/daily_expense", params=params).status_code == 422
+
+
+def test_daily_expense_pages(client, accounts):
+    for amount in (1, 2, 3):
+        r = client.post("/daily_expense", json={"amount": amount, "description": "شاي",
+                                                "expense_account_id": accounts["مستهلكات"],
+                                                "credit_account_id": accounts["الصندوق"]})
+        assert r.status_code == 200, r.text
+    assert len(client.get("/daily_expense", params={"limit": 2}).json()) == 2
+    assert len(client.get("/daily_expense", params={"limit": 2, "offset": 2}).json()) == 1
+
+
+@pytest.mark.parametrize("limit", [-1, 0, 1001])
+def test_transaction_lines_with_vendor_rejects_out_of_range_limit(client, limit):
+    assert client.get("/transaction_lines_with_vendor", params={"limit": limit}).status_code == 422
@@ -0,0 +1,22 @@
+from balances import verify
+
+
+def _adjust(client, accounts, debit_lines):
+    expense, cash = accounts["مستهلكات"], accounts["الصندوق"]
+    lines = [{"account_id": expense, "debit": 1, "credit": 0}] * debit_lines
+    lines.append({"account_id": cash, "debit": 0, "credit": debit_lines})
+    r = client.post("/adjust_journal_entry", json={"date": "2026-01-01", "description": "تسوية", "lines": lines})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_line_inserts_do_not_grow_with_entry_size(client, accounts, count_queries, session_factory):
+    _adjust(client, accounts, 1)  # تحميل الحالة الأولى (أرصدة الحسابات)
+    with count_queries() as small:
+        _adjust(client, accounts, 1)
+    with count_queries() as large:
+        _adjust(client, accounts, 50)
+    assert len(large) == len(small)
+
+    with session_factory() as db:
+        assert verify(db) == []
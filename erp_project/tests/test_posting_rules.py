@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import insert
+
+from models import Account, PostingRule
+
+
+def _insert_account_elsewhere(engine, code):
+    """إضافة حساب خارج جلسات ORM كما لو أضافته عملية أخرى (لا يفرّغ الذاكرة هنا)"""
+    with engine.begin() as conn:
+        return conn.execute(
+            insert(Account).values(name="حساب جديد", code=code, type="Asset").returning(Account.id)
+        ).scalar_one()
+
+
+def test_postings_resolve_rule_accounts_without_queries(client, accounts, vendor_id, count_queries):
+    body = {"vendor_id": vendor_id, "department_id": None, "date": "2026-01-01", "total": 10, "lines": []}
+    client.post("/vendor_invoices_with_stock", json=body)  # تحميل الذاكرة
+    with count_queries() as queries:
+        assert client.post("/vendor_invoices_with_stock", json=body).status_code == 200
+    assert not [q for q in queries if "FROM accounts" in q or "FROM posting_rules" in q]
+
+
+def test_account_added_by_another_worker_is_usable(client, accounts, vendor_id, engine):
+    client.get("/posting_rules")  # تحميل الذاكرة قبل إضافة الحساب
+    account_id = _insert_account_elsewhere(engine, "1999")
+
+    r = client.post("/payments", json={"vendor_id": vendor_id, "date": "2026-01-05", "amount": 3, "account_id": account_id})
+    assert r.status_code == 200, r.text
+    r = client.post("/daily_expense", json={
+        "amount": 2, "description": "x",
+        "expense_account_id": accounts["مستهلكات"], "credit_account_id": account_id,
+    })
+    assert r.status_code == 200, r.text
+
+
+def test_rule_change_takes_effect_and_rule_account_cannot_be_deleted(client, accounts, vendor_id):
+    new_expense = client.post("/accounts", json={"name": "مصروفات أخرى", "code": "5002", "type": "Expense"}).json()["id"]
+    r = client.put("/posting_rules/vendor_invoice/expense", json={"account_id": new_expense})
+    assert r.status_code == 200, r.text
+
+    client.post("/vendor_invoices_with_stock", json={
+        "vendor_id": vendor_id, "department_id": None, "date": "2026-01-01", "total": 7, "lines": [],
+    })
+    balances = {row["id"]: row for row in client.get("/trial_balance").json()}
+    assert balances[new_expense]["debit"] == 7
+
+    assert client.delete(f"/accounts/{new_expense}").status_code == 400
+
+
+@pytest.mark.parametrize("path", ["vendor_invoice/expnse", "vendor_invoices/expense", "payment/revenue"])
+def test_unknown_document_type_or_role_is_rejected(client, accounts, session_factory, path):
+    r = client.put(f"/posting_rules/{path}", json={"account_id": accounts["مستهلكات"]})
+    assert r.status_code == 422, r.text
+    with session_factory() as db:
+        assert db.query(PostingRule).count() == 0
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database.database import Base
+from database.replicas import PIN_COOKIE, AsyncReadRouter, ReadRouter
+from models import Account
+
+
+def _database(path, account_name):
+    """ملف SQLite فيه حساب واحد يميّز القاعدة التي قُرئ منها"""
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with factory() as db:
+        db.add(Account(name=account_name, code="1", type="Asset"))
+        db.commit()
+    return url, factory
+
+
+def _read_from(db):
+    try:
+        return [name for (name,) in db.query(Account.name).all()]
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    primary_url, primary = _database(tmp_path / "primary.db", "primary")
+    replica_url, _ = _database(tmp_path / "replica.db", "replica")
+    return primary, replica_url, tmp_path
+
+
+def test_reads_go_to_replica_unless_pinned(databases):
+    primary, replica_url, _ = databases
+    router = ReadRouter(primary, [replica_url])
+    assert _read_from(router.session()) == ["replica"]
+    assert _read_from(router.session(pin_primary=True)) == ["primary"]
+
+
+def test_unreachable_replica_falls_back_to_primary(databases):
+    primary, replica_url, tmp_path = databases
+    missing = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}?mode=ro"
+    router = ReadRouter(primary, [missing], retry_seconds=60)
+    assert _read_from(router.session()) == ["primary"]
+    assert router._candidates() == []  # مستبعدة حتى انتهاء retry_seconds
+
+    router = ReadRouter(primary, [missing, replica_url])
+    assert {tuple(_read_from(router.session())) for _ in range(4)} == {("replica",)}
+
+
+def test_client_reads_primary_after_write(databases, monkeypatch):
+    primary, replica_url, _ = databases
+    monkeypatch.setattr(main, "read_router", ReadRouter(primary, [replica_url]))
+
+    def override_get_db():
+        db = primary()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = override_get_db
+    try:
+        with TestClient(main.app) as client:
+            assert [a["name"] for a in client.get("/trial_balance").json()] == ["replica"]
+
+            r = client.post("/accounts", json={"name": "new", "code": "2", "type": "Asset"})
+            assert r.status_code == 200, r.text
+            assert [a["name"] for a in client.get("/trial_balance").json()] == ["primary", "new"]
+
+            client.cookies.clear()
+            assert [a["name"] for a in client.get("/trial_balance").json()] == ["replica"]
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def _async_primary(path):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    return async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), autoflush=False)
+
+
+def test_async_router_reads_replica_unless_pinned(databases):
+    _, replica_url, tmp_path = databases
+    router = AsyncReadRouter(_async_primary(tmp_path / "primary.db"), [replica_url.replace("sqlite", "sqlite+aiosqlite")])
+
+    async def read(pin_primary):
+        db = await router.session(pin_primary=pin_primary)
+        try:
+            return await db.run_sync(lambda session: [name for (name,) in session.query(Account.name)])
+        finally:
+            await db.close()
+
+    assert asyncio.run(read(False)) == ["replica"]
+    assert asyncio.run(read(True)) == ["primary"]
+
+
+def test_async_report_routes_honor_primary_pin(databases, monkeypatch):
+    """ASYNC_DB=1 مع نسخ قراءة: العميل الذي كتب للتو (كوكي التثبيت) يقرأ من الأساسي"""
+    _, replica_url, tmp_path = databases
+    monkeypatch.setattr(main, "async_read_router", AsyncReadRouter(
+        _async_primary(tmp_path / "primary.db"), [replica_url.replace("sqlite", "sqlite+aiosqlite")],
+    ))
+    app = FastAPI()
+    app.include_router(main.async_router)
+    with TestClient(app) as client:
+        assert [a["name"] for a in client.get("/trial_balance").json()] == ["replica"]
+        client.cookies.set(PIN_COOKIE, str(time.time() + 60))
+        assert [a["name"] for a in client.get("/trial_balance").json()] == ["primary"]
@@ -0,0 +1,46 @@
+import pytest
+
+import inventory
+
+
+@pytest.fixture
+def products(stock):
+    return [stock["add_product"](100, name=f"صنف {i}") for i in range(50)]
+
+
+def test_items_returned_in_request_order(client, products, sell, on_hand, session_factory):
+    chosen = products[:3][::-1]
+    r = sell([(p, 2) for p in chosen])
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    assert [i["product_id"] for i in items] == chosen
+    assert len({i["id"] for i in items}) == 3
+    stored = client.get("/sales_invoices").json()[0]["items"]
+    assert sorted(stored, key=lambda i: i["id"]) == sorted(items, key=lambda i: i["id"])
+    assert all(on_hand()[p] == 98 for p in chosen)
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_repeated_product_is_decremented_once_per_line(products, sell, on_hand):
+    product = products[0]
+    r = sell([(product, 3), (product, 3)])
+    assert r.status_code == 200, r.text
+    assert on_hand()[product] == 94
+
+
+def test_unknown_product_rejects_whole_invoice(client, products, sell, on_hand):
+    before = on_hand()
+    r = sell([(products[0], 1), (999999, 1)])
+    assert r.status_code == 404
+    assert on_hand() == before
+    assert client.get("/sales_invoices").json() == []
+
+
+def test_statement_count_does_not_grow_with_lines(products, sell, count_queries):
+    sell([(products[0], 1)])  # تحميل قواعد الترحيل إلى الذاكرة
+    with count_queries() as small:
+        assert sell([(p, 1) for p in products[:2]]).status_code == 200
+    with count_queries() as large:
+        assert sell([(p, 1) for p in products]).status_code == 200
+    assert len(large) == len(small)
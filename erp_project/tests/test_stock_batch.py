@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+import inventory
+
+
+@pytest.fixture
+def products(stock):
+    return [stock["add_product"](10, name=name) for name in ("ورق", "حبر")]
+
+
+def _move(stock, product_id, quantity=1, move_type="in", **extra):
+    return {"product_id": product_id, "warehouse_id": stock["warehouse"], "department_id": stock["department"],
+            "date": "2026-01-01", "quantity": quantity, "move_type": move_type, **extra}
+
+
+def _batch(client, body, ndjson=False, **params):
+    if ndjson:
+        content, content_type = "\n".join(json.dumps(m) for m in body), "application/x-ndjson"
+    else:
+        content, content_type = json.dumps(body), "application/json"
+    r = client.post("/stock_moves/batch", params=params, content=content.encode(),
+                    headers={"content-type": content_type})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_batch_applies_net_delta_and_reports_each_item(client, stock, products, on_hand, session_factory, ndjson):
+    a, b = products
+    result = _batch(client, [
+        _move(stock, a, 5),
+        _move(stock, b, 3, "out", reference="مسح 2"),
+        _move(stock, 999),
+        _move(stock, a, 2, "out"),
+        _move(stock, a, date="2026-13-01"),
+        _move(stock, b, -1),
+    ], ndjson=ndjson)
+
+    assert (result["imported"], result["errors"]) == (3, 3)
+    assert [r["row"] for r in result["results"]] == [1, 2, 3, 4, 5, 6]
+    assert ["id" in r for r in result["results"]] == [True, True, False, True, False, False]
+    assert on_hand() == {a: 13, b: 7}
+
+    moves = client.get("/stock_moves").json()
+    assert sorted(m["id"] for m in moves) == sorted(r["id"] for r in result["results"] if "id" in r)
+    assert {m["id"]: m["reference"] for m in moves}[result["results"][1]["id"]] == "مسح 2"
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_statement_count_does_not_grow_with_batch_size(client, stock, products, count_queries):
+    a, b = products
+    with count_queries() as small:
+        _batch(client, [_move(stock, a), _move(stock, b)])
+    with count_queries() as large:
+        _batch(client, [_move(stock, (a, b)[i % 2], move_type=("in", "out")[i % 3 == 0]) for i in range(500)])
+    assert len(large) == len(small)
+
+
+def test_reject_if_insufficient_drops_only_short_products(client, stock, products, on_hand):
+    a, b = products
+    _batch(client, [_move(stock, a, 10)])  # a: الإجمالي 20 منها 10 في المخزن؛ b: رصيد افتتاحي 10 خارج المخازن
+    result = _batch(client, [
+        _move(stock, a, 8, "out"),
+        _move(stock, b, 8, "out"),
+        _move(stock, b, 5, "out"),
+    ], reject_if_insufficient="true")
+    assert result["imported"] == 1
+    assert [r["row"] for r in result["results"] if "error" in r] == [2, 3]
+    assert on_hand() == {a: 12, b: 10}
+
+
+def test_reject_if_insufficient_checks_each_warehouse(client, stock, products, on_hand):
+    a, _ = products
+    main_wh, branch = stock["warehouses"]
+    _batch(client, [_move(stock, a, 5)])  # الإجمالي 15، منها 5 في الرئيسي ولا شيء في الفرعي
+    result = _batch(client, [
+        _move(stock, a, 4, "out"),
+        _move(stock, a, 1, "out", warehouse_id=branch),
+    ], reject_if_insufficient="true")
+    assert result["imported"] == 1
+    assert result["results"][1] == {"row": 2, "error": f"الكمية المتاحة من المنتج {a} في المخزن {branch} (0.0) لا تكفي صافي الصرف"}
+    assert on_hand()[a] == 11
+
+
+def test_all_or_nothing_rejects_whole_batch(client, stock, products, on_hand):
+    a, _ = products
+    result = _batch(client, [_move(stock, a), {"product_id": a}], all_or_nothing="true")
+    assert result["imported"] == 0
+    assert [r["row"] for r in result["results"]] == [2]
+    assert client.get("/stock_moves").json() == []
+    assert on_hand()[a] == 10
+
+
+@pytest.mark.parametrize("body", ["not json", "[1, 2", "[1]", "5"])
+def test_malformed_body_is_an_item_error(client, stock, body):
+    r = client.post("/stock_moves/batch", content=body.encode(), headers={"content-type": "application/json"})
+    assert r.status_code == 200, r.text
+    assert r.json()["imported"] == 0
+    assert r.json()["results"][0]["row"] == 1
+
+
+def test_non_utf8_body_is_rejected_with_400(client, stock, products):
+    body = json.dumps([_move(stock, products[0], reference="مسح")], ensure_ascii=False).encode("cp1256")
+    r = client.post("/stock_moves/batch", content=body, headers={"content-type": "application/json"})
+    assert r.status_code == 400
+    assert "UTF-8" in r.json()["detail"]
+
+
+def test_non_string_reference_is_an_item_error(client, stock, products):
+    a, _ = products
+    result = _batch(client, [_move(stock, a, reference={"scan": 1}), _move(stock, a, reference="مسح 2")])
+    assert result["imported"] == 1
+    assert result["results"][0] == {"row": 1, "error": "reference يجب أن يكون نصاً"}
@@ -0,0 +1,99 @@
+"""
+خصم المخزون تحت التزاحم: 100 بائع متزامن على نفس المنتجات.
+المحرك هنا بعدة اتصالات حقيقية (ملف SQLite بـ BEGIN IMMEDIATE، أو PostgreSQL)
+بدل اتصال الذاكرة الواحد في conftest، فالمعاملات تتزاحم فعلاً.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+
+import inventory
+from database.database import Base
+from database.dialects import configure_sqlite
+
+SELLERS = 100
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    if request.param == "sqlite":
+        engine = configure_sqlite(
+            create_engine(
+                f"sqlite:///{tmp_path / 'erp.db'}", connect_args={"check_same_thread": False},
+                pool_size=SELLERS, max_overflow=0,
+            ),
+            immediate=True,
+        )
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL غير مضبوط")
+        engine = create_engine(url, pool_size=SELLERS, max_overflow=0)
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    if request.param == "postgresql":
+        Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _all_at_once(requests):
+    """كل الطلبات من SELLERS thread تبدأ معاً"""
+    barrier = threading.Barrier(len(requests))
+
+    def run(request):
+        barrier.wait()
+        return request()
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(run, requests))
+
+
+def test_no_lost_updates_with_parallel_sellers(client, stock, sell, move_stock, on_hand, session_factory):
+    a, b = stock["add_product"](1000), stock["add_product"](1000)
+
+    def seller(i):
+        # نصف البائعين بفاتورة بسطرين بترتيب معكوس (b ثم a)، والنصف الآخر بحركة صرف
+        if i % 2:
+            return lambda: sell([(b, 1), (a, 1)])
+        return lambda: move_stock(a, 1, "out")
+
+    responses = _all_at_once([seller(i) for i in range(SELLERS)])
+    assert [r.status_code for r in responses] == [200] * SELLERS
+
+    assert on_hand() == {a: 1000 - SELLERS, b: 1000 - SELLERS // 2}
+    assert len(client.get("/stock_moves").json()) == SELLERS + SELLERS // 2
+    with session_factory() as db:
+        assert inventory.verify(db) == []
+
+
+def test_reject_if_insufficient_never_oversells(client, stock, move_stock, on_hand):
+    available = 30
+    product = stock["add_product"]()
+    assert move_stock(product, available).status_code == 200
+
+    def sell():
+        return move_stock(product, 1, "out", params={"reject_if_insufficient": "true"})
+
+    statuses = [r.status_code for r in _all_at_once([sell] * SELLERS)]
+    assert statuses.count(200) == available
+    assert statuses.count(409) == SELLERS - available
+    assert on_hand()[product] == 0
+    assert len(client.get("/stock_moves", params={"product_id": product}).json()) == available + 1
+
+
+def test_rejected_invoice_leaves_nothing_behind(client, stock, sell, on_hand):
+    a, b = stock["add_product"](5), stock["add_product"](1)
+    r = sell([(a, 2), (b, 2)], reject_if_insufficient="true")
+    assert r.status_code == 409, r.text
+    assert on_hand() == {a: 5, b: 1}
+    assert client.get("/sales_invoices").json() == []
+    assert client.get("/stock_moves").json() == []
+
+    # بدون الرفض يبقى السلوك السابق: الرصيد يُصفَّر
+    r = sell([(a, 2), (b, 2)])
+    assert r.status_code == 200, r.text
+    assert on_hand() == {a: 3, b: 0}
@@ -0,0 +1,86 @@
+import pytest
+
+
+@pytest.fixture
+def products(stock):
+    return [stock["add_product"](reorder_level=5, name=name) for name in ("ورق", "حبر")]
+
+
+def _move(move_stock, product_id, warehouse_id, day, quantity=1, move_type="in"):
+    r = move_stock(product_id, quantity, move_type, warehouse_id=warehouse_id, date=f"2026-01-{day:02d}",
+                   reference=None, purpose="stock")
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def test_query_count_does_not_grow_with_moves(client, stock, products, move_stock, count_queries):
+    product, warehouse = products[0], stock["warehouses"][0]
+    _move(move_stock, product, warehouse, 1)
+    with count_queries() as one_move:
+        rows = client.get("/stock_moves").json()
+    assert len(rows) == 1
+
+    for day in range(2, 22):
+        _move(move_stock, products[day % 2], warehouse, day)
+    with count_queries() as many_moves:
+        rows = client.get("/stock_moves").json()
+    assert len(rows) == 21
+
+    assert len(one_move) == len(many_moves) == 1
+
+
+def test_low_stock_fields_come_with_each_move(client, stock, products, move_stock):
+    product, warehouse = products[0], stock["warehouses"][0]
+    _move(move_stock, product, warehouse, 1, quantity=3)
+    row = client.get("/stock_moves").json()[0]
+    assert row["product_name"] == "ورق"
+    assert (row["current_quantity"], row["reorder_level"], row["low_stock_alert"]) == (3, 5, True)
+    assert row["department_name"] == "المبيعات"
+
+    _move(move_stock, product, warehouse, 2, quantity=10)
+    assert client.get("/stock_moves").json()[0]["low_stock_alert"] is False
+
+
+def test_filters(client, stock, products, move_stock):
+    (p1, p2), (w1, w2) = products, stock["warehouses"]
+    _move(move_stock, p1, w1, 1)
+    _move(move_stock, p1, w2, 2)
+    _move(move_stock, p2, w1, 3)
+    _move(move_stock, p2, w2, 4, move_type="out")
+
+    def ids(**params):
+        return [row["id"] for row in client.get("/stock_moves", params=params).json()]
+
+    assert len(ids(product_id=p1)) == 2
+    assert len(ids(warehouse_id=w2)) == 2
+    assert len(ids(product_id=p2, warehouse_id=w1)) == 1
+    assert len(ids(move_type="out")) == 1
+    assert len(ids(start_date="2026-01-02", end_date="2026-01-03")) == 2
+
+
+def test_keyset_pages_cover_all_moves_in_order(client, stock, products, move_stock):
+    product, warehouse = products[0], stock["warehouses"][0]
+    # عدة حركات في نفس اليوم ليُختبر ترتيب id داخل اليوم
+    for day in (3, 1, 2, 1, 3, 2, 1):
+        _move(move_stock, product, warehouse, day)
+    expected = [(row["date"], row["id"]) for row in client.get("/stock_moves").json()]
+    assert expected == sorted(expected)
+
+    seen, params = [], {"limit": 3}
+    while True:
+        page = client.get("/stock_moves", params=params).json()
+        if not page:
+            break
+        seen += [(row["date"], row["id"]) for row in page]
+        params = {"limit": 3, "after_date": page[-1]["date"], "after_id": page[-1]["id"]}
+    assert seen == expected
+
+
+@pytest.mark.parametrize("limit, expected", [(-5, 1), (0, 1), (10**9, 3)])
+def test_limit_is_clamped_like_ledger(client, stock, products, move_stock, limit, expected):
+    product, warehouse = products[0], stock["warehouses"][0]
+    for day in (1, 2, 3):
+        _move(move_stock, product, warehouse, day)
+    r = client.get("/stock_moves", params={"limit": limit})
+    assert r.status_code == 200, r.text
+    assert len(r.json()) == expected
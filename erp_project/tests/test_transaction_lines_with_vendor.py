@@ -0,0 +1,26 @@
+def _pay(client, vendor_id, account_id):
+    r = client.post("/payments", json={
+        "vendor_id": vendor_id, "date": "2026-01-05", "amount": 10, "account_id": account_id,
+    })
+    assert r.status_code == 200, r.text
+
+
+def test_query_count_does_not_grow_with_lines(client, accounts, vendor_id, count_queries):
+    _pay(client, vendor_id, accounts["الصندوق"])
+    with count_queries() as one_entry:
+        r = client.get("/transaction_lines_with_vendor")
+    assert len(r.json()) == 2
+
+    for _ in range(20):
+        _pay(client, vendor_id, accounts["الصندوق"])
+    with count_queries() as many_entries:
+        r = client.get("/transaction_lines_with_vendor")
+    assert len(r.json()) == 42
+
+    assert len(one_entry) == len(many_entries) == 2
+
+
+def test_vendor_name_resolved_for_each_line(client, accounts, vendor_id):
+    _pay(client, vendor_id, accounts["الصندوق"])
+    rows = client.get("/transaction_lines_with_vendor").json()
+    assert {row["vendor_name"] for row in rows} == {"مورد"}